@@ -0,0 +1,92 @@
+"""
+多裁剪批量推理基准测试 (CPU, TFLite)
+
+对比 N 次单张推理 与 一次 N 张批量推理 的耗时, N = 1..9
+使用方法:
+    python benchmark_multicrop.py --model garbage_classifier.tflite
+    python benchmark_multicrop.py --synthetic      # 没有训练好的模型时使用随机权重的 MobileNetV2
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import uraspi
+from uraspi import GarbageDetectorTFLite
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark batched multi-crop TFLite inference on CPU')
+    parser.add_argument('--model', type=str, default='garbage_classifier.tflite',
+                        help='TFLite model path (default: garbage_classifier.tflite)')
+    parser.add_argument('--labels', type=str, default='garbage_classify_rule.json',
+                        help='Label mapping json (default: garbage_classify_rule.json)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Convert a randomly initialised MobileNetV2 instead of loading --model')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='Timed runs per batch size (default: 20)')
+    parser.add_argument('--max-batch', type=int, default=9,
+                        help='Largest batch size to test (default: 9)')
+    return parser.parse_args()
+
+
+def build_synthetic_model(path):
+    model = tf.keras.applications.MobileNetV2(
+        input_shape=(224, 224, 3), weights=None, classes=40)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def time_call(fn, runs):
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    args = parse_args()
+
+    # 基准测试不需要串口和窗口
+    uraspi.ENABLE_SERIAL = False
+    uraspi.DEBUG_WINDOW = False
+    tf.config.set_visible_devices([], 'GPU')
+
+    model_path = args.model
+    tmp_dir = None
+    if args.synthetic:
+        tmp_dir = tempfile.TemporaryDirectory()
+        model_path = os.path.join(tmp_dir.name, 'synthetic_classifier.tflite')
+        build_synthetic_model(model_path)
+
+    detector = GarbageDetectorTFLite(model_path, args.labels)
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    rows, cols = uraspi.CROP_GRID
+    boxes = detector.generate_crop_boxes(frame.shape[1], frame.shape[0])
+    rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+    # 网格小于 max-batch 时循环复用裁剪块
+    rois = [rois[i % len(rois)] for i in range(args.max_batch)]
+
+    print(f"\n设备: CPU, 网格: {rows}x{cols}, 每组运行 {args.runs} 次")
+    print(f"{'N':>3} | {'N次单张(ms)':>12} | {'批量(ms)':>10} | {'每张(ms)':>9} | {'加速比':>6}")
+    print("-" * 56)
+    for n in range(1, args.max_batch + 1):
+        batch = rois[:n]
+        single = time_call(lambda: [detector.classify_batch([roi]) for roi in batch], args.runs)
+        batched = time_call(lambda: detector.classify_batch(batch), args.runs)
+        print(f"{n:>3} | {single * 1000:>12.2f} | {batched * 1000:>10.2f} | "
+              f"{batched * 1000 / n:>9.2f} | {single / batched:>5.2f}x")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 import cv2
 import numpy as np
 import tensorflow as tf
@@ -11,6 +12,13 @@ ENABLE_SERIAL = True  # 设置为 False 可关闭串口输出
 # 串口配置
 SERIAL_PORT = '/dev/ttyS0'
 SERIAL_BAUD = 9600
+CONF_THRESHOLD = 0.5  # 置信度阈值
+# export_tflite_int8.py 生成的对比报告, 存在时按报告推荐选择模型 (float16 或 INT8)
+TFLITE_REPORT = 'tflite_report.json'
+# 多裁剪(网格)批量推理配置
+MULTI_CROP = False    # 开启后使用重叠网格裁剪代替单一中心裁剪
+CROP_GRID = (3, 3)    # 网格行数, 列数
+CROP_OVERLAP = 0.25   # 相邻裁剪块之间的最小重叠比例
 def setup_gpu():
     """
     检测并配置GPU。
@@ -49,6 +57,7 @@ class GarbageDetectorTFLite:
             self.labels = json.load(f)
         
         # 加载 TFLite 模型并分配张量
+        self.model_path = model_path
         self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=4)
         self.interpreter.allocate_tensors()
         
@@ -60,6 +69,16 @@ class GarbageDetectorTFLite:
         self.input_shape = self.input_details[0]['shape']
         self.IMG_SIZE = self.input_shape[1]
         
+        # 全整数量化模型的输入/输出为 uint8, 需要按量化参数转换
+        self.input_dtype = self.input_details[0]['dtype']
+        self.input_scale, self.input_zero_point = self.input_details[0]['quantization']
+        self.output_dtype = self.output_details[0]['dtype']
+        self.output_scale, self.output_zero_point = self.output_details[0]['quantization']
+        
+        # 多裁剪模式: 按批大小缓存已调整输入形状的解释器, 避免反复 allocate_tensors
+        self.batch_interpreters = {}
+        self.crop_boxes_cache = {}
+        
         # 定义类别及其对应颜色和串口输出编码
         self.categories = {
             '其他垃圾': {'color': (128, 128, 128), 'code': '0'},  # 灰色
@@ -78,12 +97,46 @@ class GarbageDetectorTFLite:
                 print(f"串口初始化失败: {str(e)}")
                 self.serial_port = None
     
+    @classmethod
+    def from_report(cls, report_path, labels_path):
+        """按 export_tflite_int8.py 生成的对比报告加载推荐的模型"""
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        recommended = report['recommended']
+        model_info = report['models'][recommended]
+        model_path = os.path.join(os.path.dirname(os.path.abspath(report_path)), model_info['path'])
+        print(f"按报告选择模型: {recommended} ({model_info['path']}), "
+              f"准确率 {model_info['accuracy']:.2f}%, 延迟 {model_info['latency_ms']:.2f} ms")
+        return cls(model_path, labels_path)
+    
+    def to_input_tensor(self, batch):
+        """将 uint8 RGB 批次转换为模型输入类型"""
+        if self.input_dtype == np.float32:
+            return batch.astype(np.float32) / 255.0
+        # 以 [0, 1] 校准的 uint8 输入通常 scale=1/255, zero_point=0, 此时像素值可直接输入
+        if self.input_zero_point == 0 and abs(self.input_scale * 255.0 - 1.0) < 1e-6:
+            return batch.astype(self.input_dtype, copy=False)
+        info = np.iinfo(self.input_dtype)
+        quantized = np.round(batch.astype(np.float32) / (255.0 * self.input_scale) + self.input_zero_point)
+        return np.clip(quantized, info.min, info.max).astype(self.input_dtype)
+    
+    def from_output_tensor(self, output):
+        """将模型输出反量化为概率"""
+        if self.output_dtype == np.float32:
+            return output
+        return (output.astype(np.float32) - self.output_zero_point) * self.output_scale
+    
     def preprocess_image(self, img):
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         img = cv2.resize(img, (self.IMG_SIZE, self.IMG_SIZE))
-        img = img.astype(np.float32) / 255.0
         img = np.expand_dims(img, axis=0)
-        return img
+        return self.to_input_tensor(img)
+    
+    def preprocess_batch(self, rois):
+        # 多个裁剪块统一缩放后堆叠为一个批次, 颜色转换和归一化只做一次
+        batch = np.stack([cv2.resize(roi, (self.IMG_SIZE, self.IMG_SIZE)) for roi in rois])
+        batch = np.ascontiguousarray(batch[..., ::-1])
+        return self.to_input_tensor(batch)
     
     def get_category(self, label):
         for category in self.categories.keys():
@@ -100,7 +153,166 @@ class GarbageDetectorTFLite:
             except Exception as e:
                 print(f"串口输出失败: {str(e)}")
     
+    def get_batch_interpreter(self, batch_size):
+        """获取输入批大小为 batch_size 的解释器"""
+        if batch_size == 1:
+            return self.interpreter
+        if batch_size not in self.batch_interpreters:
+            interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=4)
+            input_index = interpreter.get_input_details()[0]['index']
+            interpreter.resize_tensor_input(
+                input_index, [batch_size, self.IMG_SIZE, self.IMG_SIZE, 3])
+            interpreter.allocate_tensors()
+            self.batch_interpreters[batch_size] = interpreter
+        return self.batch_interpreters[batch_size]
+    
+    def generate_crop_boxes(self, width, height):
+        """按 CROP_GRID 生成相互重叠的正方形裁剪框 (x1, y1, x2, y2)"""
+        key = (width, height)
+        if key in self.crop_boxes_cache:
+            return self.crop_boxes_cache[key]
+        
+        rows, cols = CROP_GRID
+        step_ratio = 1.0 - CROP_OVERLAP
+        # 正方形边长: 保证 rows x cols 个块在给定重叠下覆盖整幅画面
+        size = max(width / (1 + (cols - 1) * step_ratio),
+                   height / (1 + (rows - 1) * step_ratio))
+        size = int(min(size, width, height))
+        
+        xs = [round(c * (width - size) / (cols - 1)) if cols > 1 else (width - size) // 2
+              for c in range(cols)]
+        ys = [round(r * (height - size) / (rows - 1)) if rows > 1 else (height - size) // 2
+              for r in range(rows)]
+        boxes = [(x, y, x + size, y + size) for y in ys for x in xs]
+        
+        self.crop_boxes_cache[key] = boxes
+        return boxes
+    
+    def classify_batch(self, rois):
+        """一次 invoke 处理所有裁剪块, 返回 [(class_id, confidence), ...]"""
+        input_data = self.preprocess_batch(rois)
+        interpreter = self.get_batch_interpreter(len(rois))
+        input_details = interpreter.get_input_details()
+        output_details = interpreter.get_output_details()
+        
+        interpreter.set_tensor(input_details[0]['index'], input_data)
+        interpreter.invoke()
+        output_data = self.from_output_tensor(interpreter.get_tensor(output_details[0]['index']))
+        
+        class_ids = np.argmax(output_data, axis=1)
+        confidences = output_data[np.arange(len(rois)), class_ids]
+        return list(zip(class_ids.tolist(), confidences.tolist()))
+    
+    def merge_regions(self, boxes, predictions):
+        """
+        将网格中相邻且类别相同的高置信度裁剪块合并为区域。
+        返回: [(区域框, 类别, 标签, 置信度), ...]，按置信度从高到低排序
+        """
+        rows, cols = CROP_GRID
+        cells = {}
+        for idx, (class_id, confidence) in enumerate(predictions):
+            if confidence <= CONF_THRESHOLD:
+                continue
+            label = self.labels.get(str(class_id), "未知类别")
+            category = self.get_category(label)
+            if category is None:
+                continue
+            cells[idx] = (category, label, confidence)
+        
+        regions = []
+        visited = set()
+        for start in cells:
+            if start in visited:
+                continue
+            category = cells[start][0]
+            # 网格上按4邻域做连通区域合并
+            stack, members = [start], []
+            visited.add(start)
+            while stack:
+                idx = stack.pop()
+                members.append(idx)
+                r, c = divmod(idx, cols)
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    nidx = nr * cols + nc
+                    if (0 <= nr < rows and 0 <= nc < cols and nidx not in visited
+                            and nidx in cells and cells[nidx][0] == category):
+                        visited.add(nidx)
+                        stack.append(nidx)
+            
+            best = max(members, key=lambda m: cells[m][2])
+            box = (min(boxes[m][0] for m in members), min(boxes[m][1] for m in members),
+                   max(boxes[m][2] for m in members), max(boxes[m][3] for m in members))
+            regions.append((box, category, cells[best][1], cells[best][2]))
+        
+        regions.sort(key=lambda region: region[3], reverse=True)
+        return regions
+    
+    def draw_result(self, frame, box, category, label, confidence):
+        x1, y1, x2, y2 = box
+        color = self.categories[category]['color']
+        
+        # 绘制检测区域
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        
+        # 设置文本参数
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 0.8
+        thickness = 2
+        padding = 10
+        
+        # 准备显示文本
+        text_category = f"类别: {category}"
+        text_item = f"物品: {label.split('/')[-1]}"
+        text_conf = f"置信度: {confidence:.1%}"
+        
+        # 计算文本位置
+        y_offset = y1 - padding
+        for text in [text_conf, text_item, text_category]:
+            (w, h), _ = cv2.getTextSize(text, font, font_scale, thickness)
+            y_offset -= h + padding
+            
+            # 添加文本背景
+            cv2.rectangle(frame, 
+                        (x1, y_offset - padding), 
+                        (x1 + w + padding * 2, y_offset + h + padding),
+                        (0, 0, 0),
+                        -1)
+            
+            # 绘制文本
+            cv2.putText(frame, text, 
+                      (x1 + padding, y_offset + h),
+                      font, font_scale, color, thickness)
+    
+    def print_result(self, category, label, confidence):
+        print("\n检测结果:")
+        print(f"类别: {category}")
+        print(f"物品: {label.split('/')[-1]}")
+        print(f"置信度: {confidence:.1%}")
+        print("-" * 30)
+    
+    def detect_multi_crop(self, frame):
+        height, width = frame.shape[:2]
+        boxes = self.generate_crop_boxes(width, height)
+        rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        
+        predictions = self.classify_batch(rois)
+        regions = self.merge_regions(boxes, predictions)
+        
+        for box, category, label, confidence in regions:
+            if DEBUG_WINDOW:
+                self.draw_result(frame, box, category, label, confidence)
+            self.print_result(category, label, confidence)
+        
+        # 串口协议每次只能输出一个类别, 发送置信度最高的区域
+        if regions:
+            self.send_serial_data(regions[0][1])
+        
+        return frame
+    
     def detect(self, frame):
+        if MULTI_CROP:
+            return self.detect_multi_crop(frame)
+        
         height, width = frame.shape[:2]
         
         # 定义中心区域
@@ -120,7 +332,7 @@ class GarbageDetectorTFLite:
         self.interpreter.invoke()
         
         # 获取分类输出
-        output_data = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
+        output_data = self.from_output_tensor(self.interpreter.get_tensor(self.output_details[0]['index'])[0])
         class_id = np.argmax(output_data)
         confidence = output_data[class_id]
         
@@ -129,48 +341,12 @@ class GarbageDetectorTFLite:
         category = self.get_category(label)
         
         # 可视化处理
-        if confidence > 0.5:  # 置信度阈值
+        if confidence > CONF_THRESHOLD:  # 置信度阈值
             if DEBUG_WINDOW:
-                color = self.categories[category]['color']
-                
-                # 绘制中心检测区域
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                # 设置文本参数
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 0.8
-                thickness = 2
-                padding = 10
-                
-                # 准备显示文本
-                text_category = f"类别: {category}"
-                text_item = f"物品: {label.split('/')[-1]}"
-                text_conf = f"置信度: {confidence:.1%}"
-                
-                # 计算文本位置
-                y_offset = y1 - padding
-                for text in [text_conf, text_item, text_category]:
-                    (w, h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                    y_offset -= h + padding
-                    
-                    # 添加文本背景
-                    cv2.rectangle(frame, 
-                                (x1, y_offset - padding), 
-                                (x1 + w + padding * 2, y_offset + h + padding),
-                                (0, 0, 0),
-                                -1)
-                    
-                    # 绘制文本
-                    cv2.putText(frame, text, 
-                              (x1 + padding, y_offset + h),
-                              font, font_scale, color, thickness)
+                self.draw_result(frame, (x1, y1, x2, y2), category, label, confidence)
             
             # 打印检测结果
-            print("\n检测结果:")
-            print(f"类别: {category}")
-            print(f"物品: {label.split('/')[-1]}")
-            print(f"置信度: {confidence:.1%}")
-            print("-" * 30)
+            self.print_result(category, label, confidence)
             
             # 发送串口数据
             self.send_serial_data(category)
@@ -193,10 +369,16 @@ def main():
     print(device_info)
     print("-" * 30)
     # 初始化检测器
-    detector = GarbageDetectorTFLite(
-        model_path='garbage_classifier.tflite',
-        labels_path='garbage_classify_rule.json'
-    )
+    if os.path.exists(TFLITE_REPORT):
+        detector = GarbageDetectorTFLite.from_report(
+            TFLITE_REPORT,
+            labels_path='garbage_classify_rule.json'
+        )
+    else:
+        detector = GarbageDetectorTFLite(
+            model_path='garbage_classifier.tflite',
+            labels_path='garbage_classify_rule.json'
+        )
     
     # 打开摄像头
     cap = find_camera()
@@ -215,6 +397,7 @@ def main():
     print(f"- 调试窗口: {'开启' if DEBUG_WINDOW else '关闭'}")
     print(f"- 串口输出: {'开启' if ENABLE_SERIAL else '关闭'}")
     print("- 按 'q' 键退出程序")
+    print(f"- 多裁剪推理: {'开启 ' + str(CROP_GRID[0]) + 'x' + str(CROP_GRID[1]) if MULTI_CROP else '关闭'}")
     print("- 将物品放置在画面中心区域")
     print("-" * 30)
     
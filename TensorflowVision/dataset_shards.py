@@ -0,0 +1,176 @@
+"""
+将 train.txt / validate.txt 对应的图片打包为按大小均衡的 TFRecord 分片
+
+每张图片作为一条记录, 保存原始 JPEG 字节 (不重新编码) 和标签:
+    image: bytes, label: int64, path: bytes
+输出目录结构:
+    <out>/train-00000-of-00008.tfrecord      分片
+    <out>/train-00000-of-00008.tfrecord.idx  分片索引, 每行 "偏移 长度" (与 DALI tfrecord2idx 格式相同)
+    <out>/train_shards.json                  清单: 分片列表、每个分片的样本数和字节数
+分片按文件大小用 LPT (最长处理时间优先) 贪心分配, 各分片字节数接近, 并行读取时负载均衡。
+
+训练时通过 tf_input_pipeline.build_dataset(shard_dir=...) 以 interleave 方式并行读取多个分片,
+小文件随机读变为少量大文件的顺序读, 适合 NFS / SD 卡存储。
+
+使用方法:
+    python dataset_shards.py --root garbage --out garbage/shards --shard-size-mb 128
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+import tensorflow as tf
+
+# 共享的数据集工具 (列表文件 / 分片分配 / 图像缓存) 位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from dataset_common import plan_shards, read_list_file
+
+DEFAULT_SHARD_SIZE_MB = 128
+# TFRecord 每条记录的额外开销: 长度(8) + 长度CRC(4) + 数据CRC(4)
+TFRECORD_OVERHEAD = 16
+
+
+def shard_name(split, shard, num_shards):
+    return f'{split}-{shard:05d}-of-{num_shards:05d}.tfrecord'
+
+
+def manifest_path(shard_dir, split):
+    return os.path.join(shard_dir, f'{split}_shards.json')
+
+
+def load_manifest(shard_dir, split):
+    with open(manifest_path(shard_dir, split), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def make_example(image_bytes, label, img_path):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image_bytes])),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+        'path': tf.train.Feature(bytes_list=tf.train.BytesList(value=[img_path.encode('utf-8')])),
+    }))
+
+
+def write_shards(root_dir, txt_file, out_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None):
+    """
+    打包一个列表文件, 返回清单 dict
+    Args:
+        shard_size_mb: 目标分片大小, num_shards 未指定时据此计算分片数
+        num_shards: 指定分片数 (建议不少于训练时的并行读取数)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    split = os.path.splitext(os.path.basename(txt_file))[0]
+    data = read_list_file(root_dir, txt_file)
+
+    entries, sizes = [], []
+    for img_path, label in data:
+        full_path = os.path.join(root_dir, img_path)
+        if not os.path.exists(full_path):
+            print(f"警告：跳过不存在的图片 {img_path}")
+            continue
+        entries.append((img_path, label))
+        sizes.append(os.path.getsize(full_path))
+
+    total_bytes = sum(sizes)
+    if num_shards is None:
+        num_shards = max(1, math.ceil(total_bytes / (shard_size_mb * 1024 * 1024)))
+    num_shards = max(1, min(num_shards, len(entries)))
+    plan = plan_shards(sizes, num_shards)
+
+    shards = []
+    for shard, indices in enumerate(plan):
+        name = shard_name(split, shard, num_shards)
+        offset = 0
+        with tf.io.TFRecordWriter(os.path.join(out_dir, name)) as writer, \
+                open(os.path.join(out_dir, name + '.idx'), 'w') as index_file:
+            for idx in indices:
+                img_path, label = entries[idx]
+                with open(os.path.join(root_dir, img_path), 'rb') as f:
+                    record = make_example(f.read(), label, img_path).SerializeToString()
+                writer.write(record)
+                length = len(record) + TFRECORD_OVERHEAD
+                index_file.write(f"{offset} {length}\n")
+                offset += length
+        shards.append({'file': name, 'count': len(indices), 'bytes': offset})
+        print(f"  {name}: {len(indices)} 张, {offset / 1024 / 1024:.1f} MB")
+
+    manifest = {
+        'split': split,
+        'list_file': txt_file,
+        'num_samples': len(entries),
+        'shards': shards,
+    }
+    with open(manifest_path(out_dir, split), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    shard_bytes = [shard['bytes'] for shard in shards]
+    print(f"{txt_file}: {len(entries)} 张图片 -> {num_shards} 个分片, "
+          f"分片大小 {min(shard_bytes) / 1024 / 1024:.1f}~{max(shard_bytes) / 1024 / 1024:.1f} MB")
+    return manifest
+
+
+def read_index(index_path):
+    """读取分片索引, 返回 [(偏移, 长度)], 可配合 seek 随机读取单条记录"""
+    with open(index_path, 'r') as f:
+        return [tuple(int(v) for v in line.split()) for line in f if line.strip()]
+
+
+def parse_example(record):
+    features = tf.io.parse_single_example(record, {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    })
+    return features['image'], tf.cast(features['label'], tf.int32)
+
+
+def shard_source(shard_dir, split, is_training=True, seed=None, cycle_length=None,
+                 num_shards=1, shard_index=0):
+    """
+    并行交错读取分片, 返回 (JPEG 字节, 标签) 数据集
+    训练时打乱分片顺序; cycle_length 为同时读取的分片数 (默认 AUTOTUNE 决定并行度, 最多 8 个)
+    """
+    manifest = load_manifest(shard_dir, split)
+    files = [os.path.join(shard_dir, shard['file']) for shard in manifest['shards']]
+
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+    if num_shards > 1:
+        dataset = dataset.shard(num_shards, shard_index)
+    if is_training:
+        dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+
+    dataset = dataset.interleave(
+        lambda path: tf.data.TFRecordDataset(path, buffer_size=8 * 1024 * 1024),
+        cycle_length=cycle_length or min(len(files), 8),
+        block_length=1,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True
+    )
+    return dataset.map(parse_example, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pack dataset lists into size-balanced TFRecord shards')
+    parser.add_argument('--root', type=str, default='garbage',
+                        help='Dataset root directory (default: garbage)')
+    parser.add_argument('--lists', type=str, nargs='+', default=['train.txt', 'validate.txt'],
+                        help='List files to pack (default: train.txt validate.txt)')
+    parser.add_argument('--out', type=str, default=None,
+                        help='Output directory (default: <root>/shards)')
+    parser.add_argument('--shard-size-mb', type=float, default=DEFAULT_SHARD_SIZE_MB,
+                        help=f'Target shard size in MB (default: {DEFAULT_SHARD_SIZE_MB})')
+    parser.add_argument('--num-shards', type=int, default=None,
+                        help='Number of shards per list, overrides --shard-size-mb')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    out_dir = args.out or os.path.join(args.root, 'shards')
+    for txt_file in args.lists:
+        write_shards(args.root, txt_file, out_dir, args.shard_size_mb, args.num_shards)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Keras 分类模型的 TFLite 全整数 (INT8) 量化导出工具
+
+- 代表性数据集取自 GarbageDataset (validate.txt), 用于校准激活范围
+- 输入/输出均为 uint8, 全部算子限定为 TFLITE_BUILTINS_INT8, 可直接走 XNNPACK 的 QS8 内核
+- 在验证集上对比 float16 与 INT8 模型的准确率和单张延迟, 生成 tflite_report.json
+  GarbageDetectorTFLite.from_report() 可直接读取该报告选择模型
+
+使用方法:
+    python export_tflite_int8.py --keras-model garbage_classifier.h5
+    python export_tflite_int8.py --keras-model garbage_classifier.h5 --float-model garbage_classifier.tflite --max-eval 1000
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+NUM_CLASSES = 40
+REPORT_FILE = 'tflite_report.json'
+MAX_ACCURACY_DROP = 1.0  # INT8 模型相对 float16 可接受的最大准确率下降(百分点)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export a full-integer quantized TFLite classifier')
+    parser.add_argument('--keras-model', type=str, default='garbage_classifier.h5',
+                        help='Trained Keras model (default: garbage_classifier.h5)')
+    parser.add_argument('--data-root', type=str, default='garbage',
+                        help='Dataset root containing validate.txt (default: garbage)')
+    parser.add_argument('--output', type=str, default='garbage_classifier_int8.tflite',
+                        help='INT8 TFLite output path (default: garbage_classifier_int8.tflite)')
+    parser.add_argument('--float-model', type=str, default='garbage_classifier.tflite',
+                        help='Existing float16 TFLite model to compare against (default: garbage_classifier.tflite)')
+    parser.add_argument('--report', type=str, default=REPORT_FILE,
+                        help=f'Comparison report path (default: {REPORT_FILE})')
+    parser.add_argument('--num-calibration', type=int, default=200,
+                        help='Representative samples used for calibration (default: 200)')
+    parser.add_argument('--max-eval', type=int, default=500,
+                        help='Validation samples used for the report (default: 500)')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Interpreter threads used for latency measurement (default: 4)')
+    return parser.parse_args()
+
+
+def evenly_spaced_indices(total, num_samples):
+    """在 [0, total) 中均匀抽取 num_samples 个下标; 列表文件按类别排序, 取前 N 个会只覆盖前几个类别"""
+    return np.linspace(0, total - 1, num=min(num_samples, total), dtype=np.int64)
+
+
+def representative_dataset_from(dataset, num_samples):
+    """
+    基于 GarbageDataset 构建代表性数据集生成器
+    样本均匀抽取, 覆盖所有类别; 预处理与训练时一致 (RGB, [0, 1] float32)
+    """
+    indices = evenly_spaced_indices(len(dataset.data), num_samples)
+
+    def generator():
+        for idx in indices:
+            img = np.asarray(dataset.preprocess_image(idx), dtype=np.float32)
+            yield [img[np.newaxis, ...]]
+
+    return generator
+
+
+def convert_to_tflite_int8(model, dataset, filename='garbage_classifier_int8.tflite', num_samples=200):
+    """转换为输入输出均为 uint8 的全整数 TFLite 模型"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset_from(dataset, num_samples)
+    # 只允许整数算子, 转换失败时直接报错而不是悄悄回退到 float 算子
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    tflite_model = converter.convert()
+
+    with open(filename, 'wb') as f:
+        f.write(tflite_model)
+    print(f"INT8 TFLite模型已保存为: {filename} ({len(tflite_model) / 1024:.1f} KB)")
+    return filename
+
+
+def find_class_output(output_details):
+    """多输出模型 (如 trainv2 的 box + class) 中找到分类输出"""
+    for detail in output_details:
+        if detail['shape'][-1] == NUM_CLASSES:
+            return detail
+    return output_details[0]
+
+
+def quantize_input(img, detail):
+    """将 [0, 1] float 图像转换为模型要求的输入类型"""
+    if detail['dtype'] == np.float32:
+        return img.astype(np.float32)
+    scale, zero_point = detail['quantization']
+    info = np.iinfo(detail['dtype'])
+    return np.clip(np.round(img / scale + zero_point), info.min, info.max).astype(detail['dtype'])
+
+
+def evaluate_tflite(model_path, dataset, max_eval, threads):
+    """在验证集上评估 TFLite 模型的 top-1 准确率和单张推理延迟"""
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=threads)
+    interpreter.allocate_tensors()
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = find_class_output(interpreter.get_output_details())
+
+    # 与代表性数据集一样均匀抽样, 准确率覆盖所有类别
+    samples = evenly_spaced_indices(len(dataset.data), max_eval)
+    correct = 0
+    latencies = []
+    for idx in samples:
+        label = dataset.data[idx][1]
+        img = np.asarray(dataset.preprocess_image(idx), dtype=np.float32)
+        input_data = quantize_input(img[np.newaxis, ...], input_detail)
+
+        start = time.perf_counter()
+        interpreter.set_tensor(input_detail['index'], input_data)
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_detail['index'])[0]
+        latencies.append(time.perf_counter() - start)
+
+        if int(np.argmax(output)) == label:
+            correct += 1
+
+    # 去掉第一次调用 (XNNPACK 委托初始化)
+    timed = latencies[1:] or latencies
+    return {
+        'path': os.path.basename(model_path),
+        'input_dtype': np.dtype(input_detail['dtype']).name,
+        'output_dtype': np.dtype(output_detail['dtype']).name,
+        'accuracy': round(100.0 * correct / max(len(samples), 1), 2),
+        'latency_ms': round(1000.0 * float(np.mean(timed)), 3),
+        'latency_p90_ms': round(1000.0 * float(np.percentile(timed, 90)), 3),
+        'size_kb': round(os.path.getsize(model_path) / 1024, 1),
+        'num_samples': len(samples),
+        'threads': threads,
+    }
+
+
+def write_report(report_path, results, max_accuracy_drop=MAX_ACCURACY_DROP):
+    """
+    生成对比报告, 'recommended' 为部署时应使用的模型:
+    INT8 准确率下降不超过 max_accuracy_drop 且延迟更低时选择 INT8, 否则选择 float16
+    报告应在部署设备上生成, 延迟对比才有意义
+    """
+    recommended = 'int8'
+    if 'float16' in results and 'int8' in results:
+        drop = results['float16']['accuracy'] - results['int8']['accuracy']
+        if drop > max_accuracy_drop or results['int8']['latency_ms'] >= results['float16']['latency_ms']:
+            recommended = 'float16'
+    elif 'int8' not in results:
+        recommended = 'float16'
+
+    report = {
+        'recommended': recommended,
+        'max_accuracy_drop': max_accuracy_drop,
+        'models': results,
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n模型对比:")
+    print(f"{'模型':<10} | {'准确率':>8} | {'延迟(ms)':>9} | {'P90(ms)':>8} | {'大小(KB)':>9}")
+    print("-" * 56)
+    for name, result in results.items():
+        print(f"{name:<10} | {result['accuracy']:>7.2f}% | {result['latency_ms']:>9.2f} | "
+              f"{result['latency_p90_ms']:>8.2f} | {result['size_kb']:>9.1f}")
+    print(f"\n推荐部署模型: {recommended} ({results[recommended]['path']})")
+    print(f"报告已保存为: {report_path}")
+    return report
+
+
+def export_and_report(model, dataset, output='garbage_classifier_int8.tflite',
+                      float_model='garbage_classifier.tflite', report_path=REPORT_FILE,
+                      num_calibration=200, max_eval=500, threads=4):
+    """导出 INT8 模型, 并与已有的 float16 模型对比生成报告"""
+    convert_to_tflite_int8(model, dataset, output, num_calibration)
+
+    # 报告中的模型路径相对于报告所在目录, 部署时将报告和模型放在一起即可
+    results = {}
+    if float_model and os.path.exists(float_model):
+        results['float16'] = evaluate_tflite(float_model, dataset, max_eval, threads)
+    else:
+        print(f"未找到 float16 模型 {float_model}, 报告中仅包含 INT8 结果")
+    results['int8'] = evaluate_tflite(output, dataset, max_eval, threads)
+
+    return write_report(report_path, results)
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(args.keras_model):
+        print(f"错误: 未找到Keras模型文件 {args.keras_model}")
+        return
+
+    # 复用训练脚本中的数据加载器, 保证校准数据与训练预处理一致
+    from trainv1_MobileNetV2 import GarbageDataset
+
+    dataset = GarbageDataset(args.data_root, 'validate.txt', is_training=False)
+    model = tf.keras.models.load_model(args.keras_model, compile=False)
+
+    export_and_report(
+        model, dataset,
+        output=args.output,
+        float_model=args.float_model,
+        report_path=args.report,
+        num_calibration=args.num_calibration,
+        max_eval=args.max_eval,
+        threads=args.threads
+    )
+
+
+if __name__ == '__main__':
+    main()
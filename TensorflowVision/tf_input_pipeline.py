@@ -0,0 +1,258 @@
+"""
+GarbageDataset 的原生 tf.data 输入管道
+
+替代 create_dataset 中基于 Python generator 的 from_generator:
+- 文件列表 (train.txt / validate.txt) -> from_tensor_slices, 可按 shard 切分给多个 worker
+- 或者从 dataset_shards.py 生成的 TFRecord 分片中 interleave 并行读取
+- read_file + decode_image + resize 在图内并行执行 (map + AUTOTUNE), 不再受 GIL 限制 (JPEG / PNG 都支持)
+- 训练集每个 epoch 在解码之前对完整的文件列表重新打乱 (列表通常按类别排序, 有限的 shuffle 缓冲区打不散)
+- 验证集解码后的 uint8 图片 cache 到内存或文件, 之后的 epoch 不再解码
+- 增强使用 stateless 随机算子, 种子由 (seed, 元素序号) 决定, 相同 seed 得到相同的数据流
+- batch 之后 prefetch, 与模型计算重叠
+
+使用方法 (输入管道吞吐量 vs 模型单步耗时):
+    python tf_input_pipeline.py --root garbage --list train.txt --arch mobilenetv2 --steps 50
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from functools import partial
+
+import tensorflow as tf
+
+from dataset_shards import shard_source
+
+# 共享的数据集工具 (列表文件 / 分片分配 / 图像缓存) 位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from dataset_common import cache_paths, load_manifest, read_list_file, scan_sources
+
+IMG_SIZE = 224
+BATCH_SIZE = 32
+SHUFFLE_BUFFER = 1000  # 分片模式的 shuffle 缓冲区 (分片写入时已经打乱, 读取时只需要局部打乱)
+DEFAULT_SEED = 42
+
+
+def decode_and_resize(image_bytes, img_size):
+    """解码 JPEG / PNG 字节, 缩放为 img_size (uint8 RGB, 与 cv2 读取 + cvtColor + resize 一致)"""
+    img = tf.io.decode_image(image_bytes, channels=3, expand_animations=False)
+    img = tf.image.resize(img, (img_size, img_size), method='bilinear')
+    return tf.cast(tf.round(img), tf.uint8)
+
+
+def augment_basic(img, seed, flip_prob=0.5):
+    """
+    trainv2 / DenseNet121 / ResNet50V2 原有的增强: 按概率水平翻转 + 随机亮度(±0.2)
+    DenseNet121 / ResNet50V2 原实现在 50% 概率下再调用 random_flip_left_right, 实际翻转概率为 0.25
+    """
+    flip_seed, brightness_seed = tf.unstack(tf.random.experimental.stateless_split(seed, num=2))
+    flip = tf.random.stateless_uniform([], flip_seed) < flip_prob
+    img = tf.cond(flip, lambda: tf.image.flip_left_right(img), lambda: img)
+    return tf.image.stateless_random_brightness(img, 0.2, brightness_seed)
+
+
+def augment_full(img, seed):
+    """trainv1_MobileNetV2 原有的增强: 水平/垂直翻转 + rot90 + 随机亮度(±0.2) + clip"""
+    seeds = tf.unstack(tf.random.experimental.stateless_split(seed, num=4))
+    img = tf.image.stateless_random_flip_left_right(img, seeds[0])
+    img = tf.image.stateless_random_flip_up_down(img, seeds[1])
+    k = tf.random.stateless_uniform([], seeds[2], minval=0, maxval=4, dtype=tf.int32)
+    img = tf.image.rot90(img, k=k)
+    img = tf.image.stateless_random_brightness(img, 0.2, seeds[3])
+    return tf.clip_by_value(img, 0.0, 1.0)
+
+
+def default_cache_path(root_dir, txt_file, img_size):
+    """
+    默认将解码结果缓存到 <root>/cache 下, 与 common/dataset_common.py 的图像缓存使用同一目录
+    文件名包含列表中每张图片的路径、标签和内容哈希, 列表或任意一张图片变化后自动使用新的缓存;
+    大小和修改时间未变的图片沿用 dataset_common.py 清单中的哈希, 不重新读取文件
+    """
+    cache_dir = os.path.join(root_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(txt_file))[0]
+    old_manifest = load_manifest(cache_paths(cache_dir, txt_file)['manifest'])
+    entries = scan_sources(root_dir, read_list_file(root_dir, txt_file), old_manifest)
+    sha1 = hashlib.sha1()
+    for entry in entries:
+        sha1.update(f"{entry['path']}\t{entry['label']}\t{entry['size']}\t{entry['sha1']}\n".encode('utf-8'))
+    return os.path.join(cache_dir, f'tfdata_{name}_{img_size}_{sha1.hexdigest()[:10]}')
+
+
+def remove_stale_lockfiles(cache):
+    """
+    删除中断的运行留下的 <cache>*.lockfile
+    tf.data 写文件缓存时先创建 lockfile, 进程被杀掉后不会删除, 下一次运行会因此报错退出
+    """
+    for lockfile in glob.glob(glob.escape(cache) + '*.lockfile'):
+        print(f"删除残留的缓存锁文件: {lockfile}")
+        os.remove(lockfile)
+
+
+def build_dataset(root_dir, txt_file, is_training=True, batch_size=BATCH_SIZE, img_size=IMG_SIZE,
+                  augment=augment_basic, target_fn=None, cache=None, seed=DEFAULT_SEED,
+                  num_shards=1, shard_index=0, repeat=True, shard_dir=None):
+    """
+    构建 tf.data 输入管道
+    Args:
+        augment: 训练时的增强函数 augment(img, seed), img 为 [0, 1] float32
+        target_fn: 可选, (img, label) -> (img, targets), 用于多输出模型 (如 trainv2 的 box + class)
+        cache: None 使用默认缓存 (文件模式的验证集缓存到 <root>/cache, 训练集和分片模式不缓存),
+               '' 缓存到内存, False 不缓存, 其他字符串为缓存文件路径;
+               训练集指定缓存时, 缓存之后的 shuffle 缓冲区为整个数据集, 需要能放下全部解码后的图片
+        num_shards / shard_index: 多 worker 训练时每个 worker 读取的分片
+        repeat: 是否无限重复 (配合 fit 的 steps_per_epoch 使用, 与原 generator 行为一致)
+        shard_dir: 指定时从该目录下的 TFRecord 分片读取 (见 dataset_shards.py), 不再打开单个图片文件
+    Returns:
+        tf.data.Dataset, 元素为 (images, labels) 批次
+    """
+    # 训练集不缓存时在解码之前打乱完整的文件列表; 缓存会固定第一个 epoch 的顺序, 因此训练集默认不缓存
+    shuffle_paths = is_training and not shard_dir and (cache is None or cache is False)
+    if shard_dir:
+        split = os.path.splitext(os.path.basename(txt_file))[0]
+        dataset = shard_source(shard_dir, split, is_training, seed,
+                               num_shards=num_shards, shard_index=shard_index)
+    else:
+        data = read_list_file(root_dir, txt_file)
+        paths = [os.path.join(root_dir, img_path) for img_path, _ in data]
+        labels = [label for _, label in data]
+
+        dataset = tf.data.Dataset.from_tensor_slices((paths, tf.constant(labels, dtype=tf.int32)))
+        if num_shards > 1:
+            dataset = dataset.shard(num_shards, shard_index)
+        if shuffle_paths:
+            # 打乱的是文件路径, 缓冲区为整个列表也只占很少内存; 每个 epoch 的顺序由 seed 决定
+            dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(lambda path, label: (tf.io.read_file(path), label))
+
+    dataset = dataset.map(lambda image_bytes, label: (decode_and_resize(image_bytes, img_size), label),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+
+    if cache is None and (shard_dir or shuffle_paths):
+        # 分片模式默认每个 epoch 直接流式读取分片, 不额外占用内存或本地磁盘
+        cache = False
+    elif cache is None:
+        cache = default_cache_path(root_dir, txt_file, img_size)
+        if num_shards > 1:
+            cache += f'_shard{shard_index}of{num_shards}'
+    if cache:
+        remove_stale_lockfiles(cache)
+    if cache is not False:
+        dataset = dataset.cache(cache)
+
+    if is_training and shard_dir:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, seed=seed, reshuffle_each_iteration=True)
+    elif is_training and not shuffle_paths:
+        # 训练集显式指定了缓存: 缓存之后对整个数据集打乱
+        dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    if repeat:
+        dataset = dataset.repeat()
+
+    def to_float(index, element):
+        img, label = element
+        img = tf.cast(img, tf.float32) / 255.0
+        if is_training and augment is not None:
+            # 每个元素的随机种子由全局序号决定, 与并行度和执行顺序无关
+            img = augment(img, tf.stack([tf.constant(seed, tf.int64), index]))
+        return img, label
+
+    # enumerate 放在 repeat 之后, 每个 epoch 的增强参数都不同
+    dataset = dataset.enumerate().map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+    if target_fn is not None:
+        dataset = dataset.map(target_fn, num_parallel_calls=tf.data.AUTOTUNE)
+
+    dataset = dataset.batch(batch_size)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def measure_pipeline(dataset, steps, warmup=5):
+    """输入管道单独运行的吞吐量 (张/秒)"""
+    iterator = iter(dataset)
+    for _ in range(warmup):
+        next(iterator)
+    images = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        batch, _ = next(iterator)
+        images += int(batch.shape[0])
+    return images / (time.perf_counter() - start)
+
+
+def measure_step_time(model, dataset, steps, warmup=3):
+    """模型单步训练耗时 (秒), 输入为预先取出的固定批次, 不包含数据加载"""
+    inputs, targets = next(iter(dataset))
+    for _ in range(warmup):
+        model.train_on_batch(inputs, targets)
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.train_on_batch(inputs, targets)
+    return (time.perf_counter() - start) / steps, int(inputs.shape[0])
+
+
+def report(pipeline_ips, step_time, batch_size):
+    model_ips = batch_size / step_time
+    print(f"\n输入管道吞吐量: {pipeline_ips:>9.1f} 张/秒")
+    print(f"模型训练吞吐量: {model_ips:>9.1f} 张/秒 (单步 {step_time * 1000:.1f} ms, 批大小 {batch_size})")
+    if pipeline_ips < model_ips:
+        print(f"输入管道是瓶颈: 模型约有 {100 * (1 - pipeline_ips / model_ips):.0f}% 的时间在等待数据")
+    else:
+        print(f"输入管道余量 {pipeline_ips / model_ips:.2f}x, 模型计算是瓶颈")
+
+
+def load_trainer(arch):
+    """按结构导入对应的训练脚本, 复用其中的 create_model"""
+    if arch == 'densenet121':
+        import trainv1_DenseNet121 as trainer
+    elif arch == 'resnet50v2':
+        import trainv1_ResNet50V2 as trainer
+    else:
+        import trainv1_MobileNetV2 as trainer
+    return trainer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the tf.data input pipeline against model step time')
+    parser.add_argument('--root', type=str, default='garbage',
+                        help='Dataset root directory (default: garbage)')
+    parser.add_argument('--list', type=str, default='train.txt',
+                        help='List file (default: train.txt)')
+    parser.add_argument('--arch', type=str, default='mobilenetv2',
+                        choices=['mobilenetv2', 'densenet121', 'resnet50v2'],
+                        help='Trainer whose model is timed (default: mobilenetv2)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'Batch size (default: {BATCH_SIZE})')
+    parser.add_argument('--steps', type=int, default=50,
+                        help='Timed steps (default: 50)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the decoded image cache')
+    parser.add_argument('--shard-dir', type=str, default=None,
+                        help='Read TFRecord shards from this directory instead of image files')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f'Pipeline seed (default: {DEFAULT_SEED})')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    trainer = load_trainer(args.arch)
+    augment = augment_full if args.arch == 'mobilenetv2' else partial(augment_basic, flip_prob=0.25)
+
+    dataset = build_dataset(args.root, args.list, is_training=True, batch_size=args.batch_size,
+                            augment=augment, cache=False if args.no_cache else None, seed=args.seed,
+                            shard_dir=args.shard_dir)
+    pipeline_ips = measure_pipeline(dataset, args.steps)
+
+    model = trainer.create_model()
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    step_time, batch_size = measure_step_time(model, dataset, args.steps)
+    report(pipeline_ips, step_time, batch_size)
+
+
+if __name__ == '__main__':
+    main()
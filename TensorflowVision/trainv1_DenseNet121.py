@@ -1,8 +1,14 @@
 import os
+import sys
+from functools import partial
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers, models
 import cv2
+# 共享的数据集工具 (列表文件 / 分片分配 / 图像缓存) 位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from dataset_common import build_cache
+from tf_input_pipeline import augment_basic, build_dataset
 # GPU 配置
 def configure_gpu():
     # 获取可用的GPU列表
@@ -29,10 +35,16 @@ configure_gpu()
 IMG_SIZE = 224
 BATCH_SIZE = 32
 NUM_CLASSES = 40
+USE_IMAGE_CACHE = True  # load_image 使用预处理的内存映射图像缓存 (见 common/dataset_common.py); 训练走 tf.data 管道 (use_cache=False),
+                        # 该默认值只用于 export_tflite_int8.py 等逐张读取图片的外部调用方
+SHARD_DIR = None        # TFRecord 分片目录 (见 dataset_shards.py), 如 'garbage/shards'; None 表示直接读取图片文件
 
 class GarbageDataset:
-    def __init__(self, root_dir, txt_file, is_training=True):
+    def __init__(self, root_dir, txt_file, is_training=True, use_cache=USE_IMAGE_CACHE,
+                 shard_dir=SHARD_DIR):
         self.root_dir = root_dir
+        self.txt_file = txt_file
+        self.shard_dir = shard_dir
         self.is_training = is_training
         
         # 读取文件列表
@@ -45,19 +57,30 @@ class GarbageDataset:
                 
         self.num_samples = len(self.data)
         print(f"加载了 {self.num_samples} 个样本")
+        # 内存映射缓存在首次访问时才打开
+        self.cache_file = None
+        self.images = None
+        if use_cache:
+            self.cache_file = build_cache(root_dir, txt_file, IMG_SIZE)['images']
     
-    def preprocess_image(self, img_path):
-        # 读取和预处理图片
+    def load_image(self, idx):
+        # 优先从缓存读取 uint8 RGB 图片 (内存映射切片, 不发生拷贝)
+        if self.cache_file is not None:
+            if self.images is None:
+                self.images = np.load(self.cache_file, mmap_mode='r')
+            return self.images[idx]
+        
+        img_path, _ = self.data[idx]
         img = cv2.imread(os.path.join(self.root_dir, img_path))
         if img is None:
             print(f"警告：无法读取图片 {img_path}")
-            # 返回一个空白图片作为替代
-            img = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
-        else:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = cv2.resize(img, (IMG_SIZE, IMG_SIZE))
-        
-        img = img.astype(np.float32) / 255.0
+            return np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return cv2.resize(img, (IMG_SIZE, IMG_SIZE))
+    
+    def preprocess_image(self, idx):
+        # 读取和预处理图片
+        img = self.load_image(idx).astype(np.float32) / 255.0
         
         if self.is_training:
             # 数据增强
@@ -68,26 +91,9 @@ class GarbageDataset:
         return img
     
     def create_dataset(self):
-        def generator():
-            while True:  # 添加无限循环
-                indices = np.random.permutation(len(self.data))
-                for idx in indices:
-                    img_path, label = self.data[idx]
-                    yield self.preprocess_image(img_path), label
-        
-        dataset = tf.data.Dataset.from_generator(
-            generator,
-            output_signature=(
-                tf.TensorSpec(shape=(IMG_SIZE, IMG_SIZE, 3), dtype=tf.float32),
-                tf.TensorSpec(shape=(), dtype=tf.int32)
-            )
-        )
-        
-        # 设置批处理
-        dataset = dataset.batch(BATCH_SIZE)
-        dataset = dataset.prefetch(tf.data.AUTOTUNE)
-        
-        return dataset
+        # 原生 tf.data 管道: 图内并行解码/缩放/增强, 解码结果缓存, 见 tf_input_pipeline.py
+        return build_dataset(self.root_dir, self.txt_file, self.is_training, BATCH_SIZE, IMG_SIZE,
+                             augment=partial(augment_basic, flip_prob=0.25), shard_dir=self.shard_dir)
 
 def create_model():
     base_model = tf.keras.applications.DenseNet121(
@@ -123,8 +129,9 @@ def convert_to_tflite(model, dataset, filename='garbage_classifier.tflite'):
 
 def main():
     # 创建数据集
-    train_dataset = GarbageDataset('garbage', 'train.txt', is_training=True)
-    val_dataset = GarbageDataset('garbage', 'validate.txt', is_training=False)
+    # tf.data 管道自带解码缓存, 训练时不需要再构建 numpy 内存映射缓存
+    train_dataset = GarbageDataset('garbage', 'train.txt', is_training=True, use_cache=False)
+    val_dataset = GarbageDataset('garbage', 'validate.txt', is_training=False, use_cache=False)
     
     train_data = train_dataset.create_dataset()
     val_data = val_dataset.create_dataset()
@@ -0,0 +1,162 @@
+"""
+可恢复训练的完整状态检查点
+
+- AsyncCheckpointer: 在训练线程中把状态拷贝到 CPU (快照), 由后台线程写盘, 训练循环不等待磁盘;
+  先写临时文件再原子替换, 只保留最近 keep 个检查点
+- capture_rng_state / restore_rng_state: python / numpy / torch (CPU + CUDA) 随机数状态
+- EpochRandomSampler + ResumableSampler: 每个 epoch 的打乱顺序只由 (seed, epoch) 决定,
+  恢复时跳过当前 epoch 中已经训练过的样本, 数据加载位置与中断前一致
+
+检查点文件名: <dir>/ckpt_step00001234.pth
+"""
+import glob
+import os
+import queue
+import random
+import re
+import threading
+from itertools import islice
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+CHECKPOINT_PATTERN = 'ckpt_step{:08d}.pth'
+
+
+def snapshot(obj):
+    """递归拷贝状态中的张量到 CPU, 之后训练继续原地更新参数也不会影响正在写盘的快照"""
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def capture_rng_state():
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def list_checkpoints(directory):
+    """按步数从小到大返回检查点路径"""
+    def step_of(path):
+        match = re.search(r'ckpt_step(\d+)\.pth$', path)
+        return int(match.group(1)) if match else -1
+    paths = [p for p in glob.glob(os.path.join(directory, 'ckpt_step*.pth')) if step_of(p) >= 0]
+    return sorted(paths, key=step_of)
+
+
+def latest_checkpoint(directory):
+    paths = list_checkpoints(directory)
+    return paths[-1] if paths else None
+
+
+class AsyncCheckpointer:
+    """后台线程写检查点, 最多保留 keep 个"""
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        # 队列长度为 1: 上一个检查点尚未写完时, 下一次保存会等待, 内存中最多两份快照
+        self.queue = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self._worker, name='checkpoint-writer', daemon=True)
+        self.thread.start()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            state, step = item
+            try:
+                self._write(state, step)
+            except Exception as e:  # 写盘失败不应中断训练, 在下一次保存时报告
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _write(self, state, step):
+        path = os.path.join(self.directory, CHECKPOINT_PATTERN.format(step))
+        tmp_path = path + '.tmp'
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+
+    def save(self, state, step):
+        """拷贝快照后立即返回, 写盘在后台完成"""
+        if self.error is not None:
+            print(f"警告：上一次检查点写入失败: {self.error}")
+            self.error = None
+        self.queue.put((snapshot(state), step))
+
+    def wait(self):
+        """等待所有已提交的检查点写完"""
+        self.queue.join()
+
+    def close(self):
+        self.wait()
+        self.queue.put(None)
+        self.thread.join()
+
+
+class EpochRandomSampler(Sampler):
+    """每个 epoch 的随机顺序只由 (seed, epoch) 决定, 可以在任意 epoch 复现"""
+    def __init__(self, num_samples, seed=0):
+        self.num_samples = num_samples
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        return iter(torch.randperm(self.num_samples, generator=generator).tolist())
+
+
+class ResumableSampler(Sampler):
+    """
+    包装一个支持 set_epoch 的采样器, 恢复训练时跳过当前 epoch 的前 start 个样本
+    跳过只作用于下一次迭代, 之后的 epoch 从头开始
+    """
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.start = 0
+
+    def set_epoch(self, epoch):
+        self.sampler.set_epoch(epoch)
+
+    def set_start(self, start):
+        self.start = start
+
+    def __len__(self):
+        # 始终返回完整 epoch 的长度, 恢复时批次编号从跳过的位置继续
+        return len(self.sampler)
+
+    def __iter__(self):
+        start, self.start = self.start, 0
+        return islice(iter(self.sampler), start, None)
@@ -8,9 +8,15 @@ import serial
 DEBUG_WINDOW = False
 ENABLE_SERIAL = True
 THREADS=4
+OPTIMIZE_FOR_INFERENCE = True  # 加载冻结模型(export_torchscript.py 导出)后执行 optimize_for_inference
 # 串口配置
 SERIAL_PORT = '/dev/ttyS0'
 SERIAL_BAUD = 9600
+CONF_THRESHOLD = 0.5  # 置信度阈值
+# 多裁剪(网格)批量推理配置
+MULTI_CROP = False    # 开启后使用重叠网格裁剪代替单一中心裁剪
+CROP_GRID = (3, 3)    # 网格行数, 列数
+CROP_OVERLAP = 0.25   # 相邻裁剪块之间的最小重叠比例
 
 def setup_gpu():
     if not torch.cuda.is_available():
@@ -29,8 +35,15 @@ class GarbageDetectorPyTorch:
         
         self.model = torch.jit.load(model_path, map_location=self.device)
         self.model.eval()
+        if OPTIMIZE_FOR_INFERENCE and self.device.type == 'cpu' and self.is_frozen(self.model):
+            try:
+                self.model = torch.jit.optimize_for_inference(self.model)
+                print("已对冻结模型执行 optimize_for_inference")
+            except Exception as e:
+                print(f"optimize_for_inference 失败, 使用原模型: {str(e)}")
         
         self.IMG_SIZE = 224
+        self.crop_boxes_cache = {}
         
         self.categories = {
             '其他垃圾': {'color': (128, 128, 128), 'code': '0'},
@@ -48,6 +61,11 @@ class GarbageDetectorPyTorch:
                 print(f"串口初始化失败: {str(e)}")
                 self.serial_port = None
 
+    @staticmethod
+    def is_frozen(model):
+        # torch.jit.freeze 会将参数内联为常量, 冻结模型不再包含参数
+        return next(model.parameters(), None) is None
+
     def preprocess_image(self, img):
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         img = cv2.resize(img, (self.IMG_SIZE, self.IMG_SIZE))
@@ -57,6 +75,13 @@ class GarbageDetectorPyTorch:
         img = torch.from_numpy(img).to(self.device)
         return img
 
+    def preprocess_batch(self, rois):
+        # 多个裁剪块统一缩放后堆叠为一个批次, 颜色转换和归一化只做一次
+        batch = np.stack([cv2.resize(roi, (self.IMG_SIZE, self.IMG_SIZE)) for roi in rois])
+        batch = batch[..., ::-1].astype(np.float32) / 255.0
+        batch = np.ascontiguousarray(np.transpose(batch, (0, 3, 1, 2)))
+        return torch.from_numpy(batch).to(self.device)
+
     def get_category(self, label):
         for category in self.categories.keys():
             if label.startswith(category):
@@ -72,7 +97,140 @@ class GarbageDetectorPyTorch:
             except Exception as e:
                 print(f"串口输出失败: {str(e)}")
 
+    def generate_crop_boxes(self, width, height):
+        """按 CROP_GRID 生成相互重叠的正方形裁剪框 (x1, y1, x2, y2)"""
+        key = (width, height)
+        if key in self.crop_boxes_cache:
+            return self.crop_boxes_cache[key]
+
+        rows, cols = CROP_GRID
+        step_ratio = 1.0 - CROP_OVERLAP
+        # 正方形边长: 保证 rows x cols 个块在给定重叠下覆盖整幅画面
+        size = max(width / (1 + (cols - 1) * step_ratio),
+                   height / (1 + (rows - 1) * step_ratio))
+        size = int(min(size, width, height))
+
+        xs = [round(c * (width - size) / (cols - 1)) if cols > 1 else (width - size) // 2
+              for c in range(cols)]
+        ys = [round(r * (height - size) / (rows - 1)) if rows > 1 else (height - size) // 2
+              for r in range(rows)]
+        boxes = [(x, y, x + size, y + size) for y in ys for x in xs]
+
+        self.crop_boxes_cache[key] = boxes
+        return boxes
+
+    def classify_batch(self, rois):
+        """一次前向推理处理所有裁剪块, 返回 [(class_id, confidence), ...]"""
+        input_data = self.preprocess_batch(rois)
+        with torch.no_grad():
+            output_data = self.model(input_data)
+            probabilities = torch.nn.functional.softmax(output_data, dim=1)
+            confidences, class_ids = probabilities.max(dim=1)
+        return list(zip(class_ids.tolist(), confidences.tolist()))
+
+    def merge_regions(self, boxes, predictions):
+        """
+        将网格中相邻且类别相同的高置信度裁剪块合并为区域。
+        返回: [(区域框, 类别, 标签, 置信度), ...]，按置信度从高到低排序
+        """
+        rows, cols = CROP_GRID
+        cells = {}
+        for idx, (class_id, confidence) in enumerate(predictions):
+            if confidence <= CONF_THRESHOLD:
+                continue
+            label = self.labels.get(str(class_id), "未知类别")
+            category = self.get_category(label)
+            if category is None:
+                continue
+            cells[idx] = (category, label, confidence)
+
+        regions = []
+        visited = set()
+        for start in cells:
+            if start in visited:
+                continue
+            category = cells[start][0]
+            # 网格上按4邻域做连通区域合并
+            stack, members = [start], []
+            visited.add(start)
+            while stack:
+                idx = stack.pop()
+                members.append(idx)
+                r, c = divmod(idx, cols)
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    nidx = nr * cols + nc
+                    if (0 <= nr < rows and 0 <= nc < cols and nidx not in visited
+                            and nidx in cells and cells[nidx][0] == category):
+                        visited.add(nidx)
+                        stack.append(nidx)
+
+            best = max(members, key=lambda m: cells[m][2])
+            box = (min(boxes[m][0] for m in members), min(boxes[m][1] for m in members),
+                   max(boxes[m][2] for m in members), max(boxes[m][3] for m in members))
+            regions.append((box, category, cells[best][1], cells[best][2]))
+
+        regions.sort(key=lambda region: region[3], reverse=True)
+        return regions
+
+    def draw_result(self, frame, box, category, label, confidence):
+        x1, y1, x2, y2 = box
+        color = self.categories[category]['color']
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 0.8
+        thickness = 2
+        padding = 10
+
+        text_category = f"类别: {category}"
+        text_item = f"物品: {label.split('/')[-1]}"
+        text_conf = f"置信度: {confidence:.1%}"
+
+        y_offset = y1 - padding
+        for text in [text_conf, text_item, text_category]:
+            (w, h), _ = cv2.getTextSize(text, font, font_scale, thickness)
+            y_offset -= h + padding
+
+            cv2.rectangle(frame,
+                        (x1, y_offset - padding),
+                        (x1 + w + padding * 2, y_offset + h + padding),
+                        (0, 0, 0),
+                        -1)
+
+            cv2.putText(frame, text,
+                      (x1 + padding, y_offset + h),
+                      font, font_scale, color, thickness)
+
+    def print_result(self, category, label, confidence):
+        print("\n检测结果:")
+        print(f"类别: {category}")
+        print(f"物品: {label.split('/')[-1]}")
+        print(f"置信度: {confidence:.1%}")
+        print("-" * 30)
+
+    def detect_multi_crop(self, frame):
+        height, width = frame.shape[:2]
+        boxes = self.generate_crop_boxes(width, height)
+        rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+
+        predictions = self.classify_batch(rois)
+        regions = self.merge_regions(boxes, predictions)
+
+        for box, category, label, confidence in regions:
+            if DEBUG_WINDOW:
+                self.draw_result(frame, box, category, label, confidence)
+            self.print_result(category, label, confidence)
+
+        # 串口协议每次只能输出一个类别, 发送置信度最高的区域
+        if regions:
+            self.send_serial_data(regions[0][1])
+
+        return frame
+
     def detect(self, frame):
+        if MULTI_CROP:
+            return self.detect_multi_crop(frame)
+
         height, width = frame.shape[:2]
         
         center_x, center_y = width // 2, height // 2
@@ -94,40 +252,11 @@ class GarbageDetectorPyTorch:
         label = self.labels.get(str(class_id), "未知类别")
         category = self.get_category(label)
         
-        if confidence > 0.5:
+        if confidence > CONF_THRESHOLD:
             if DEBUG_WINDOW:
-                color = self.categories[category]['color']
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 0.8
-                thickness = 2
-                padding = 10
-                
-                text_category = f"类别: {category}"
-                text_item = f"物品: {label.split('/')[-1]}"
-                text_conf = f"置信度: {confidence:.1%}"
-                
-                y_offset = y1 - padding
-                for text in [text_conf, text_item, text_category]:
-                    (w, h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                    y_offset -= h + padding
-                    
-                    cv2.rectangle(frame, 
-                                (x1, y_offset - padding), 
-                                (x1 + w + padding * 2, y_offset + h + padding),
-                                (0, 0, 0),
-                                -1)
-                    
-                    cv2.putText(frame, text, 
-                              (x1 + padding, y_offset + h),
-                              font, font_scale, color, thickness)
+                self.draw_result(frame, (x1, y1, x2, y2), category, label, confidence)
             
-            print("\n检测结果:")
-            print(f"类别: {category}")
-            print(f"物品: {label.split('/')[-1]}")
-            print(f"置信度: {confidence:.1%}")
-            print("-" * 30)
+            self.print_result(category, label, confidence)
             
             self.send_serial_data(category)
         
@@ -170,6 +299,7 @@ def main():
     print(f"- 调试窗口: {'开启' if DEBUG_WINDOW else '关闭'}")
     print(f"- 串口输出: {'开启' if ENABLE_SERIAL else '关闭'}")
     print("- 按 'q' 键退出程序")
+    print(f"- 多裁剪推理: {'开启 ' + str(CROP_GRID[0]) + 'x' + str(CROP_GRID[1]) if MULTI_CROP else '关闭'}")
     print("- 将物品放置在画面中心区域")
     print("-" * 30)
     
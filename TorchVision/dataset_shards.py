@@ -0,0 +1,220 @@
+"""
+将 train.txt / validate.txt 对应的图片打包为按大小均衡的 tar 分片 (WebDataset 风格)
+
+每个样本在 tar 中对应两个成员: <key>.jpg (原始 JPEG 字节, 不重新编码) 和 <key>.cls (标签文本),
+因此分片也可以直接用 webdataset / tar 工具读取。输出目录结构:
+    <out>/train-00000-of-00008.tar       分片
+    <out>/train-00000-of-00008.tar.idx   分片索引, 每行 "key 偏移 长度 标签 路径", 偏移指向 JPEG 数据本身
+    <out>/train_shards.json              清单: 分片列表、每个分片的样本数和字节数
+分片按文件大小用 LPT (最长处理时间优先) 贪心分配, 各分片字节数接近, 并行读取时负载均衡。
+
+训练时 GarbageDataset(shard_dir=...) 通过索引 seek + read 随机读取单个样本,
+配合 ShardInterleaveSampler 每次只交错读取少量分片, 读取基本是顺序的,
+DataLoader 的多个 worker 同时读取不同分片。
+
+使用方法:
+    python dataset_shards.py --root garbage --out garbage/shards --shard-size-mb 128
+"""
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tarfile
+
+import numpy as np
+from torch.utils.data import Sampler
+
+# 共享的数据集工具 (列表文件 / 分片分配 / 图像缓存) 位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from dataset_common import plan_shards, read_list_file
+
+DEFAULT_SHARD_SIZE_MB = 128
+TAR_BLOCK = 512
+
+
+def shard_name(split, shard, num_shards):
+    return f'{split}-{shard:05d}-of-{num_shards:05d}.tar'
+
+
+def manifest_path(shard_dir, split):
+    return os.path.join(shard_dir, f'{split}_shards.json')
+
+
+def load_manifest(shard_dir, split):
+    with open(manifest_path(shard_dir, split), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def add_member(tar, name, payload):
+    """写入一个 tar 成员, 返回其数据部分在 tar 文件中的偏移"""
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    tar.addfile(info, io.BytesIO(payload))
+    # addfile 之后 tar.offset 指向数据块(按 512 字节补齐)之后
+    return tar.offset - math.ceil(len(payload) / TAR_BLOCK) * TAR_BLOCK
+
+
+def write_shards(root_dir, txt_file, out_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None):
+    """
+    打包一个列表文件, 返回清单 dict
+    Args:
+        shard_size_mb: 目标分片大小, num_shards 未指定时据此计算分片数
+        num_shards: 指定分片数 (建议不少于 DataLoader 的 num_workers)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    split = os.path.splitext(os.path.basename(txt_file))[0]
+    data = read_list_file(root_dir, txt_file)
+
+    entries, sizes = [], []
+    for img_path, label in data:
+        full_path = os.path.join(root_dir, img_path)
+        if not os.path.exists(full_path):
+            print(f"警告：跳过不存在的图片 {img_path}")
+            continue
+        entries.append((img_path, label))
+        sizes.append(os.path.getsize(full_path))
+
+    total_bytes = sum(sizes)
+    if num_shards is None:
+        num_shards = max(1, math.ceil(total_bytes / (shard_size_mb * 1024 * 1024)))
+    num_shards = max(1, min(num_shards, len(entries)))
+    plan = plan_shards(sizes, num_shards)
+
+    shards = []
+    for shard, indices in enumerate(plan):
+        name = shard_name(split, shard, num_shards)
+        with tarfile.open(os.path.join(out_dir, name), 'w', format=tarfile.USTAR_FORMAT) as tar, \
+                open(os.path.join(out_dir, name + '.idx'), 'w', encoding='utf-8') as index_file:
+            for idx in indices:
+                img_path, label = entries[idx]
+                key = f'{idx:08d}'
+                with open(os.path.join(root_dir, img_path), 'rb') as f:
+                    payload = f.read()
+                offset = add_member(tar, key + '.jpg', payload)
+                add_member(tar, key + '.cls', str(label).encode('ascii'))
+                index_file.write(f"{key} {offset} {len(payload)} {label} {img_path}\n")
+        shard_bytes = os.path.getsize(os.path.join(out_dir, name))
+        shards.append({'file': name, 'count': len(indices), 'bytes': shard_bytes})
+        print(f"  {name}: {len(indices)} 张, {shard_bytes / 1024 / 1024:.1f} MB")
+
+    manifest = {
+        'split': split,
+        'list_file': txt_file,
+        'num_samples': len(entries),
+        'shards': shards,
+    }
+    with open(manifest_path(out_dir, split), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    shard_sizes = [shard['bytes'] for shard in shards]
+    print(f"{txt_file}: {len(entries)} 张图片 -> {num_shards} 个分片, "
+          f"分片大小 {min(shard_sizes) / 1024 / 1024:.1f}~{max(shard_sizes) / 1024 / 1024:.1f} MB")
+    return manifest
+
+
+class ShardReader:
+    """
+    基于分片索引的随机读取器
+    样本按分片顺序编号; 文件句柄按进程懒打开, 可以安全地传给 DataLoader worker
+    """
+    def __init__(self, shard_dir, split):
+        self.shard_dir = shard_dir
+        manifest = load_manifest(shard_dir, split)
+        self.files = [os.path.join(shard_dir, shard['file']) for shard in manifest['shards']]
+
+        shard_ids, offsets, lengths = [], [], []
+        self.data = []
+        for shard_id, path in enumerate(self.files):
+            with open(path + '.idx', 'r', encoding='utf-8') as f:
+                for line in f:
+                    _, offset, length, label, img_path = line.rstrip('\n').split(' ', 4)
+                    shard_ids.append(shard_id)
+                    offsets.append(int(offset))
+                    lengths.append(int(length))
+                    self.data.append((img_path, int(label)))
+        self.shard_ids = np.array(shard_ids, dtype=np.int32)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.handles = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['handles'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.data)
+
+    def shard_ranges(self):
+        """每个分片在全局编号中的 [start, end) 范围"""
+        bounds = np.flatnonzero(np.diff(self.shard_ids)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(self.shard_ids)]])
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def read(self, idx):
+        shard_id = int(self.shard_ids[idx])
+        handle = self.handles.get(shard_id)
+        if handle is None:
+            handle = open(self.files[shard_id], 'rb')
+            self.handles[shard_id] = handle
+        handle.seek(int(self.offsets[idx]))
+        return handle.read(int(self.lengths[idx]))
+
+
+class ShardInterleaveSampler(Sampler):
+    """
+    分片感知的打乱采样器
+    每个 epoch 打乱分片顺序, 每次取 cycle_length 个分片, 将其中的样本交错后在窗口内打乱。
+    相比完全随机的下标, 同一时间只读取少量分片, 读取接近顺序, 打乱程度仍足够训练使用。
+    顺序只由 (seed, epoch) 决定, 与 EpochRandomSampler 一样由训练循环每个 epoch 调用 set_epoch;
+    多次迭代而不调用 set_epoch 时得到相同的顺序 (恢复训练时 ResumableSampler 依赖这一点)
+    """
+    def __init__(self, reader, cycle_length=4, seed=0):
+        self.ranges = reader.shard_ranges()
+        self.num_samples = len(reader)
+        self.cycle_length = max(1, cycle_length)
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.ranges))
+        for group_start in range(0, len(order), self.cycle_length):
+            group = [self.ranges[i] for i in order[group_start:group_start + self.cycle_length]]
+            indices = np.concatenate([np.arange(start, end) for start, end in group])
+            yield from rng.permutation(indices).tolist()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pack dataset lists into size-balanced indexed tar shards')
+    parser.add_argument('--root', type=str, default='garbage',
+                        help='Dataset root directory (default: garbage)')
+    parser.add_argument('--lists', type=str, nargs='+', default=['train.txt', 'validate.txt'],
+                        help='List files to pack (default: train.txt validate.txt)')
+    parser.add_argument('--out', type=str, default=None,
+                        help='Output directory (default: <root>/shards)')
+    parser.add_argument('--shard-size-mb', type=float, default=DEFAULT_SHARD_SIZE_MB,
+                        help=f'Target shard size in MB (default: {DEFAULT_SHARD_SIZE_MB})')
+    parser.add_argument('--num-shards', type=int, default=None,
+                        help='Number of shards per list, overrides --shard-size-mb')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    out_dir = args.out or os.path.join(args.root, 'shards')
+    for txt_file in args.lists:
+        write_shards(args.root, txt_file, out_dir, args.shard_size_mb, args.num_shards)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+garbage_classifier.pt 的 CPU 推理优化导出工具
+
+流程: 加载 best_model.pth -> Conv/BN 融合 -> (可选) FX INT8 量化, 在 validate.txt 上校准
+      -> channels_last -> torch.jit.trace -> freeze
+optimize_for_inference 生成的 MKLDNN 常量无法序列化, 且与当前机器的 CPU 后端绑定,
+因此由 GarbageDetectorPyTorch 在加载冻结模型时执行 (OPTIMIZE_FOR_INFERENCE)。
+
+使用方法:
+    python export_torchscript.py --checkpoint best_model.pth
+    python export_torchscript.py --checkpoint best_model.pth --quantize --calib-batches 20
+    python export_torchscript.py --benchmark --plain garbage_classifier.pt --optimized garbage_classifier_opt.pt
+"""
+import argparse
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+IMG_SIZE = 224
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export a CPU-optimized TorchScript garbage classifier')
+    parser.add_argument('--checkpoint', type=str, default='best_model.pth',
+                        help='Training checkpoint (default: best_model.pth)')
+    parser.add_argument('--arch', type=str, default='v3', choices=['v3', 'v2'],
+                        help='Trainer the checkpoint comes from: v3=MobileNetV3, v2=MobileNetV2 (default: v3)')
+    parser.add_argument('--output', type=str, default='garbage_classifier_opt.pt',
+                        help='Output TorchScript path (default: garbage_classifier_opt.pt)')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Apply FX graph mode INT8 post-training quantization')
+    parser.add_argument('--backend', type=str, default=None, choices=['qnnpack', 'x86', 'fbgemm'],
+                        help='Quantized engine (default: qnnpack on ARM, x86 otherwise)')
+    parser.add_argument('--data-root', type=str, default='garbage',
+                        help='Dataset root containing validate.txt (default: garbage)')
+    parser.add_argument('--calib-batches', type=int, default=10,
+                        help='Number of validate.txt batches used for calibration (default: 10)')
+    parser.add_argument('--no-channels-last', action='store_true',
+                        help='Keep NCHW contiguous memory format')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare --plain and --optimized through GarbageDetectorPyTorch')
+    parser.add_argument('--plain', type=str, default='garbage_classifier.pt',
+                        help='Plain traced model for --benchmark (default: garbage_classifier.pt)')
+    parser.add_argument('--optimized', type=str, default=None,
+                        help='Optimized model for --benchmark (default: --output)')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='torch threads used for --benchmark (default: 4)')
+    parser.add_argument('--runs', type=int, default=50,
+                        help='Timed runs for --benchmark (default: 50)')
+    return parser.parse_args()
+
+
+def load_trainer(arch):
+    """按结构导入对应的训练脚本, 复用其中的 GarbageClassifier/GarbageDataset 定义"""
+    if arch == 'v2':
+        import trainv1_MobileNetV2_pytorch as trainer
+    else:
+        import trainv1_MobileNetV3_pytorch as trainer
+    return trainer
+
+
+def default_backend():
+    machine = platform.machine().lower()
+    if machine.startswith('arm') or machine.startswith('aarch64'):
+        return 'qnnpack'
+    return 'x86'
+
+
+def fuse_conv_bn(model):
+    """将 Conv+BN 折叠为单个 Conv (基于 torch.fx)"""
+    from torch.fx.experimental.optimization import fuse
+    return fuse(model)
+
+
+def quantize_fx(model, calib_loader, calib_batches, backend):
+    """FX graph mode 训练后静态量化, 使用验证集数据校准激活范围"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = backend
+    qconfig_mapping = get_default_qconfig_mapping(backend)
+    example_inputs = (torch.randn(1, 3, IMG_SIZE, IMG_SIZE),)
+
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs)
+    print(f"正在校准量化参数 (最多 {calib_batches} 个批次)...")
+    with torch.no_grad():
+        for batch_idx, (inputs, _) in enumerate(calib_loader):
+            if batch_idx >= calib_batches:
+                break
+            prepared(inputs)
+    return convert_fx(prepared)
+
+
+def export_optimized_torchscript(model, output_path, quantize=False, backend=None,
+                                 calib_loader=None, calib_batches=10,
+                                 channels_last=True):
+    """
+    导出CPU优化的TorchScript模型
+    Args:
+        model: 已训练的 GarbageClassifier (任意设备)
+        output_path: 输出文件路径
+        quantize: 是否进行INT8量化 (需要 calib_loader)
+        channels_last: 是否使用 NHWC 内存格式
+    Returns:
+        导出的冻结 ScriptModule
+    """
+    model = model.cpu().eval()
+
+    if quantize:
+        if calib_loader is None:
+            raise ValueError("INT8 量化需要提供校准数据 calib_loader")
+        backend = backend or default_backend()
+        print(f"量化后端: {backend}")
+        # prepare_fx 内部会完成 Conv/BN 融合
+        model = quantize_fx(model, calib_loader, calib_batches, backend)
+    else:
+        model = fuse_conv_bn(model)
+
+    example_input = torch.randn(1, 3, IMG_SIZE, IMG_SIZE)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+        example_input = example_input.contiguous(memory_format=torch.channels_last)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input)
+        frozen = torch.jit.freeze(traced)
+
+    frozen.save(output_path)
+    print(f"优化后的TorchScript模型已保存为: {output_path}")
+    return frozen
+
+
+def check_agreement(reference, optimized, loader, max_batches=5):
+    """对比原始模型与优化模型的 top-1 一致率和最大输出误差"""
+    reference = reference.cpu().eval()
+    agree, total, max_diff = 0, 0, 0.0
+    with torch.no_grad():
+        for batch_idx, (inputs, _) in enumerate(loader):
+            if batch_idx >= max_batches:
+                break
+            ref_out = reference(inputs)
+            opt_out = optimized(inputs)
+            agree += (ref_out.argmax(1) == opt_out.argmax(1)).sum().item()
+            total += inputs.size(0)
+            max_diff = max(max_diff, (ref_out - opt_out).abs().max().item())
+    if total:
+        print(f"Top-1 一致率: {100.0 * agree / total:.2f}% ({agree}/{total}), 最大输出误差: {max_diff:.4f}")
+
+
+def benchmark_detectors(plain_path, optimized_path, threads, runs):
+    """通过 GarbageDetectorPyTorch 对比普通 trace 与优化模型的单帧推理耗时"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classify_test'))
+    import uraspi_pytorch
+    from uraspi_pytorch import GarbageDetectorPyTorch
+
+    uraspi_pytorch.ENABLE_SERIAL = False
+    labels_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'garbage_classify_rule.json')
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+
+    results = {}
+    # 普通 trace 按原有方式加载; 优化模型额外在加载时执行 optimize_for_inference
+    for name, path, optimize in (('plain trace', plain_path, False),
+                                 ('optimized', optimized_path, True)):
+        if not os.path.exists(path):
+            print(f"跳过 {name}: 未找到模型文件 {path}")
+            continue
+        uraspi_pytorch.OPTIMIZE_FOR_INFERENCE = optimize
+        detector = GarbageDetectorPyTorch(path, labels_path, threads)
+        if detector.device.type != 'cpu':
+            print("基准测试仅针对CPU, 请在无GPU的环境下运行")
+            return
+        input_data = detector.preprocess_image(frame[:IMG_SIZE * 2, :IMG_SIZE * 2])
+
+        with torch.no_grad():
+            for _ in range(5):  # 预热
+                detector.model(input_data)
+            start = time.perf_counter()
+            for _ in range(runs):
+                detector.model(input_data)
+        results[name] = (time.perf_counter() - start) / runs * 1000
+
+    print(f"\nCPU 单帧推理耗时 (线程数 {threads}, {runs} 次平均):")
+    for name, ms in results.items():
+        print(f"  {name:<12}: {ms:.2f} ms")
+    if len(results) == 2:
+        print(f"  加速比: {results['plain trace'] / results['optimized']:.2f}x")
+
+
+def main():
+    args = parse_args()
+
+    if args.benchmark:
+        benchmark_detectors(args.plain, args.optimized or args.output, args.threads, args.runs)
+        return
+
+    if not os.path.exists(args.checkpoint):
+        print(f"错误: 未找到检查点文件 {args.checkpoint}")
+        return
+
+    trainer = load_trainer(args.arch)
+    model = trainer.GarbageClassifier(trainer.NUM_CLASSES)
+    checkpoint = torch.load(args.checkpoint, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    print(f"已加载检查点: {args.checkpoint} (epoch {checkpoint.get('epoch')}, "
+          f"val_acc {checkpoint.get('val_acc', 0):.2f}%)")
+
+    val_loader = None
+    if os.path.exists(os.path.join(args.data_root, 'validate.txt')):
+        val_dataset = trainer.GarbageDataset(args.data_root, 'validate.txt', is_training=False)
+        val_loader = DataLoader(val_dataset, batch_size=32, shuffle=False, num_workers=2)
+    elif args.quantize:
+        print(f"错误: INT8 量化需要校准数据, 未找到 {os.path.join(args.data_root, 'validate.txt')}")
+        return
+
+    # 融合/量化会改写模型, 一致性检查使用一份独立的参考模型
+    reference = trainer.GarbageClassifier(trainer.NUM_CLASSES)
+    reference.load_state_dict(checkpoint['model_state_dict'])
+
+    optimized = export_optimized_torchscript(
+        model, args.output,
+        quantize=args.quantize,
+        backend=args.backend,
+        calib_loader=val_loader,
+        calib_batches=args.calib_batches,
+        channels_last=not args.no_channels_last
+    )
+
+    if val_loader is not None:
+        check_agreement(reference, optimized, val_loader)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
+import argparse
 import os
+import sys
 import numpy as np
 import torch
 import torch.nn as nn
@@ -6,6 +8,13 @@ import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
 from torchvision import models, transforms
 import cv2
+# 共享的数据集工具 (列表文件 / 分片分配 / 图像缓存) 位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from dataset_common import build_cache
+from batch_augment import augment_batch
+from dataset_shards import ShardInterleaveSampler, ShardReader
+from checkpoint import (AsyncCheckpointer, EpochRandomSampler, ResumableSampler,
+                        capture_rng_state, latest_checkpoint, restore_rng_state)
 
 # 配置设备
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -21,33 +30,76 @@ TARGET_TRAIN_ACC = 99.0  # 目标训练准确率
 TARGET_VAL_ACC = 95.0    # 目标验证准确率
 MAX_EPOCHS = 200        # 最大训练轮数
 EARLY_STOPPING_PATIENCE = 10  # 早停轮数
+USE_IMAGE_CACHE = True  # 使用预处理的内存映射图像缓存 (见 common/dataset_common.py), 避免每个epoch重复解码JPEG
+BATCH_AUGMENT = True    # 训练集返回uint8图片, 增强在collate之后整批执行 (见 batch_augment.py)
+USE_AMP = None          # 自动混合精度: CUDA 上使用 fp16 (配合 GradScaler), CPU 上使用 bf16; None 表示 CUDA 上启用, CPU 上只在支持 bf16 指令时启用
+CHANNELS_LAST = True    # 模型和输入使用 NHWC 内存格式, 卷积在 CPU/GPU 上更快
+USE_COMPILE = False     # 使用 torch.compile 编译模型 (首个 epoch 编译较慢)
+SEED = 42               # 数据打乱的随机种子, 每个 epoch 的顺序由 (SEED, epoch) 决定
+CHECKPOINT_DIR = 'checkpoints'  # 完整训练状态检查点目录
+CHECKPOINT_EVERY = 500  # 每训练多少步保存一次检查点 (每个 epoch 结束时也会保存)
+KEEP_CHECKPOINTS = 3    # 最多保留的检查点数量
+SHARD_DIR = None        # tar 分片目录 (见 dataset_shards.py), 如 'garbage/shards'; None 表示直接读取图片文件
 
 class GarbageDataset(Dataset):
-    def __init__(self, root_dir, txt_file, is_training=True):
+    def __init__(self, root_dir, txt_file, is_training=True, use_cache=USE_IMAGE_CACHE,
+                 batch_augment=BATCH_AUGMENT, shard_dir=SHARD_DIR):
         self.root_dir = root_dir
         self.is_training = is_training
+        # 整批增强只用于训练集, 验证集仍返回 float 张量
+        self.batch_augment = batch_augment and is_training
         
-        # 读取文件列表
-        with open(os.path.join(root_dir, txt_file), 'r') as f:
-            self.data = []
-            for line in f:
-                img_path, label = line.strip().split()
-                img_path = img_path.lstrip('./')
-                self.data.append((img_path, int(label)))
+        # 分片模式: 样本列表和图片数据都来自分片, 通过索引随机读取
+        self.shards = None
+        if shard_dir:
+            self.shards = ShardReader(shard_dir, os.path.splitext(os.path.basename(txt_file))[0])
+            self.data = self.shards.data
+            use_cache = False
+        else:
+            # 读取文件列表
+            with open(os.path.join(root_dir, txt_file), 'r') as f:
+                self.data = []
+                for line in f:
+                    img_path, label = line.strip().split()
+                    img_path = img_path.lstrip('./')
+                    self.data.append((img_path, int(label)))
         
         self.num_samples = len(self.data)
         print(f"加载了 {self.num_samples} 个样本")
+        
+        # 内存映射缓存在首次访问时才打开, DataLoader 的每个 worker 各自映射同一文件
+        self.cache_file = None
+        self.images = None
+        if use_cache:
+            self.cache_file = build_cache(root_dir, txt_file, IMG_SIZE)['images']
 
-    def preprocess_image(self, img_path):
-        # 读取和预处理图片
-        img = cv2.imread(os.path.join(self.root_dir, img_path))
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['images'] = None
+        return state
+
+    def load_image(self, idx):
+        # 优先从缓存读取 uint8 RGB 图片 (内存映射切片, 不发生拷贝)
+        if self.cache_file is not None:
+            if self.images is None:
+                self.images = np.load(self.cache_file, mmap_mode='r')
+            return self.images[idx]
+        
+        img_path, _ = self.data[idx]
+        if self.shards is not None:
+            img = cv2.imdecode(np.frombuffer(self.shards.read(idx), dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            img = cv2.imread(os.path.join(self.root_dir, img_path))
         if img is None:
             print(f"警告：无法读取图片 {img_path}")
-            img = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
-        else:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = cv2.resize(img, (IMG_SIZE, IMG_SIZE))
-            img = img.astype(np.float32) / 255.0
+            return np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return cv2.resize(img, (IMG_SIZE, IMG_SIZE))
+
+    def preprocess_image(self, idx):
+        img_path, _ = self.data[idx]
+        # 读取和预处理图片
+        img = self.load_image(idx).astype(np.float32) / 255.0
 
         img = torch.from_numpy(img).permute(2, 0, 1)
 
@@ -81,8 +133,11 @@ class GarbageDataset(Dataset):
         return self.num_samples
 
     def __getitem__(self, idx):
-        img_path, label = self.data[idx]
-        img = self.preprocess_image(img_path)
+        _, label = self.data[idx]
+        if self.batch_augment:
+            # uint8 HWC 原图, 拷贝一份以脱离只读的内存映射
+            return torch.from_numpy(np.array(self.load_image(idx))), label
+        img = self.preprocess_image(idx)
         return img, label
 
 class GarbageClassifier(nn.Module):
@@ -109,14 +164,116 @@ class GarbageClassifier(nn.Module):
     def forward(self, x):
         return self.model(x)
 
-def train_model(model, train_loader, val_loader):
+def cpu_supports_bf16():
+    """CPU 是否有 bf16 指令 (x86 AVX512-BF16 / AMX, ARMv8.6+ BF16); 没有时 bf16 autocast 靠软件转换, 比 fp32 更慢"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {'avx512_bf16', 'amx_bf16', 'bf16'})
+
+def amp_enabled(use_amp=USE_AMP):
+    """解析 USE_AMP: None 时 CUDA 上启用, CPU 上按硬件是否支持 bf16 决定"""
+    if use_amp is None:
+        return device.type == 'cuda' or cpu_supports_bf16()
+    return use_amp
+
+def autocast_context(enabled=USE_AMP):
+    """CUDA 上 fp16, CPU 上 bf16 的自动混合精度上下文"""
+    dtype = torch.float16 if device.type == 'cuda' else torch.bfloat16
+    return torch.autocast(device_type=device.type, dtype=dtype, enabled=amp_enabled(enabled))
+
+def prepare_model(model, channels_last=CHANNELS_LAST, compile_model=USE_COMPILE):
+    """
+    转换内存格式并(可选)编译
+    Returns:
+        (model, step_model): 保存权重使用 model, 前向计算使用 step_model
+    """
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    step_model = torch.compile(model) if compile_model else model
+    return model, step_model
+
+def to_device(inputs, labels, channels_last=CHANNELS_LAST, augment=False):
+    """
+    拷贝到设备, augment 为 True 时整批增强 (batch_augment.py);
+    增强的翻转 / 裁剪会产生新的 NCHW 张量, 内存格式在增强之后再转换
+    """
+    inputs = inputs.to(device, non_blocking=True)
+    if augment:
+        inputs = augment_batch(inputs)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    return inputs.contiguous(memory_format=memory_format), labels.to(device, non_blocking=True)
+
+def train_step(step_model, optimizer, scaler, criterion, inputs, labels, use_amp=USE_AMP):
+    """单步训练, 返回不触发同步的 loss 和 outputs"""
+    optimizer.zero_grad(set_to_none=True)
+    with autocast_context(use_amp):
+        outputs = step_model(inputs)
+        loss = criterion(outputs, labels)
+    scaler.scale(loss).backward()
+    scaler.step(optimizer)
+    scaler.update()
+    return loss.detach(), outputs.detach()
+
+def train_model(model, train_loader, val_loader, use_amp=USE_AMP, channels_last=CHANNELS_LAST,
+                compile_model=USE_COMPILE, checkpointer=None, resume_state=None,
+                checkpoint_every=CHECKPOINT_EVERY):
+    use_amp = amp_enabled(use_amp)
+    amp_dtype = 'fp16' if device.type == 'cuda' else 'bf16'
+    print(f"自动混合精度: {amp_dtype if use_amp else '关闭'}")
+    model, step_model = prepare_model(model, channels_last, compile_model)
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.AdamW(model.parameters(), lr=0.001, weight_decay=0.01)  # 使用AdamW并添加权重衰减
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.2, patience=3, verbose=True)
+    # fp16 需要损失缩放防止梯度下溢; bf16 动态范围与 fp32 相同, 不需要
+    scaler = torch.amp.GradScaler(device.type, enabled=use_amp and device.type == 'cuda')
     
     best_val_acc = 0.0
     epochs_without_improvement = 0
     epoch = 0
+    global_step = 0
+    start_batch = 0  # 恢复时当前 epoch 已完成的批次数
+    
+    if resume_state is not None:
+        model.load_state_dict(resume_state['model_state_dict'])
+        optimizer.load_state_dict(resume_state['optimizer_state_dict'])
+        scheduler.load_state_dict(resume_state['scheduler_state_dict'])
+        scaler.load_state_dict(resume_state['scaler_state_dict'])
+        best_val_acc = resume_state['best_val_acc']
+        epochs_without_improvement = resume_state['epochs_without_improvement']
+        epoch = resume_state['epoch']
+        start_batch = resume_state['batch']
+        global_step = resume_state['global_step']
+        restore_rng_state(resume_state['rng_state'])
+        if train_loader.generator is not None and resume_state.get('loader_rng_state') is not None:
+            train_loader.generator.set_state(resume_state['loader_rng_state'])
+        print(f'从 Epoch {epoch + 1} 第 {start_batch} 个批次恢复训练 (step {global_step})')
+    
+    # DataLoader 的生成器在每个 epoch 创建迭代器时为 worker 抽取基础种子;
+    # epoch 中途的检查点保存本 epoch 开始前的状态, 恢复后重新抽到相同的种子
+    loader_rng_state = None
+    
+    def checkpoint_state(completed_epochs, batch, train_stats=None):
+        # completed_epochs: 已完成的 epoch 数; batch: 下一个 epoch 中已完成的批次数
+        generator = train_loader.generator
+        # epoch 结束时的检查点 (batch 为 0) 保存当前状态, 下一个 epoch 从这里抽取种子
+        loader_state = loader_rng_state if batch or generator is None else generator.get_state()
+        return {
+            'epoch': completed_epochs,
+            'batch': batch,
+            'global_step': global_step,
+            'model_state_dict': model.state_dict(),
+            'optimizer_state_dict': optimizer.state_dict(),
+            'scheduler_state_dict': scheduler.state_dict(),
+            'scaler_state_dict': scaler.state_dict(),
+            'best_val_acc': best_val_acc,
+            'epochs_without_improvement': epochs_without_improvement,
+            'train_stats': train_stats,
+            'rng_state': capture_rng_state(),
+            'loader_rng_state': loader_state,
+        }
     
     while epoch < MAX_EPOCHS:
         epoch += 1
@@ -124,44 +281,59 @@ def train_model(model, train_loader, val_loader):
         
         # 训练阶段
         model.train()
-        train_loss = 0.0
-        train_correct = 0
+        # 损失和正确数在设备上累加, 每个 epoch 只同步一次
+        train_loss = torch.zeros((), device=device)
+        train_correct = torch.zeros((), dtype=torch.long, device=device)
         train_total = 0
         
-        for batch_idx, (inputs, labels) in enumerate(train_loader):
-            inputs, labels = inputs.to(device), labels.to(device)
+        # 每个 epoch 的数据顺序由 (SEED, epoch) 决定; 恢复时跳过已训练的批次
+        if hasattr(train_loader.sampler, 'set_epoch'):
+            train_loader.sampler.set_epoch(epoch)
+        if start_batch:
+            train_loader.sampler.set_start(start_batch * train_loader.batch_size)
+            if resume_state.get('train_stats'):
+                loss_sum, correct, train_total = resume_state['train_stats']
+                train_loss += loss_sum.to(device)
+                train_correct += correct.to(device)
+        if train_loader.generator is not None:
+            loader_rng_state = train_loader.generator.get_state()
+        
+        for batch_idx, (inputs, labels) in enumerate(train_loader, start=start_batch):
+            inputs, labels = to_device(inputs, labels, channels_last, train_loader.dataset.batch_augment)
             
-            optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
+            loss, outputs = train_step(step_model, optimizer, scaler, criterion, inputs, labels, use_amp)
             
-            train_loss += loss.item()
-            _, predicted = outputs.max(1)
+            train_loss += loss.float()
+            train_correct += outputs.argmax(1).eq(labels).sum()
             train_total += labels.size(0)
-            train_correct += predicted.eq(labels).sum().item()
             
             if batch_idx % 50 == 0:
                 print(f'Batch [{batch_idx}/{len(train_loader)}] Loss: {loss.item():.4f}')
+            
+            global_step += 1
+            if checkpointer is not None and global_step % checkpoint_every == 0:
+                checkpointer.save(checkpoint_state(epoch - 1, batch_idx + 1,
+                                                   (train_loss, train_correct, train_total)), global_step)
+        start_batch = 0
         
         # 验证阶段
         model.eval()
-        val_loss = 0.0
-        val_correct = 0
+        val_loss = torch.zeros((), device=device)
+        val_correct = torch.zeros((), dtype=torch.long, device=device)
         val_total = 0
         
-        with torch.no_grad():
+        with torch.no_grad(), autocast_context(use_amp):
             for inputs, labels in val_loader:
-                inputs, labels = inputs.to(device), labels.to(device)
-                outputs = model(inputs)
+                inputs, labels = to_device(inputs, labels, channels_last)
+                outputs = step_model(inputs)
                 loss = criterion(outputs, labels)
                 
-                val_loss += loss.item()
-                _, predicted = outputs.max(1)
+                val_loss += loss.float()
+                val_correct += outputs.argmax(1).eq(labels).sum()
                 val_total += labels.size(0)
-                val_correct += predicted.eq(labels).sum().item()
         
+        train_loss, train_correct = train_loss.item(), train_correct.item()
+        val_loss, val_correct = val_loss.item(), val_correct.item()
         train_acc = 100. * train_correct / train_total
         val_acc = 100. * val_correct / val_total
         
@@ -185,6 +357,9 @@ def train_model(model, train_loader, val_loader):
             epochs_without_improvement = 0
         else:
             epochs_without_improvement += 1
+        
+        if checkpointer is not None:
+            checkpointer.save(checkpoint_state(epoch, 0), global_step)
             
         # 检查是否达到目标
         if train_acc >= TARGET_TRAIN_ACC and val_acc >= TARGET_VAL_ACC:
@@ -201,25 +376,69 @@ def train_model(model, train_loader, val_loader):
             print('\n检测到可能的过拟合，停止训练')
             break
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the garbage classifier')
+    parser.add_argument('--resume', type=str, nargs='?', const='latest', default=None,
+                        help='Resume from a checkpoint path, or the latest one in --checkpoint-dir if no path is given')
+    parser.add_argument('--checkpoint-dir', type=str, default=CHECKPOINT_DIR,
+                        help=f'Checkpoint directory (default: {CHECKPOINT_DIR})')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help=f'Save a checkpoint every N training steps (default: {CHECKPOINT_EVERY})')
+    parser.add_argument('--keep-checkpoints', type=int, default=KEEP_CHECKPOINTS,
+                        help=f'Number of rotated checkpoints to keep (default: {KEEP_CHECKPOINTS})')
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
+    resume_state = None
+    if args.resume:
+        resume_path = latest_checkpoint(args.checkpoint_dir) if args.resume == 'latest' else args.resume
+        if resume_path is None:
+            print(f"错误: {args.checkpoint_dir} 中没有可恢复的检查点")
+            return
+        print(f"加载检查点: {resume_path}")
+        resume_state = torch.load(resume_path, map_location='cpu', weights_only=False)
+    
     # 创建数据集和数据加载器
     train_dataset = GarbageDataset('garbage', 'train.txt', is_training=True)
     val_dataset = GarbageDataset('garbage', 'validate.txt', is_training=False)
     
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=4)
+    if train_dataset.shards is not None:
+        # 分片模式: 每次交错读取少量分片, 多个 worker 并行读取, 避免对分片完全随机 seek
+        sampler = ShardInterleaveSampler(train_dataset.shards, cycle_length=4, seed=SEED)
+    else:
+        sampler = EpochRandomSampler(len(train_dataset), seed=SEED)
+    # DataLoader 使用独立的随机数生成器, 创建迭代器时不消耗全局随机数; 生成器状态保存在检查点中.
+    # 整批增强 (BATCH_AUGMENT) 在主进程中执行, 恢复后增强参数序列与中断前逐位一致;
+    # BATCH_AUGMENT=False 时逐样本增强在 worker 中执行, 只有在 epoch 边界恢复时才与中断前一致
+    # (epoch 中途恢复时跳过的批次改变了批次到 worker 的分配, worker 的随机数序列也从头开始)
+    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, sampler=ResumableSampler(sampler),
+                              num_workers=4, generator=torch.Generator().manual_seed(SEED))
     val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=4)
     
     # 创建模型
     model = GarbageClassifier(NUM_CLASSES).to(device)
     
-    # 训练模型
-    train_model(model, train_loader, val_loader)
+    # 训练模型, 完整状态检查点在后台线程写盘
+    checkpointer = AsyncCheckpointer(args.checkpoint_dir, keep=args.keep_checkpoints)
+    try:
+        train_model(model, train_loader, val_loader, checkpointer=checkpointer,
+                    resume_state=resume_state, checkpoint_every=args.checkpoint_every)
+    finally:
+        checkpointer.close()
     
-    # 导出为TorchScript模型
-    model.eval()
-    example_input = torch.randn(1, 3, IMG_SIZE, IMG_SIZE).to(device)
+    # 导出为TorchScript模型 (在CPU上trace, 避免产物绑定训练设备)
+    # 训练时可能转换为 channels_last, 普通 trace 产物保持默认的 NCHW 连续格式
+    model = model.cpu().eval().to(memory_format=torch.contiguous_format)
+    example_input = torch.randn(1, 3, IMG_SIZE, IMG_SIZE)
     traced_model = torch.jit.trace(model, example_input)
     traced_model.save('garbage_classifier.pt')
+    
+    # 导出CPU优化版本 (融合BN + channels_last + freeze)
+    # 如需INT8量化, 请在部署设备上运行: python export_torchscript.py --quantize
+    from export_torchscript import export_optimized_torchscript
+    export_optimized_torchscript(model, 'garbage_classifier_opt.pt')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,115 @@
+"""
+标注框转换的 NumPy 向量化实现
+
+一个文件中的全部形状 (或多个文件拼接后的整个数据集) 作为数组一次处理:
+    polygon_bounds     多边形 -> 外接框 (x1, y1, x2, y2), 分段 min / max 归约
+    boxes_to_yolo      外接框 -> YOLO 归一化 (中心 x, 中心 y, 宽, 高), 截断到 [0, 1]
+    valid_mask         归一化结果是否全部在 [0, 1] 内
+    format_yolo_lines  生成 YOLO 标签文本
+运算顺序和取值与原来逐个标注的 Python 实现完全一致, 输出逐字节相同:
+外接框坐标保留 JSON 中原始数值的类型 (整数仍为整数), 截断后的 -0.0 规整为 0.0。
+
+json-converter.py 直接导入; train/train4class_yolovX_easydata.py 通过 sys.path 导入同一份。
+"""
+import numpy as np
+
+# 细分类到大分类的映射 (训练脚本和 json-converter.py --yolo 共用, 修改类别只需改这里)
+CATEGORY_MAPPING = {
+    # 厨余垃圾 (0)
+    'potato': 0,
+    'daikon': 0,
+    'carrot': 0,
+    # 可回收垃圾 (1)
+    'bottle': 1,
+    'can': 1,
+    # 有害垃圾 (2)
+    'battery': 2,
+    'drug': 2,
+    'inner_packing': 2,
+    # 其他垃圾 (3)
+    'tile': 3,
+    'stone': 3,
+    'brick': 3
+}
+
+
+def segment_starts(lengths):
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return starts
+
+
+def first_match(values, extremes, lengths):
+    """每段中第一个等于该段极值的元素下标, 与 Python min / max 返回第一个极值的行为一致"""
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.flatnonzero(values == extremes[segment_ids])
+    return positions[np.searchsorted(segment_ids[positions], np.arange(len(lengths)))]
+
+
+def polygon_bounds(polygons, keep_values=True):
+    """
+    计算每个多边形的外接框
+    Args:
+        polygons: 多边形列表, 每个多边形为 [[x, y], ...]
+        keep_values: 是否同时返回 JSON 中原始的坐标数值 (保留 int / float 类型)
+    Returns:
+        boxes: (N, 4) float64 数组 x1, y1, x2, y2
+        values: keep_values 时为 [[x1, y1, x2, y2], ...] 原始数值, 否则为 None
+    """
+    lengths = np.fromiter((len(points) for points in polygons), dtype=np.int64, count=len(polygons))
+    if len(polygons) == 0:
+        return np.zeros((0, 4), dtype=np.float64), ([] if keep_values else None)
+    if lengths.min() == 0:
+        raise ValueError("min() arg is an empty sequence")
+    flat_x = [point[0] for points in polygons for point in points]
+    flat_y = [point[1] for points in polygons for point in points]
+    x = np.array(flat_x, dtype=np.float64)
+    y = np.array(flat_y, dtype=np.float64)
+
+    starts = segment_starts(lengths)
+    x1 = np.minimum.reduceat(x, starts)
+    y1 = np.minimum.reduceat(y, starts)
+    x2 = np.maximum.reduceat(x, starts)
+    y2 = np.maximum.reduceat(y, starts)
+    boxes = np.stack([x1, y1, x2, y2], axis=1)
+    if not keep_values:
+        return boxes, None
+
+    columns = []
+    for flat, coords, extremes in ((flat_x, x, x1), (flat_y, y, y1), (flat_x, x, x2), (flat_y, y, y2)):
+        columns.append([flat[i] for i in first_match(coords, extremes, lengths).tolist()])
+    return boxes, [list(row) for row in zip(*columns)]
+
+
+def boxes_to_yolo(boxes, img_width, img_height):
+    """
+    外接框转换为 YOLO 格式并截断到 [0, 1]
+    Args:
+        boxes: (N, 4) 数组 x1, y1, x2, y2
+        img_width, img_height: 标量, 或每个框对应图片尺寸的 (N,) 数组 (整个数据集一起转换时)
+    Returns:
+        (N, 4) float64 数组 中心 x, 中心 y, 宽, 高
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    img_width = np.asarray(img_width, dtype=np.float64)
+    img_height = np.asarray(img_height, dtype=np.float64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    yolo = np.stack([
+        (x1 + x2) / (2 * img_width),
+        (y1 + y2) / (2 * img_height),
+        (x2 - x1) / img_width,
+        (y2 - y1) / img_height,
+    ], axis=1)
+    # 与 max(0, min(1, v)) 相同; 加 0.0 把 -0.0 变为 0.0, 格式化时不会出现 "-0.000000"
+    return np.minimum(np.maximum(yolo, 0.0), 1.0) + 0.0
+
+
+def valid_mask(yolo):
+    """每行四个值是否都在 [0, 1] 内"""
+    return np.all((yolo >= 0) & (yolo <= 1), axis=1)
+
+
+def format_yolo_lines(class_ids, yolo):
+    """生成 YOLO 标签文本, 每行 "类别 中心x 中心y 宽 高", 保留 6 位小数"""
+    return "".join(f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n"
+                   for class_id, (x_center, y_center, width, height) in zip(class_ids, yolo.tolist()))
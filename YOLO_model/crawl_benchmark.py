@@ -0,0 +1,153 @@
+"""
+爬取下载的离线基准测试 / 自检
+
+启动本地 HTTP 服务代替图片网站 (可模拟延迟和 429 限流), 用 crawl_manifest.download_urls 下载:
+    1. 不同下载线程数下的吞吐量
+    2. 中途停止后续爬: 已完成的 URL 不会再次请求, 文件不会被覆盖
+    3. 重复内容 / 过小图片 / 失效链接在清单中的状态
+
+使用方法:
+    python crawl_benchmark.py --num-urls 500 --latency-ms 50
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from crawl_manifest import MANIFEST_FILE, CrawlManifest, HttpFetcher, download_urls
+
+
+def make_images(count, seed=0):
+    """生成 count 张不同内容的 JPEG, 其中每 10 张有 1 张过小"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        size = (120, 90) if i % 10 == 9 else (320, 240)
+        img = cv2.resize(rng.integers(0, 255, (8, 8, 3), dtype=np.uint8), size, interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.imencode('.jpg', img)[1].tobytes())
+    return images
+
+
+class StandInServer:
+    """
+    本地图片服务: /img/<n>.jpg 返回第 n 张图片, /dup/<n>.jpg 返回与 /img/<n>.jpg 相同的内容,
+    其他路径返回 404; 可选每个请求的延迟和每 N 个请求返回一次 429
+    """
+    def __init__(self, images, latency=0.0, throttle_every=0):
+        self.images = images
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    count = server.requests
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.throttle_every and count % server.throttle_every == 0:
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                parts = self.path.strip('/').split('/')
+                try:
+                    body = server.images[int(parts[1].split('.')[0])] if parts[0] in ('img', 'dup') else None
+                except (IndexError, ValueError):
+                    body = None
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Offline crawl download benchmark against a local stand-in server')
+    parser.add_argument('--num-urls', type=int, default=300,
+                        help='Number of image URLs served (default: 300)')
+    parser.add_argument('--latency-ms', type=float, default=30.0,
+                        help='Simulated per-request server latency in ms (default: 30)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16],
+                        help='Download thread counts to benchmark (default: 1 4 16)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    images = make_images(args.num_urls)
+    server = StandInServer(images, latency=args.latency_ms / 1000)
+    urls = [f'{server.url}/img/{i}.jpg' for i in range(args.num_urls)]
+    fetcher = HttpFetcher(requests_per_second=None)
+    work_dir = tempfile.mkdtemp(prefix='crawl_bench_')
+    try:
+        print(f"本地服务 {server.url}, {args.num_urls} 个 URL, 延迟 {args.latency_ms} ms")
+        print(f"{'线程数':>6} | {'秒':>7} | {'URL/秒':>8} | 结果")
+        print("-" * 60)
+        for threads in args.threads:
+            run_dir = os.path.join(work_dir, f'threads{threads}')
+            os.makedirs(run_dir)
+            manifest = CrawlManifest(os.path.join(run_dir, MANIFEST_FILE))
+            start = time.perf_counter()
+            stats = download_urls(urls, 'bench', 'bench', manifest, fetcher, os.path.join(run_dir, 'bench'),
+                                  threads=threads, min_size=(200, 200))
+            elapsed = time.perf_counter() - start
+            manifest.close()
+            print(f"{threads:>6} | {elapsed:>7.2f} | {len(urls) / elapsed:>8.1f} | {stats}")
+
+        # 续爬: 先下载一半后停止, 再用同一清单下载全部 URL (含重复内容和失效链接)
+        resume_dir = os.path.join(work_dir, 'resume')
+        category_dir = os.path.join(resume_dir, 'bench')
+        os.makedirs(resume_dir)
+        manifest = CrawlManifest(os.path.join(resume_dir, MANIFEST_FILE))
+        first = download_urls(urls, 'bench', 'bench', manifest, fetcher, category_dir, threads=8,
+                              min_size=(200, 200), max_num=args.num_urls // 3)
+        manifest.close()
+        files_before = {name: os.path.getmtime(os.path.join(category_dir, name)) for name in os.listdir(category_dir)}
+
+        manifest = CrawlManifest(os.path.join(resume_dir, MANIFEST_FILE))
+        requests_before = server.requests
+        extra = [f'{server.url}/dup/0.jpg', f'{server.url}/missing/1.jpg']
+        second = download_urls(urls + extra, 'bench', 'bench', manifest, fetcher, category_dir, threads=8,
+                               min_size=(200, 200))
+        requests_after = server.requests - requests_before
+        overwritten = sum(1 for name, mtime in files_before.items()
+                          if os.path.getmtime(os.path.join(category_dir, name)) != mtime)
+        processed_first = sum(first.values()) - first.get('skipped', 0)
+        print(f"\n续爬: 第一次处理 {processed_first} 个 URL {first}")
+        print(f"      第二次请求 {requests_after} 次 (预期 {len(urls) + len(extra) - processed_first} 次) {second}")
+        print(f"      被覆盖的已有文件: {overwritten}, 清单统计: {manifest.summary()}")
+        manifest.close()
+    finally:
+        server.close()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+可断点续爬的爬取清单 (SQLite)
+
+清单 <output_dir>/crawl_manifest.db 记录每个 URL 的关键词、类别、状态、内容 SHA1 和保存路径:
+    fetching   正在下载 (程序中断后重新打开清单时恢复为 pending)
+    done       已保存
+    duplicate  内容与同类别中已保存的图片完全相同, 未保存
+    rejected   无法解码或尺寸过小
+    failed     网络错误, 重试次数用完前下次运行会重试
+已完成的 URL 不会重复下载; 文件编号按类别在清单中分配, 多个关键词并行写入同一目录也不会互相覆盖。
+
+下载器可替换: 任何 fetcher(url, timeout) -> (bytes, content_type) 的可调用对象都可以传入,
+HttpFetcher 是默认实现 (urllib, 按主机限速, 遇到 429/503 按 Retry-After 退避);
+crawl_benchmark.py 用本地 HTTP 服务代替网络, 用于测试和吞吐量基准测试。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+MANIFEST_FILE = 'crawl_manifest.db'
+MAX_ATTEMPTS = 3
+FINAL_STATUSES = ('done', 'duplicate', 'rejected')
+USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/png': 'png', 'image/gif': 'gif',
+    'image/webp': 'webp', 'image/bmp': 'bmp',
+}
+
+
+class CrawlManifest:
+    """线程安全的 SQLite 爬取清单"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                keyword TEXT NOT NULL,
+                category TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                sha1 TEXT,
+                path TEXT,
+                error TEXT,
+                updated REAL
+            );
+            CREATE INDEX IF NOT EXISTS urls_keyword ON urls (keyword, status);
+            CREATE INDEX IF NOT EXISTS urls_category_sha1 ON urls (category, sha1);
+            CREATE TABLE IF NOT EXISTS categories (
+                category TEXT PRIMARY KEY,
+                next_index INTEGER NOT NULL
+            );
+        ''')
+        # 上次运行中断时正在下载的 URL 重新排队
+        self.conn.execute("UPDATE urls SET status = 'pending' WHERE status = 'fetching'")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def claim(self, url, keyword, category):
+        """领取一个 URL; 已完成、正在被其他线程下载或重试次数用完时返回 False"""
+        with self.lock:
+            row = self.conn.execute('SELECT status, attempts FROM urls WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO urls (url, keyword, category, status, attempts, updated) "
+                    "VALUES (?, ?, ?, 'fetching', 1, ?)", (url, keyword, category, time.time()))
+                return True
+            status, attempts = row
+            if status in FINAL_STATUSES or status == 'fetching' or attempts >= MAX_ATTEMPTS:
+                return False
+            self.conn.execute("UPDATE urls SET status = 'fetching', attempts = attempts + 1, updated = ? "
+                              "WHERE url = ?", (time.time(), url))
+            return True
+
+    def finish(self, url, status, sha1=None, path=None, error=None):
+        with self.lock:
+            self.conn.execute('UPDATE urls SET status = ?, sha1 = ?, path = ?, error = ?, updated = ? WHERE url = ?',
+                              (status, sha1, path, error, time.time(), url))
+
+    def has_content(self, category, sha1):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM urls WHERE category = ? AND sha1 = ? AND status = 'done' LIMIT 1",
+                                     (category, sha1)).fetchone() is not None
+
+    def allocate_index(self, category, category_dir):
+        """分配类别目录中的下一个文件编号; 类别第一次出现时从目录中已有的最大编号之后开始"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute('SELECT next_index FROM categories WHERE category = ?', (category,)).fetchone()
+            index = row[0] if row else existing_max_index(category_dir) + 1
+            self.conn.execute('INSERT OR REPLACE INTO categories (category, next_index) VALUES (?, ?)',
+                              (category, index + 1))
+            self.conn.execute('COMMIT')
+            return index
+
+    def count(self, keyword=None, status='done'):
+        query, params = 'SELECT COUNT(*) FROM urls WHERE status = ?', [status]
+        if keyword is not None:
+            query += ' AND keyword = ?'
+            params.append(keyword)
+        with self.lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+    def summary(self):
+        """{(关键词, 状态): 数量}"""
+        with self.lock:
+            rows = self.conn.execute('SELECT keyword, status, COUNT(*) FROM urls GROUP BY keyword, status').fetchall()
+        return {(keyword, status): count for keyword, status, count in rows}
+
+
+class RateLimiter:
+    """按主机限制请求间隔"""
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = {}
+
+    def wait(self, host, delay=0.0):
+        """等待到该主机允许下一次请求; delay 用于 Retry-After 退避, 推迟该主机后续所有请求"""
+        with self.lock:
+            now = time.monotonic()
+            ready = max(self.next_time.get(host, now), now + delay)
+            self.next_time[host] = ready + self.interval
+        time.sleep(max(0.0, ready - now))
+
+
+class HttpFetcher:
+    """默认下载器: urllib + 按主机限速, 429 / 503 时按 Retry-After 退避"""
+    def __init__(self, requests_per_second=8.0, max_backoff=60.0):
+        self.limiter = RateLimiter(requests_per_second)
+        self.max_backoff = max_backoff
+
+    def __call__(self, url, timeout=5):
+        host = urlparse(url).netloc
+        delay = 0.0
+        for _ in range(MAX_ATTEMPTS):
+            self.limiter.wait(host, delay)
+            request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    return response.read(), response.headers.get('Content-Type', '')
+            except urllib.error.HTTPError as e:
+                if e.code not in (429, 503):
+                    raise
+                retry_after = e.headers.get('Retry-After', '')
+                delay = min(float(retry_after) if retry_after.isdigit() else max(1.0, delay * 2), self.max_backoff)
+        raise IOError(f"服务器持续限流: {url}")
+
+
+def guess_extension(url, content_type, default_ext='jpg'):
+    ext = CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+    if ext:
+        return ext
+    match = re.search(r'\.(jpe?g|png|gif|webp|bmp)$', urlparse(url).path.lower())
+    if match:
+        return 'jpg' if match.group(1) == 'jpeg' else match.group(1)
+    return default_ext
+
+
+def existing_max_index(directory):
+    """目录中已有的数字文件名 (如旧版本爬虫保存的 000123.jpg) 的最大编号"""
+    if not os.path.isdir(directory):
+        return 0
+    indices = [int(m.group(1)) for m in (re.match(r'(\d+)\.\w+$', name) for name in os.listdir(directory)) if m]
+    return max(indices, default=0)
+
+
+def fetch_and_store(url, keyword, category, manifest, fetcher, category_dir, min_size=None,
+                    timeout=5, default_ext='jpg'):
+    """
+    下载单个 URL 并写入类别目录, 结果记录到清单
+    Returns:
+        (状态, 保存路径): 状态为 'skipped' 表示已处理过或正被其他线程处理
+    """
+    if not manifest.claim(url, keyword, category):
+        return 'skipped', None
+    try:
+        content, content_type = fetcher(url, timeout=timeout)
+    except Exception as e:
+        manifest.finish(url, 'failed', error=str(e)[:200])
+        return 'failed', None
+
+    sha1 = hashlib.sha1(content).hexdigest()
+    if manifest.has_content(category, sha1):
+        manifest.finish(url, 'duplicate', sha1=sha1)
+        return 'duplicate', None
+    if min_size is not None:
+        img = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+        if img is None:
+            manifest.finish(url, 'rejected', sha1=sha1, error='undecodable')
+            return 'rejected', None
+        # 缩小一半解码, 尺寸按 2 倍估算
+        if img.shape[1] * 2 < min_size[0] or img.shape[0] * 2 < min_size[1]:
+            manifest.finish(url, 'rejected', sha1=sha1, error='too small')
+            return 'rejected', None
+
+    os.makedirs(category_dir, exist_ok=True)
+    index = manifest.allocate_index(category, category_dir)
+    path = os.path.join(category_dir, f'{index:06d}.{guess_extension(url, content_type, default_ext)}')
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    manifest.finish(url, 'done', sha1=sha1, path=path)
+    return 'done', path
+
+
+def download_urls(urls, keyword, category, manifest, fetcher, category_dir, threads=16, min_size=None,
+                  max_num=None):
+    """
+    用线程池下载一组 URL (不依赖 icrawler, 供测试、基准测试和已有 URL 列表使用)
+    Returns:
+        dict: {状态: 数量}
+    """
+    stats = {}
+    stats_lock = threading.Lock()
+    stop = threading.Event()
+
+    def work(url):
+        if stop.is_set():
+            return
+        status, _ = fetch_and_store(url, keyword, category, manifest, fetcher, category_dir, min_size)
+        with stats_lock:
+            stats[status] = stats.get(status, 0) + 1
+            if max_num is not None and stats.get('done', 0) >= max_num:
+                stop.set()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, urls))
+    return stats
@@ -0,0 +1,337 @@
+"""
+主动学习: 在线收集模型不确定的画面, 离线挑选一批送去标注
+
+部署端 (yolo4class_raspi_mod.py / yolo4class_noport_mod.py 中 ACTIVE_LEARNING = True 时):
+    - 推理使用较低的置信度 UNCERTAIN_CONF_LOW, 置信度 >= CONF_THRESHOLD 的框照常用于分拣,
+      其余框只用于判断画面是否不确定
+    - 不确定: 有框的置信度落在 CONF_THRESHOLD 附近, 或两个重叠的框类别不同且置信度接近
+    - UncertainFrameQueue 在后台线程中把画面 (.jpg) 和预测结果 (.json) 写入 uncertain_frames/,
+      最多保留 max_frames 张, 超出时删除最早的; 写入来不及时直接丢弃, 不阻塞检测
+
+离线 (把 uncertain_frames/ 拷贝到电脑上):
+    按不确定度和画面多样性贪心挑选 (避免同一物体的连续多帧), 导出图片和 EasyData 格式的 JSON,
+    预测框作为预标注, 类别名为 "待确认_<大类>", 标注时需改为具体类别名 (如 carrot),
+    否则训练脚本会当作未知类别跳过。已导出的画面记录在 <queue>/exported.txt, 下次不再挑选。
+
+使用方法:
+    python active_learning.py --queue uncertain_frames --output label_batch --count 200
+    python active_learning.py --queue uncertain_frames --output label_batch --diversity 0.7 --no-prelabels
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+QUEUE_DIR = 'uncertain_frames'
+EXPORTED_FILE = 'exported.txt'
+BATCH_REPORT = 'batch_report.json'
+MAX_FRAMES = 2000          # 队列中最多保留的画面数
+MIN_SAVE_INTERVAL = 2.0    # 两次保存的最小间隔 (秒)
+PENDING_FRAMES = 4         # 等待后台写入的画面数上限
+JPEG_QUALITY = 90
+UNCERTAIN_CONF_LOW = 0.4   # 低于该置信度的框不参与判断
+UNCERTAIN_CONF_HIGH = 0.95  # 高于该置信度的框视为确定
+CONFUSION_IOU = 0.5        # 不同类别的框重叠超过该值视为类别混淆
+CONFUSION_MARGIN = 0.15    # 混淆框的置信度差小于该值才计入
+DIVERSITY_WEIGHT = 0.5     # 挑选时多样性的权重 (0 只看不确定度)
+PRELABEL_PREFIX = '待确认_'
+
+CLASS_NAMES = {
+    0: '厨余垃圾',
+    1: '可回收垃圾',
+    2: '有害垃圾',
+    3: '其他垃圾'
+}
+
+
+def box_iou(boxes):
+    """[N, 4] xyxy 两两之间的 IoU"""
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area[:, None] + area[None, :] - inter, 1e-9)
+
+
+def frame_uncertainty(boxes, confidences, class_ids, conf_threshold,
+                      conf_low=UNCERTAIN_CONF_LOW, conf_high=UNCERTAIN_CONF_HIGH):
+    """
+    画面的不确定度
+    Args:
+        boxes: [N, 4] xyxy; confidences / class_ids: [N]
+    Returns:
+        (不确定度 0~1, 原因): 原因为 'near_threshold' / 'class_confusion', 不需要保存时为 None
+    """
+    confidences = np.asarray(confidences, dtype=np.float64)
+    if confidences.size == 0:
+        return 0.0, None
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    class_ids = np.asarray(class_ids).astype(np.int64)
+
+    # 接近阈值: 阈值处为 1, 到 conf_low / conf_high 线性降为 0
+    width = np.where(confidences < conf_threshold, conf_threshold - conf_low, conf_high - conf_threshold)
+    near = 1.0 - np.abs(confidences - conf_threshold) / np.maximum(width, 1e-9)
+    near[(confidences < conf_low) | (confidences > conf_high)] = 0.0
+    score, reason = float(near.max(initial=0.0)), 'near_threshold'
+
+    # 类别混淆: 同一位置有不同类别的框且置信度接近
+    if confidences.size > 1:
+        iou = box_iou(boxes)
+        diff = np.abs(confidences[:, None] - confidences[None, :])
+        pairs = ((iou >= CONFUSION_IOU) & (class_ids[:, None] != class_ids[None, :]) & (diff < CONFUSION_MARGIN)
+                 & (confidences[:, None] >= conf_low) & (confidences[None, :] >= conf_low))
+        if pairs.any():
+            confusion = float((1.0 - diff[pairs] / CONFUSION_MARGIN).max())
+            if confusion > score:
+                score, reason = confusion, 'class_confusion'
+
+    return (score, reason) if score > 0 else (0.0, None)
+
+
+class UncertainFrameQueue:
+    """
+    有界的磁盘队列: 每个画面保存为 <时间>.jpg 和 <时间>.json (预测结果), 文件名按时间排序,
+    超过 max_frames 时删除最早的画面; .json 在图片写完后才写入, 程序中断留下的孤立图片在启动时清理
+    """
+    def __init__(self, root=QUEUE_DIR, max_frames=MAX_FRAMES, min_interval=MIN_SAVE_INTERVAL,
+                 pending=PENDING_FRAMES):
+        self.root = root
+        self.max_frames = max_frames
+        self.min_interval = min_interval
+        os.makedirs(root, exist_ok=True)
+        names = os.listdir(root)
+        stems = {os.path.splitext(name)[0] for name in names if name.endswith('.json')}
+        for name in names:
+            if (name.endswith('.jpg') and os.path.splitext(name)[0] not in stems) or name.endswith('.part'):
+                os.remove(os.path.join(root, name))
+        self.entries = deque(sorted(stems))
+        self.last_offer_time = 0.0
+        self.saved = 0
+        self.dropped = 0
+        self.sequence = 0
+        self.pending = queue.Queue(maxsize=pending)
+        self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+        self.writer_thread.start()
+        print(f"不确定画面队列: {root} (已有 {len(self.entries)} 张, 最多保留 {max_frames} 张)")
+
+    def observe(self, frame, boxes, confidences, class_ids, conf_threshold):
+        """
+        检测线程中每帧调用; 画面不确定且距离上次保存超过 min_interval 时复制画面交给后台线程写入
+        Returns:
+            bool: 是否保存该画面
+        """
+        now = time.time()
+        if now - self.last_offer_time < self.min_interval:
+            return False
+        score, reason = frame_uncertainty(boxes, confidences, class_ids, conf_threshold)
+        if reason is None:
+            return False
+        predictions = [
+            {'x1': int(b[0]), 'y1': int(b[1]), 'x2': int(b[2]), 'y2': int(b[3]),
+             'confidence': round(float(c), 4), 'class_id': int(k)}
+            for b, c, k in zip(np.asarray(boxes).reshape(-1, 4), confidences, class_ids)
+        ]
+        record = {'time': now, 'score': round(score, 4), 'reason': reason,
+                  'conf_threshold': conf_threshold, 'predictions': predictions}
+        try:
+            self.pending.put_nowait((frame.copy(), record))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.last_offer_time = now
+        return True
+
+    def writer(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            try:
+                self.write(*item)
+            except Exception as e:
+                print(f"保存不确定画面失败: {str(e)}")
+
+    def write(self, frame, record):
+        ts = record['time']
+        self.sequence += 1
+        stem = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(ts))}_{int(ts * 1000) % 1000:03d}_{self.sequence:04d}"
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            return
+        record = dict(record, image=stem + '.jpg', width=frame.shape[1], height=frame.shape[0])
+        for ext, data in (('.jpg', encoded.tobytes()),
+                          ('.json', json.dumps(record, ensure_ascii=False).encode('utf-8'))):
+            path = os.path.join(self.root, stem + ext)
+            with open(path + '.part', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.part', path)
+        self.entries.append(stem)
+        self.saved += 1
+        while len(self.entries) > self.max_frames:
+            oldest = self.entries.popleft()
+            for ext in ('.jpg', '.json'):
+                try:
+                    os.remove(os.path.join(self.root, oldest + ext))
+                except FileNotFoundError:
+                    pass
+
+    def close(self, timeout=5.0):
+        """写完已接受的画面后停止后台线程"""
+        self.pending.put(None)
+        self.writer_thread.join(timeout)
+        print(f"不确定画面队列: 本次保存 {self.saved} 张, 丢弃 {self.dropped} 张, 队列中共 {len(self.entries)} 张")
+
+
+def image_feature(path):
+    """
+    在子进程中运行: HSV 颜色直方图和 16x9 灰度缩略图, 各自 L2 归一化后拼接 (两张图的特征距离在 0~2 之间)
+    Returns:
+        np.ndarray 或 None (无法读取)
+    """
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    hsv = cv2.cvtColor(cv2.resize(img, (160, 90), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256]).flatten()
+    gray = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (16, 9), interpolation=cv2.INTER_AREA)
+    gray = gray.astype(np.float32).flatten()
+    gray -= gray.mean()
+    parts = [v / max(float(np.linalg.norm(v)), 1e-9) for v in (hist, gray)]
+    return np.concatenate(parts) / np.sqrt(2)
+
+
+def load_queue(queue_dir, skip_exported=True):
+    """读取队列中的画面记录, 跳过已导出的"""
+    exported = set()
+    exported_path = os.path.join(queue_dir, EXPORTED_FILE)
+    if skip_exported and os.path.exists(exported_path):
+        with open(exported_path, 'r', encoding='utf-8') as f:
+            exported = {line.strip() for line in f if line.strip()}
+    records = []
+    for name in sorted(os.listdir(queue_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext != '.json' or stem in exported or not os.path.exists(os.path.join(queue_dir, stem + '.jpg')):
+            continue
+        try:
+            with open(os.path.join(queue_dir, name), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        record['stem'] = stem
+        records.append(record)
+    return records
+
+
+def select_batch(scores, features, count, diversity_weight=DIVERSITY_WEIGHT):
+    """
+    贪心挑选: 每次选 (1 - w) * 不确定度 + w * 与已选画面的最小特征距离 (按当前最大值归一化) 最大的画面
+    Returns:
+        list: 选中的下标, 按挑选顺序
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    count = min(count, len(scores))
+    selected = []
+    min_dist = np.full(len(scores), np.inf)
+    available = np.ones(len(scores), dtype=bool)
+    for _ in range(count):
+        if selected:
+            diversity = min_dist / max(float(min_dist[available].max()), 1e-9)
+        else:
+            diversity = np.ones(len(scores))
+        gain = (1.0 - diversity_weight) * scores + diversity_weight * diversity
+        gain[~available] = -np.inf
+        index = int(np.argmax(gain))
+        selected.append(index)
+        available[index] = False
+        min_dist = np.minimum(min_dist, np.linalg.norm(features - features[index], axis=1))
+    return selected
+
+
+def export_batch(queue_dir, output_dir, count=200, diversity_weight=DIVERSITY_WEIGHT, prelabels=True,
+                 num_workers=None):
+    """
+    挑选并导出一批待标注画面: <output>/<时间>.jpg + <时间>.json ({"labels": [{x1, y1, x2, y2, name}]})
+    Returns:
+        list: 导出的记录
+    """
+    records = load_queue(queue_dir)
+    if not records:
+        print(f"队列 {queue_dir} 中没有未导出的画面")
+        return []
+    paths = [os.path.join(queue_dir, record['stem'] + '.jpg') for record in records]
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers == 1 or len(paths) < 64:
+        features = [image_feature(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            features = list(executor.map(image_feature, paths, chunksize=32))
+    records = [record for record, feature in zip(records, features) if feature is not None]
+    features = np.stack([feature for feature in features if feature is not None])
+
+    order = select_batch([record['score'] for record in records], features, count, diversity_weight)
+    os.makedirs(output_dir, exist_ok=True)
+    exported = []
+    for rank, index in enumerate(order, 1):
+        record = records[index]
+        stem = record['stem']
+        shutil.copy2(os.path.join(queue_dir, stem + '.jpg'), os.path.join(output_dir, stem + '.jpg'))
+        labels = []
+        if prelabels:
+            labels = [{'x1': p['x1'], 'y1': p['y1'], 'x2': p['x2'], 'y2': p['y2'],
+                       'name': PRELABEL_PREFIX + CLASS_NAMES.get(p['class_id'], str(p['class_id']))}
+                      for p in record['predictions']]
+        with open(os.path.join(output_dir, stem + '.json'), 'w', encoding='utf-8') as f:
+            json.dump({'labels': labels}, f, ensure_ascii=False)
+        exported.append({'rank': rank, 'image': stem + '.jpg', 'score': record['score'], 'reason': record['reason'],
+                         'predictions': record['predictions']})
+
+    with open(os.path.join(output_dir, BATCH_REPORT), 'w', encoding='utf-8') as f:
+        json.dump({'queue': queue_dir, 'candidates': len(records), 'diversity_weight': diversity_weight,
+                   'images': exported}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(queue_dir, EXPORTED_FILE), 'a', encoding='utf-8') as f:
+        f.writelines(item['image'][:-4] + '\n' for item in exported)
+
+    reasons = {}
+    for item in exported:
+        reasons[item['reason']] = reasons.get(item['reason'], 0) + 1
+    print(f"从 {len(records)} 张候选画面中导出 {len(exported)} 张到 {output_dir} {reasons}")
+    return exported
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Select uncertain production frames and export a labeling batch')
+    parser.add_argument('--queue', type=str, default=QUEUE_DIR,
+                        help=f'Uncertain frame queue directory copied from the device (default: {QUEUE_DIR})')
+    parser.add_argument('--output', type=str, default='label_batch',
+                        help='Output directory for images and EasyData JSON (default: label_batch)')
+    parser.add_argument('--count', type=int, default=200,
+                        help='Number of frames to export (default: 200)')
+    parser.add_argument('--diversity', type=float, default=DIVERSITY_WEIGHT,
+                        help=f'Weight of visual diversity vs. uncertainty, 0..1 (default: {DIVERSITY_WEIGHT})')
+    parser.add_argument('--no-prelabels', action='store_true',
+                        help='Export empty label files instead of model predictions')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.queue):
+        print(f"错误: 目录 '{args.queue}' 不存在")
+        return
+    export_batch(args.queue, args.output, args.count, args.diversity, not args.no_prelabels, args.workers)
+
+
+if __name__ == '__main__':
+    main()
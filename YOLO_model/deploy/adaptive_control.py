@@ -0,0 +1,215 @@
+"""
+自适应降级控制: 根据实测的端到端延迟 (采集到串口发送)、CPU 温度和推理队列长度调整推理分辨率 / 跳帧 / 采集帧率,
+保持延迟在目标以内, 避免过热降频时 STM32 收到过时的坐标
+
+- LEVELS 为从高到低的档位, 每档包含推理尺寸 imgsz、跳帧数 skip (每处理一帧后跳过的新画面数) 和采集帧率 fps
+- 降档: 最近延迟的 p90 超过目标, 或 CPU 温度达到 TEMP_LIMIT / 推理队列超过 MAX_QUEUE (每 HOLD_DOWN 秒最多降一档)
+- 升档: 延迟 p90 低于目标的 HEADROOM 倍、温度低于 TEMP_RESUME、队列为空, 并且距上次调整至少 HOLD_UP 秒
+- 每次调整后清空延迟样本, 用新档位的样本做下一次判断; 调整记录打印到日志并保存在 decisions 中,
+  snapshot() 的内容通过统计接口 (detection_stats.py) 的 "adaptive" 字段提供
+
+模拟 (延迟随 imgsz 变化, 中途 CPU 过热降频一段时间), 用于调整参数:
+    python adaptive_control.py --simulate --target 0.25
+"""
+import argparse
+import glob
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# 从高到低的档位: 推理尺寸, 跳帧数, 采集帧率 (0 表示不限制)
+LEVELS = [
+    {'imgsz': 640, 'skip': 0, 'fps': 0},
+    {'imgsz': 512, 'skip': 0, 'fps': 0},
+    {'imgsz': 416, 'skip': 0, 'fps': 0},
+    {'imgsz': 320, 'skip': 0, 'fps': 20},
+    {'imgsz': 320, 'skip': 1, 'fps': 15},
+    {'imgsz': 256, 'skip': 2, 'fps': 10},
+]
+TARGET_LATENCY = 0.25    # 目标端到端延迟 (秒)
+HEADROOM = 0.6           # 延迟低于目标的该比例时才升档
+TEMP_LIMIT = 75.0        # 达到该温度 (摄氏度) 时降档
+TEMP_RESUME = 68.0       # 低于该温度才允许升档
+MAX_QUEUE = 2            # 推理队列超过该长度时降档
+MIN_SAMPLES = 8          # 做延迟判断所需的最少样本数
+UPDATE_INTERVAL = 1.0    # 判断间隔 (秒)
+HOLD_UP = 10.0           # 距上次调整至少多少秒才升档
+HOLD_DOWN = 5.0          # 温度 / 队列触发的降档间隔 (秒), 让降档后的负载变化有时间体现
+THERMAL_GLOB = '/sys/class/thermal/thermal_zone*/temp'
+
+
+def read_cpu_temperature(pattern=THERMAL_GLOB):
+    """各温度传感器中的最高温度 (摄氏度), 读取不到时返回 None"""
+    temperatures = []
+    for path in glob.glob(pattern):
+        try:
+            with open(path, 'r') as f:
+                temperatures.append(int(f.read().strip()) / 1000.0)
+        except (OSError, ValueError):
+            continue
+    return max(temperatures) if temperatures else None
+
+
+class AdaptiveController:
+    """
+    线程安全, 可在多个摄像头线程中调用 observe()
+    Args:
+        queue_depth: 返回当前推理队列长度的函数 (如 MicroBatcher.pending)
+        read_temperature: 返回 CPU 温度的函数, 默认读取 /sys/class/thermal
+    """
+    def __init__(self, target_latency=TARGET_LATENCY, levels=None, queue_depth=None,
+                 read_temperature=read_cpu_temperature, initial_level=0, clock=time.monotonic):
+        self.target_latency = target_latency
+        self.levels = list(levels or LEVELS)
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.read_temperature = read_temperature
+        self.clock = clock
+        self.level = initial_level
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=64)
+        self.last_update = clock()
+        self.last_change = clock()
+        self.temperature = None
+        self.queue = 0
+        self.decisions = deque(maxlen=50)
+        self.listeners = []
+
+    @property
+    def settings(self):
+        """当前档位 {'imgsz', 'skip', 'fps'}"""
+        return self.levels[self.level]
+
+    def add_listener(self, callback):
+        """档位变化时调用 callback(settings)"""
+        self.listeners.append(callback)
+
+    def observe(self, latency):
+        """记录一帧的端到端延迟 (秒), 到判断间隔时更新档位"""
+        with self.lock:
+            self.samples.append(latency)
+            if self.clock() - self.last_update < UPDATE_INTERVAL:
+                return
+        self.update()
+
+    def latency_p90(self):
+        return float(np.percentile(self.samples, 90)) if len(self.samples) >= MIN_SAMPLES else None
+
+    def update(self):
+        """根据延迟 / 温度 / 队列判断是否调整档位 (也可以由定时器调用, 没有画面时温度仍会触发降档)"""
+        temperature = self.read_temperature() if self.read_temperature else None
+        queue = self.queue_depth()
+        with self.lock:
+            now = self.clock()
+            self.last_update = now
+            self.temperature, self.queue = temperature, queue
+            p90 = self.latency_p90()
+            reason, step = None, 0
+            held = now - self.last_change >= HOLD_DOWN
+            if p90 is not None and p90 > self.target_latency:
+                reason, step = f"延迟 p90 {p90 * 1000:.0f} ms > 目标 {self.target_latency * 1000:.0f} ms", 1
+            elif temperature is not None and temperature >= TEMP_LIMIT and held:
+                reason, step = f"CPU 温度 {temperature:.1f}°C >= {TEMP_LIMIT:.0f}°C", 1
+            elif queue > MAX_QUEUE and held:
+                reason, step = f"推理队列 {queue} > {MAX_QUEUE}", 1
+            elif (p90 is not None and p90 < self.target_latency * HEADROOM and queue == 0
+                  and (temperature is None or temperature < TEMP_RESUME) and now - self.last_change >= HOLD_UP):
+                reason, step = f"延迟 p90 {p90 * 1000:.0f} ms < {self.target_latency * HEADROOM * 1000:.0f} ms", -1
+            new_level = min(len(self.levels) - 1, max(0, self.level + step))
+            if new_level == self.level:
+                return False
+            decision = {
+                'time': time.time(), 'from': self.level, 'to': new_level, 'reason': reason,
+                'latency_p90_ms': None if p90 is None else round(p90 * 1000, 1),
+                'temperature': temperature, 'queue': queue, 'settings': dict(self.levels[new_level]),
+            }
+            self.decisions.append(decision)
+            self.level = new_level
+            self.last_change = now
+            self.samples.clear()
+        settings = self.levels[new_level]
+        print(f"自适应控制: {'降档' if step > 0 else '升档'} {decision['from']} -> {new_level} ({reason}), "
+              f"imgsz={settings['imgsz']} 跳帧={settings['skip']} 采集帧率={settings['fps'] or '不限'}")
+        for callback in self.listeners:
+            callback(settings)
+        return True
+
+    def snapshot(self):
+        """用于统计接口的当前状态和最近的调整记录"""
+        with self.lock:
+            samples = np.array(self.samples) * 1000
+            return {
+                'level': self.level,
+                'settings': dict(self.settings),
+                'target_latency_ms': self.target_latency * 1000,
+                'latency_p50_ms': round(float(np.percentile(samples, 50)), 1) if samples.size else None,
+                'latency_p90_ms': round(float(np.percentile(samples, 90)), 1) if samples.size else None,
+                'temperature': self.temperature,
+                'queue': self.queue,
+                'decisions': list(self.decisions)[-10:],
+            }
+
+
+def simulate(target=TARGET_LATENCY, seconds=120, base_latency=0.12):
+    """
+    模拟: 延迟与 imgsz 的平方成正比, 跳帧降低 CPU 负载; 第 30~70 秒 CPU 过热降频 (延迟 x1.8, 温度 80°C)
+    使用模拟时钟, 不实际等待; 降频结束后温度每秒下降 1°C
+    """
+    clock = [0.0]
+    state = {'temperature': 55.0}
+    controller = AdaptiveController(target, read_temperature=lambda: state['temperature'], clock=lambda: clock[0])
+    rng = np.random.default_rng(0)
+    latencies, timeline = [], []
+    while clock[0] < seconds:
+        throttled = 30 <= clock[0] < 70
+        state['temperature'] = 80.0 if throttled else max(55.0, 80.0 - (clock[0] - 70)) if clock[0] >= 70 else 55.0
+        settings = controller.settings
+        load = 1.0 / (1 + settings['skip'])  # 跳帧时有更多空闲时间, 推理不与其他负载争用
+        latency = base_latency * (settings['imgsz'] / 320) ** 2 * (1.8 if throttled else 1.0)
+        latency *= (0.85 + 0.3 * load) * rng.uniform(0.9, 1.2)
+        latencies.append((clock[0], latency))
+        controller.observe(latency)
+        clock[0] += latency * (1 + settings['skip'])
+        timeline.append((clock[0], controller.level))
+    print(f"\n目标延迟 {target * 1000:.0f} ms, 模拟 {seconds} 秒 (第 30~70 秒过热降频)")
+    print(f"{'时间段':<12} | {'帧数':>5} | {'延迟 p50':>9} | {'延迟 p90':>9} | {'超过目标':>8} | 档位")
+    print("-" * 70)
+    for start in range(0, seconds, 10):
+        window = [l for t, l in latencies if start <= t < start + 10]
+        levels = sorted({level for t, level in timeline if start <= t < start + 10})
+        if not window:
+            continue
+        window = np.array(window) * 1000
+        over = np.mean(window > target * 1000)
+        print(f"{start:>4}-{start + 10:<4} 秒  | {len(window):>5} | {np.percentile(window, 50):>7.0f}ms | "
+              f"{np.percentile(window, 90):>7.0f}ms | {over:>8.0%} | {levels}")
+    print(f"调整次数: {len(controller.decisions)}")
+    return controller
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Adaptive resolution / frame-rate controller for the deploy loop')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Run the controller against a simulated load with a thermal throttling phase')
+    parser.add_argument('--target', type=float, default=TARGET_LATENCY,
+                        help=f'Target end-to-end latency in seconds (default: {TARGET_LATENCY})')
+    parser.add_argument('--seconds', type=int, default=120,
+                        help='Simulated duration (default: 120)')
+    parser.add_argument('--base-latency', type=float, default=0.12,
+                        help='Simulated latency at imgsz 320 without throttling (default: 0.12)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not args.simulate:
+        temperature = read_cpu_temperature()
+        print(f"CPU 温度: {'无法读取' if temperature is None else f'{temperature:.1f}°C'}")
+        print("请使用 --simulate 运行模拟; 部署时由 yolo4class_raspi_mod.py 中的 ADAPTIVE_CONTROL 启用")
+        return
+    simulate(args.target, args.seconds, args.base_latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -71,9 +71,9 @@ install_service() {
 
     # 创建 ExecStart 命令
     if [ -n "$CONDA_ENV" ]; then
-        EXEC_START_CMD="/bin/bash -c 'echo \"激活 Conda 环境: $CONDA_ENV\"; source \"$CONDA_BASE/etc/profile.d/conda.sh\"; conda activate \"$CONDA_ENV\"; if [ \"\$?\" -ne 0 ]; then echo \"错误: 无法激活 Conda 环境 '$CONDA_ENV'。\"; exit 1; fi; echo \"开始执行 Python 脚本: $SCRIPT_PATH\"; python \"$SCRIPT_PATH\"'"
+        EXEC_START_CMD="/bin/bash -c 'echo \"激活 Conda 环境: $CONDA_ENV\"; source \"$CONDA_BASE/etc/profile.d/conda.sh\"; conda activate \"$CONDA_ENV\"; if [ \"\$?\" -ne 0 ]; then echo \"错误: 无法激活 Conda 环境 '$CONDA_ENV'。\"; exit 1; fi; echo \"开始执行 Python 脚本: $SCRIPT_PATH\"; exec python \"$SCRIPT_PATH\"'"
     else
-        EXEC_START_CMD="/bin/bash -c 'echo \"使用系统默认的 Python 环境.\"; echo \"开始执行 Python 脚本: $SCRIPT_PATH\"; python \"$SCRIPT_PATH\"'"
+        EXEC_START_CMD="/bin/bash -c 'echo \"使用系统默认的 Python 环境.\"; echo \"开始执行 Python 脚本: $SCRIPT_PATH\"; exec python \"$SCRIPT_PATH\"'"
     fi
 
     # 创建 systemd 服务文件内容
@@ -90,6 +90,9 @@ ExecStart=$EXEC_START_CMD
 
 Restart=on-failure
 RestartSec=5
+# exec 使 Python 成为服务主进程; 停止服务时先只向主进程发送 SIGTERM, 由主进程关闭串口并结束采集子进程; 超时后强制结束整个服务
+KillMode=mixed
+TimeoutStopSec=15
 
 [Install]
 WantedBy=multi-user.target"
@@ -0,0 +1,291 @@
+"""
+分拣统计: 各类别每分钟数量、置信度分布、串口发送频率
+
+- 三个滚动窗口 (最近 1 分钟 / 1 小时 / 24 小时), 每个窗口是固定大小的 NumPy 环形桶数组,
+  每个事件只更新一个桶 (O(1)), 可以直接在检测线程中调用; 内存占用固定
+- 启动时可以从事件存储 (event_store.py) 回放最近 24 小时的计数, 重启后统计不清零
+- 本地 HTTP JSON 接口: GET /stats (全部窗口) 或 /stats?window=1h
+
+使用方法:
+    python detection_stats.py                                  # 读取运行中的检测程序的统计接口
+    python detection_stats.py --watch 5                        # 每 5 秒刷新
+    python detection_stats.py --db detection_events.db         # 不连接检测程序, 从事件存储计算
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+STATS_HOST = '127.0.0.1'
+STATS_PORT = 8090
+CONF_BINS = 50  # 置信度直方图 [0, 1] 的分箱数 (每格 0.02)
+# 窗口名称: (桶数, 每桶秒数)
+WINDOWS = {
+    '1m': (60, 1),
+    '1h': (60, 60),
+    '24h': (96, 900),
+}
+CLASS_NAMES = {
+    0: '厨余垃圾',
+    1: '可回收垃圾',
+    2: '有害垃圾',
+    3: '其他垃圾'
+}
+
+
+class RollingWindow:
+    """环形桶: 第 i 个桶保存时间段 [id * bucket_seconds, (id + 1) * bucket_seconds) 的计数, 过期的桶在复用时清零"""
+    def __init__(self, buckets, bucket_seconds, num_classes, conf_bins=CONF_BINS):
+        self.buckets = buckets
+        self.bucket_seconds = bucket_seconds
+        self.bucket_ids = np.full(buckets, -1, dtype=np.int64)
+        self.items = np.zeros((buckets, num_classes), dtype=np.int64)
+        self.confidences = np.zeros((buckets, num_classes, conf_bins), dtype=np.int64)
+        self.sends = np.zeros(buckets, dtype=np.int64)
+
+    @property
+    def seconds(self):
+        return self.buckets * self.bucket_seconds
+
+    def slot(self, ts):
+        """时间戳对应的桶下标; 早于窗口的事件返回 None"""
+        index = int(ts // self.bucket_seconds)
+        slot = index % self.buckets
+        current = self.bucket_ids[slot]
+        if current != index:
+            if index < current:
+                return None
+            self.bucket_ids[slot] = index
+            self.items[slot] = 0
+            self.confidences[slot] = 0
+            self.sends[slot] = 0
+        return slot
+
+    def valid(self, now):
+        """仍在窗口内的桶"""
+        return self.bucket_ids > int(now // self.bucket_seconds) - self.buckets
+
+
+class DetectionStats:
+    """线程安全的滚动统计"""
+    def __init__(self, class_names=None, windows=None, conf_bins=CONF_BINS):
+        self.class_names = dict(class_names or CLASS_NAMES)
+        self.num_classes = max(self.class_names) + 1
+        self.conf_bins = conf_bins
+        self.windows = {name: RollingWindow(buckets, seconds, self.num_classes, conf_bins)
+                        for name, (buckets, seconds) in (windows or WINDOWS).items()}
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.server = None
+        self.sources = {}  # 附加到统计接口的其他指标: 名称 -> 返回字典的函数
+
+    def add_source(self, name, snapshot):
+        """在统计接口中附加其他模块的指标 (如自适应控制), snapshot() 返回可序列化为 JSON 的字典"""
+        self.sources[name] = snapshot
+
+    def conf_bin(self, confidence):
+        return min(self.conf_bins - 1, max(0, int(confidence * self.conf_bins)))
+
+    def record_item(self, class_id, confidence=None, ts=None):
+        """计数一个分拣物品, 同时记录其置信度"""
+        if class_id is None or not 0 <= class_id < self.num_classes:
+            return
+        ts = time.time() if ts is None else ts
+        conf_bin = None if confidence is None else self.conf_bin(confidence)
+        with self.lock:
+            for window in self.windows.values():
+                slot = window.slot(ts)
+                if slot is None:
+                    continue
+                window.items[slot, class_id] += 1
+                if conf_bin is not None:
+                    window.confidences[slot, class_id, conf_bin] += 1
+
+    def record_send(self, ts=None):
+        """记录一次串口发送"""
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            for window in self.windows.values():
+                slot = window.slot(ts)
+                if slot is not None:
+                    window.sends[slot] += 1
+
+    def replay(self, events):
+        """
+        从事件存储回放计数: events 为 [(时间戳, 类别ID, 置信度)], 时间从早到晚
+        Returns:
+            int: 回放的事件数
+        """
+        count = 0
+        for ts, class_id, confidence in events:
+            if class_id is None:
+                continue
+            self.record_item(class_id, confidence, ts)
+            self.start_time = min(self.start_time, ts)
+            count += 1
+        return count
+
+    def window_snapshot(self, name, now):
+        window = self.windows[name]
+        valid = window.valid(now)
+        items = window.items[valid].sum(axis=0)
+        hist = window.confidences[valid].sum(axis=0)
+        sends = int(window.sends[valid].sum())
+        # 统计时长 (程序运行时间, 含回放的事件) 不足一个窗口时按实际时长计算速率
+        span = max(1.0, min(window.seconds, now - self.start_time))
+        centers = (np.arange(self.conf_bins) + 0.5) / self.conf_bins
+        categories = {}
+        for class_id, class_name in sorted(self.class_names.items()):
+            counts = hist[class_id]
+            total = int(counts.sum())
+            quantiles = {}
+            if total:
+                cumulative = np.cumsum(counts) / total
+                for q in (0.1, 0.5, 0.9):
+                    quantiles[f'p{int(q * 100)}'] = round(float(centers[np.searchsorted(cumulative, q)]), 3)
+            categories[class_name] = {
+                'items': int(items[class_id]),
+                'items_per_minute': round(float(items[class_id]) * 60 / span, 3),
+                'confidence_mean': round(float((counts * centers).sum() / total), 4) if total else None,
+                'confidence_quantiles': quantiles,
+                'confidence_histogram': counts.tolist(),
+            }
+        return {
+            'window_seconds': window.seconds,
+            'covered_seconds': round(span, 1),
+            'items': int(items.sum()),
+            'items_per_minute': round(float(items.sum()) * 60 / span, 3),
+            'serial_sends': sends,
+            'serial_sends_per_minute': round(sends * 60 / span, 3),
+            'categories': categories,
+        }
+
+    def snapshot(self, window=None):
+        """{窗口名称: 统计}; window 指定时只返回该窗口"""
+        now = time.time()
+        names = [window] if window else list(self.windows)
+        with self.lock:
+            windows = {name: self.window_snapshot(name, now) for name in names}
+        snapshot = {'time': now, 'tracked_seconds': round(now - self.start_time, 1),
+                    'confidence_bin_width': 1.0 / self.conf_bins, 'windows': windows}
+        for name, source in self.sources.items():
+            snapshot[name] = source()
+        return snapshot
+
+    def serve(self, host=STATS_HOST, port=STATS_PORT):
+        """在后台线程中启动 HTTP JSON 接口"""
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                window = parse_qs(url.query).get('window', [None])[0]
+                if url.path.rstrip('/') != '/stats' or (window and window not in stats.windows):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps(stats.snapshot(window), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"统计接口已启动: http://{host}:{self.server.server_address[1]}/stats")
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def print_snapshot(snapshot):
+    print(f"\n统计时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['time']))}  "
+          f"统计时长 {snapshot['tracked_seconds'] / 3600:.1f} 小时")
+    for name, window in snapshot['windows'].items():
+        print(f"\n[{name}] 共 {window['items']} 件 ({window['items_per_minute']:.2f} 件/分钟), "
+              f"串口发送 {window['serial_sends']} 次 ({window['serial_sends_per_minute']:.2f} 次/分钟)")
+        print(f"{'类别':<10} | {'数量':>6} | {'件/分钟':>8} | {'平均置信度':>10} | {'置信度 p10 / p50 / p90':>22}")
+        print("-" * 80)
+        for category, stats in window['categories'].items():
+            mean = '-' if stats['confidence_mean'] is None else f"{stats['confidence_mean']:.2%}"
+            q = stats['confidence_quantiles']
+            quantiles = ' / '.join(f"{q[key]:.2f}" for key in ('p10', 'p50', 'p90')) if q else '-'
+            print(f"{category:<10} | {stats['items']:>6} | {stats['items_per_minute']:>8.2f} | "
+                  f"{mean:>10} | {quantiles:>22}")
+    adaptive = snapshot.get('adaptive')
+    if adaptive:
+        settings = adaptive['settings']
+        temperature = '-' if adaptive['temperature'] is None else f"{adaptive['temperature']:.1f}°C"
+        latency = '-' if adaptive['latency_p90_ms'] is None else f"{adaptive['latency_p90_ms']:.0f} ms"
+        print(f"\n[自适应控制] 档位 {adaptive['level']}: imgsz={settings['imgsz']} 跳帧={settings['skip']} "
+              f"采集帧率={settings['fps'] or '不限'}, 延迟 p90 {latency} (目标 {adaptive['target_latency_ms']:.0f} ms), "
+              f"CPU 温度 {temperature}, 推理队列 {adaptive['queue']}")
+        for decision in adaptive['decisions']:
+            print(f"  {time.strftime('%H:%M:%S', time.localtime(decision['time']))}  "
+                  f"{decision['from']} -> {decision['to']}  {decision['reason']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Show per-category sorting throughput and confidence statistics')
+    parser.add_argument('--url', type=str, default=f'http://{STATS_HOST}:{STATS_PORT}/stats',
+                        help=f'Stats endpoint of the running detector (default: http://{STATS_HOST}:{STATS_PORT}/stats)')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Compute from an event store database instead of the live endpoint')
+    parser.add_argument('--window', type=str, default=None, choices=list(WINDOWS),
+                        help='Only show one window (default: all)')
+    parser.add_argument('--watch', type=float, default=0,
+                        help='Refresh every N seconds, 0 prints once (default: 0)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print raw JSON')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    while True:
+        if args.db:
+            if not os.path.exists(args.db):
+                print(f"错误: 数据库 '{args.db}' 不存在")
+                return
+            from event_store import EventStore
+            store = EventStore(args.db, read_only=True)
+            stats = DetectionStats()
+            longest = max(window.seconds for window in stats.windows.values())
+            stats.replay(store.query('SELECT ts, class_id, confidence FROM events WHERE ts >= ? ORDER BY id',
+                                     (time.time() - longest,)))
+            store.close()
+            snapshot = stats.snapshot(args.window)
+        else:
+            url = args.url + (f'?window={args.window}' if args.window else '')
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    snapshot = json.loads(response.read().decode('utf-8'))
+            except OSError as e:
+                print(f"错误: 无法连接统计接口 {url}: {e}")
+                return
+        if args.json:
+            print(json.dumps(snapshot, ensure_ascii=False, indent=2))
+        else:
+            print_snapshot(snapshot)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+检测事件存储 (SQLite, WAL 模式): 代替 SerialManager 中只增不减、重启即丢失的 detected_items 列表
+
+- record() 只把事件放入有界队列, 后台线程每 FLUSH_INTERVAL 秒或攒够 BATCH_SIZE 条写入一次 (一个事务)
+- 保留策略: 超过 retention_days 天或超过 max_events 条的旧事件定期删除, 数据库文件大小稳定
+- 查询: 按小时 / 类别统计数量、最近的事件、总数
+- 内存占用只与队列长度有关, 与运行时长无关
+- 命令行查询 (本文件和 detection_stats.py --db) 使用只读连接, 不建表、不改表结构、不执行保留策略,
+  可以在检测程序运行时查询
+
+使用方法:
+    python event_store.py --db detection_events.db --hours 24
+    python event_store.py --db detection_events.db --recent 20
+"""
+import argparse
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+
+EVENT_DB = 'detection_events.db'
+BATCH_SIZE = 64            # 攒够多少条事件写入一次
+FLUSH_INTERVAL = 1.0       # 最长多少秒写入一次
+PENDING_EVENTS = 4096      # 等待写入的事件数上限, 超出时丢弃并计数
+RETENTION_DAYS = 90        # 事件保留天数
+MAX_EVENTS = 5_000_000     # 最多保留的事件数
+RETENTION_INTERVAL = 3600  # 执行保留策略的间隔 (秒)
+FLUSH = object()  # 队列中的立即写入标记
+
+
+class EventStore:
+    """
+    线程安全的检测事件存储; 写入在后台线程中批量完成, 查询直接读数据库
+    read_only 为 True 时以只读方式打开已有数据库, 只能查询, 不启动写入线程
+    """
+    def __init__(self, db_path=EVENT_DB, retention_days=RETENTION_DAYS, max_events=MAX_EVENTS,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, read_only=False):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=PENDING_EVENTS)
+        self.dropped = 0
+        self.written = 0
+        self.last_retention = 0.0
+        self.flushed = threading.Condition()
+        self.writer_thread = None
+        if read_only:
+            uri = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(events)')}
+            self.camera_column = 'camera' if 'camera' in columns else 'NULL'
+            return
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum 只对新建的数据库直接生效; 已有数据库 (读回 0) 需要一次 VACUUM 才会切换,
+        # 否则 apply_retention 中的 incremental_vacuum 不会归还空闲页
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0:
+            self.conn.execute('VACUUM')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                class_id INTEGER,
+                category TEXT NOT NULL,
+                confidence REAL,
+                x INTEGER,
+                y INTEGER,
+                status TEXT,
+                camera TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+        ''')
+        # 旧版本数据库没有 camera 列
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(events)')}
+        if 'camera' not in columns:
+            self.conn.execute('ALTER TABLE events ADD COLUMN camera TEXT')
+        self.camera_column = 'camera'
+        self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+        self.writer_thread.start()
+
+    def record(self, category, class_id=None, confidence=None, center=None, status="正确", ts=None, camera=None):
+        """记录一个事件 (不阻塞); 队列满时丢弃"""
+        x, y = center if center is not None else (None, None)
+        event = (time.time() if ts is None else ts, class_id, category,
+                 None if confidence is None else float(confidence), x, y, status, camera)
+        try:
+            self.pending.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def writer(self):
+        running = True
+        while running:
+            batch, taken = [], 0
+            try:
+                item = self.pending.get(timeout=self.flush_interval)
+                taken += 1
+                deadline = time.monotonic() + self.flush_interval
+                # 攒够 batch_size 条或等到 deadline 再写入; flush() / close() 放入的标记提前结束本批
+                while item is not FLUSH and item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                    taken += 1
+                running = item is not None
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self.write_batch(batch)
+                if time.time() - self.last_retention >= RETENTION_INTERVAL:
+                    self.apply_retention()
+            except sqlite3.Error as e:
+                print(f"事件写入失败: {str(e)}")
+            for _ in range(taken):
+                self.pending.task_done()
+            with self.flushed:
+                self.flushed.notify_all()
+
+    def write_batch(self, batch):
+        with self.lock:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany('INSERT INTO events (ts, class_id, category, confidence, x, y, status, camera) '
+                                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+        self.written += len(batch)
+
+    def apply_retention(self):
+        """删除过期和超出数量上限的事件, 并归还空闲页"""
+        self.last_retention = time.time()
+        with self.lock:
+            self.conn.execute('DELETE FROM events WHERE ts < ?', (time.time() - self.retention_days * 86400,))
+            if self.max_events:
+                self.conn.execute('DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?',
+                                  (self.max_events,))
+            # execute() 只执行一步 (只归还一页), executescript 执行到结束
+            self.conn.executescript('PRAGMA incremental_vacuum;')
+
+    def flush(self, timeout=5.0):
+        """等待已记录的事件写入数据库"""
+        deadline = time.monotonic() + timeout
+        self.pending.put(FLUSH)
+        with self.flushed:
+            while self.pending.unfinished_tasks and time.monotonic() < deadline:
+                self.flushed.wait(max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout=5.0):
+        """写入剩余事件后关闭数据库"""
+        if self.writer_thread is not None:
+            self.pending.put(None)
+            self.writer_thread.join(timeout)
+        with self.lock:
+            self.conn.close()
+        if self.dropped:
+            print(f"检测事件: 队列已满丢弃 {self.dropped} 条")
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def count(self, since=None):
+        if since is None:
+            return self.query('SELECT COUNT(*) FROM events')[0][0]
+        return self.query('SELECT COUNT(*) FROM events WHERE ts >= ?', (since,))[0][0]
+
+    def hourly_counts(self, since=None, until=None):
+        """
+        按小时 (本地时间) 和类别统计数量
+        Returns:
+            list: [(小时 'YYYY-MM-DD HH:00', 类别, 数量)], 按时间排序
+        """
+        since = 0.0 if since is None else since
+        until = time.time() if until is None else until
+        return self.query(
+            "SELECT strftime('%Y-%m-%d %H:00', ts, 'unixepoch', 'localtime') AS hour, category, COUNT(*) "
+            "FROM events WHERE ts >= ? AND ts < ? GROUP BY hour, category ORDER BY hour, category",
+            (since, until))
+
+    def category_totals(self, since=None):
+        """{类别: 数量}"""
+        rows = self.query('SELECT category, COUNT(*) FROM events WHERE ts >= ? GROUP BY category',
+                          (0.0 if since is None else since,))
+        return dict(rows)
+
+    def recent(self, limit=20):
+        """最近的事件 (新的在前): [{ts, class_id, category, confidence, x, y, status, camera}]"""
+        rows = self.query(f'SELECT ts, class_id, category, confidence, x, y, status, {self.camera_column} FROM events '
+                          'ORDER BY id DESC LIMIT ?', (limit,))
+        keys = ('ts', 'class_id', 'category', 'confidence', 'x', 'y', 'status', 'camera')
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Query the persistent detection event store')
+    parser.add_argument('--db', type=str, default=EVENT_DB,
+                        help=f'Event database path (default: {EVENT_DB})')
+    parser.add_argument('--hours', type=int, default=24,
+                        help='Show per-hour counts per category for the last N hours (default: 24)')
+    parser.add_argument('--recent', type=int, default=0,
+                        help='Also list the N most recent events (default: 0)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db):
+        print(f"错误: 数据库 '{args.db}' 不存在")
+        return
+    store = EventStore(args.db, read_only=True)
+    try:
+        rows = store.hourly_counts(since=time.time() - args.hours * 3600)
+        categories = sorted({category for _, category, _ in rows})
+        table = {}
+        for hour, category, count in rows:
+            table.setdefault(hour, {})[category] = count
+        print(f"最近 {args.hours} 小时各类别数量 (共 {sum(count for _, _, count in rows)} 条, 数据库共 {store.count()} 条)")
+        print(f"{'小时':<17} | " + " | ".join(f"{category:>8}" for category in categories))
+        print("-" * (20 + 11 * len(categories)))
+        for hour in sorted(table):
+            print(f"{hour:<17} | " + " | ".join(f"{table[hour].get(category, 0):>8}" for category in categories))
+        if args.recent:
+            print(f"\n最近 {args.recent} 条事件:")
+            for event in store.recent(args.recent):
+                confidence = '-' if event['confidence'] is None else f"{event['confidence']:.2%}"
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['ts']))}  {event['camera'] or '-'}  "
+                      f"{event['category']}  "
+                      f"置信度 {confidence}  位置 ({event['x']}, {event['y']})  {event['status']}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""
+动态微批推理服务: 多个调用方各自提交单个输入, 工作线程把同一时间段内的请求合并成一个批次做一次前向推理
+
+- 第一个请求到达后最多等待 max_wait 秒, 或凑够 max_batch 个请求, 立即推理
+- 每个请求返回自己的结果和延迟: 排队等待时间、批次推理时间、批次大小
+- 进程内使用: MicroBatcher(batch_fn)(输入) ; 跨进程使用: serve_unix() + UnixBatchClient (Unix 套接字,
+  输入输出都是 NumPy 数组, 以 .npy 格式传输, 不使用 pickle)
+- batch_fn 的适配: yolo_batch_fn (ultralytics YOLO, 一次传入多幅画面) / torch_batch_fn (分类模型, 堆叠为一个张量)
+
+基准测试 (CPU, 多个线程并发请求, 不同 max_batch / max_wait 下的吞吐量和延迟):
+    python micro_batcher.py --benchmark                          # 随机权重的 MobileNetV3 分类模型
+    python micro_batcher.py --benchmark --yolo best.pt --imgsz 320
+    python micro_batcher.py --benchmark --clients 4 --batches 1 2 4 --waits 0 5 20
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_BATCH = 4
+MAX_WAIT = 0.01          # 第一个请求最多等待的秒数
+LATENCY_HISTORY = 1000   # 用于统计延迟分位数的最近请求数
+SOCKET_PATH = '/tmp/yolo_batcher.sock'
+
+# output: batch_fn 对该请求的输出; queue_seconds: 提交到开始推理的时间; infer_seconds: 批次推理时间
+BatchResult = namedtuple('BatchResult', ['output', 'batch_size', 'queue_seconds', 'infer_seconds'])
+
+
+class MicroBatcher:
+    """
+    Args:
+        batch_fn: 输入列表 -> 输出列表 (与输入一一对应), 在工作线程中调用
+        max_batch: 最大批次大小
+        max_wait: 第一个请求到达后等待更多请求的最长时间 (秒), 0 表示只合并已在排队的请求
+    """
+    def __init__(self, batch_fn, max_batch=MAX_BATCH, max_wait=MAX_WAIT, name='model'):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.batch_sizes = deque(maxlen=LATENCY_HISTORY)
+        self.completed = 0
+        self.batches = 0
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        """提交一个输入, 返回 Future, 结果为 BatchResult"""
+        future = Future()
+        if not self.is_running:
+            future.set_exception(RuntimeError(f"推理服务 {self.name} 已停止"))
+            return future
+        self.requests.put((item, future, time.perf_counter()))
+        return future
+
+    def pending(self):
+        """排队等待推理的请求数"""
+        return self.requests.qsize()
+
+    def __call__(self, item, timeout=None):
+        """提交并等待结果"""
+        return self.submit(item).result(timeout)
+
+    def collect(self):
+        """取出一个批次: 阻塞等待第一个请求, 再在截止时间前尽量凑满 max_batch"""
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.is_running = False
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            if batch is None:
+                break
+            self.run_batch(batch)
+            batch = None  # 等待下一批时不保留输入的引用 (如共享内存中的画面视图)
+            if not self.is_running:
+                break
+        # 停止后仍在排队的请求
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].set_exception(RuntimeError(f"推理服务 {self.name} 已停止"))
+
+    def run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            outputs = self.batch_fn([item for item, _, _ in batch])
+            if len(outputs) != len(batch):
+                raise ValueError(f"batch_fn 返回 {len(outputs)} 个结果, 期望 {len(batch)} 个")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        end = time.perf_counter()
+        with self.lock:
+            self.batches += 1
+            self.completed += len(batch)
+            self.batch_sizes.append(len(batch))
+            for _, _, submitted in batch:
+                self.latencies.append(end - submitted)
+        for (_, future, submitted), output in zip(batch, outputs):
+            future.set_result(BatchResult(output, len(batch), start - submitted, end - start))
+
+    def stats(self):
+        """最近 LATENCY_HISTORY 个请求的延迟分位数 (毫秒) 和平均批次大小"""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            sizes = np.array(self.batch_sizes)
+            completed, batches = self.completed, self.batches
+        summary = {'requests': completed, 'batches': batches, 'max_batch': self.max_batch,
+                   'max_wait_ms': self.max_wait * 1000}
+        if latencies.size:
+            summary.update({
+                'mean_batch_size': round(float(sizes.mean()), 2),
+                'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+                'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            })
+        return summary
+
+    def close(self, timeout=5.0):
+        self.requests.put(None)
+        self.thread.join(timeout)
+        self.is_running = False
+
+
+def yolo_batch_fn(model, settings=None, **kwargs):
+    """
+    ultralytics YOLO: 多幅画面 (可以尺寸不同) 一次传入, 返回每幅画面的 Results
+    Args:
+        settings: 每个批次调用一次, 返回额外的推理参数 (如自适应控制的 {'imgsz': 320})
+    """
+    def run(frames):
+        return model(list(frames), **kwargs, **(settings() if settings else {}))
+    return run
+
+
+def torch_batch_fn(model, device=None):
+    """分类模型: 每个输入为 [C, H, W] 张量或数组, 堆叠为一个批次推理, 返回每个输入的输出行"""
+    import torch
+
+    def run(items):
+        batch = torch.stack([torch.as_tensor(item) for item in items])
+        if device is not None:
+            batch = batch.to(device)
+        with torch.no_grad():
+            return list(model(batch).cpu().unbind(0))
+    return run
+
+
+def yolo_boxes_array(result):
+    """YOLO Results -> [N, 6] float32 (x1, y1, x2, y2, 置信度, 类别), 用于跨进程传输"""
+    boxes = result.boxes
+    return np.concatenate([boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy()[:, None],
+                           boxes.cls.cpu().numpy()[:, None]], axis=1).astype(np.float32)
+
+
+# Unix 套接字协议: 每条消息为 4 字节头部长度 + JSON 头部 + 4 字节数据长度 + .npy 数据
+def send_message(sock, header, array):
+    header_bytes = json.dumps(header).encode('utf-8')
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    payload = buffer.getvalue()
+    sock.sendall(struct.pack('<I', len(header_bytes)) + header_bytes + struct.pack('<I', len(payload)) + payload)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    header = json.loads(recv_exact(sock, struct.unpack('<I', recv_exact(sock, 4))[0]).decode('utf-8'))
+    payload = recv_exact(sock, struct.unpack('<I', recv_exact(sock, 4))[0])
+    return header, np.load(io.BytesIO(payload), allow_pickle=False)
+
+
+def serve_unix(batcher, path=SOCKET_PATH, encode=None):
+    """
+    在后台线程中通过 Unix 套接字提供推理服务; 每个连接的请求依次提交给 batcher, 多个连接的请求合并为批次
+    Args:
+        encode: 把 batch_fn 的输出转换为 NumPy 数组 (如 yolo_boxes_array), 默认直接转换
+    Returns:
+        server: 调用 server.shutdown() / server.server_close() 停止
+    """
+    encode = encode or np.asarray
+    if os.path.exists(path):
+        os.remove(path)
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    _, array = recv_message(self.request)
+                except (ConnectionError, struct.error):
+                    return
+                try:
+                    result = batcher(array)
+                    header = {'batch_size': result.batch_size, 'queue_seconds': result.queue_seconds,
+                              'infer_seconds': result.infer_seconds}
+                    send_message(self.request, header, encode(result.output))
+                except Exception as e:
+                    send_message(self.request, {'error': str(e)}, np.zeros(0, dtype=np.float32))
+
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    os.chmod(path, 0o600)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"推理服务已启动: {path} (max_batch={batcher.max_batch}, max_wait={batcher.max_wait * 1000:.0f} ms)")
+    return server
+
+
+class UnixBatchClient:
+    """serve_unix 的客户端, 一个连接同一时间只处理一个请求 (多个并发请求使用多个客户端)"""
+    def __init__(self, path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def __call__(self, array):
+        """Returns: BatchResult (output 为 NumPy 数组)"""
+        send_message(self.sock, {}, array)
+        header, output = recv_message(self.sock)
+        if 'error' in header:
+            raise RuntimeError(header['error'])
+        return BatchResult(output, header['batch_size'], header['queue_seconds'], header['infer_seconds'])
+
+    def close(self):
+        self.sock.close()
+
+
+def run_clients(call, make_input, clients, requests_per_client):
+    """clients 个线程并发, 每个线程依次发送 requests_per_client 个请求; 返回 (总秒数, 每个请求的延迟)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        local = []
+        for _ in range(requests_per_client):
+            item = make_input(index)
+            start = time.perf_counter()
+            call(item)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, np.array(latencies) * 1000
+
+
+def benchmark(args):
+    import torch
+    torch.set_num_threads(args.threads)
+    if args.yolo:
+        from ultralytics import YOLO
+        model = YOLO(args.yolo)
+        batch_fn = yolo_batch_fn(model, imgsz=args.imgsz, verbose=False)
+        frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+        def make_input(index):
+            return frame
+        name = f'YOLO {args.yolo} imgsz={args.imgsz}'
+    else:
+        from torchvision import models
+        model = models.mobilenet_v3_large(weights=None, num_classes=40).eval()
+        batch_fn = torch_batch_fn(model)
+        inputs = torch.randn(args.clients, 3, 224, 224)
+
+        def make_input(index):
+            return inputs[index]
+        name = 'MobileNetV3-Large 224x224 (随机权重)'
+
+    # 预热
+    for size in sorted(set(args.batches)):
+        batch_fn([make_input(0)] * size)
+
+    rows = []
+    baseline = None
+    for max_batch in args.batches:
+        for wait_ms in (args.waits if max_batch > 1 else [0]):
+            batcher = MicroBatcher(batch_fn, max_batch, wait_ms / 1000)
+            seconds, latencies = run_clients(batcher, make_input, args.clients, args.requests)
+            stats = batcher.stats()
+            batcher.close()
+            throughput = latencies.size / seconds
+            rows.append((max_batch, wait_ms, throughput, stats.get('mean_batch_size', 0),
+                         np.percentile(latencies, 50), np.percentile(latencies, 95)))
+            if max_batch == 1:
+                baseline = throughput
+
+    print(f"\n{name}, {args.clients} 个并发请求方, 每个 {args.requests} 个请求, torch 线程数 {args.threads}")
+    print(f"{'max_batch':>9} | {'max_wait':>8} | {'请求/秒':>8} | {'加速':>5} | {'平均批次':>8} | "
+          f"{'p50 延迟':>9} | {'p95 延迟':>9}")
+    print("-" * 82)
+    for max_batch, wait_ms, throughput, mean_batch, p50, p95 in rows:
+        speedup = throughput / baseline if baseline else float('nan')
+        print(f"{max_batch:>9} | {wait_ms:>6.0f}ms | {throughput:>8.1f} | {speedup:>5.2f} | {mean_batch:>8.2f} | "
+              f"{p50:>7.1f}ms | {p95:>7.1f}ms")
+
+    if args.socket:
+        # 跨进程路径的额外开销: 同样的负载通过 Unix 套接字发送
+        batcher = MicroBatcher(batch_fn, max(args.batches), max(args.waits) / 1000)
+        encode = yolo_boxes_array if args.yolo else (lambda output: output.numpy())
+        server = serve_unix(batcher, SOCKET_PATH, encode)
+        clients = [UnixBatchClient(SOCKET_PATH) for _ in range(args.clients)]
+        arrays = [np.asarray(make_input(i)) for i in range(args.clients)]
+        seconds, latencies = run_clients(lambda item: clients[item](arrays[item]), lambda index: index,
+                                         args.clients, args.requests)
+        print(f"Unix 套接字 (max_batch={batcher.max_batch}, max_wait={max(args.waits)}ms): "
+              f"{latencies.size / seconds:.1f} 请求/秒, p50 {np.percentile(latencies, 50):.1f}ms, "
+              f"p95 {np.percentile(latencies, 95):.1f}ms")
+        for client in clients:
+            client.close()
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Dynamic micro-batching inference service and CPU benchmark')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Measure throughput / latency for several max_batch and max_wait settings')
+    parser.add_argument('--serve', type=str, default=None,
+                        help='Serve a YOLO model (.pt) over a Unix socket until interrupted')
+    parser.add_argument('--socket-path', type=str, default=SOCKET_PATH,
+                        help=f'Unix socket path for --serve (default: {SOCKET_PATH})')
+    parser.add_argument('--yolo', type=str, default=None,
+                        help='YOLO model for the benchmark (default: random-weight MobileNetV3 classifier)')
+    parser.add_argument('--imgsz', type=int, default=320,
+                        help='YOLO inference size (default: 320)')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='Concurrent requesters in the benchmark (default: 8)')
+    parser.add_argument('--requests', type=int, default=16,
+                        help='Requests per requester (default: 16)')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='max_batch values to test (default: 1 2 4 8)')
+    parser.add_argument('--waits', type=float, nargs='+', default=[0, 5, 20],
+                        help='max_wait values in ms to test (default: 0 5 20)')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH,
+                        help=f'max_batch for --serve (default: {MAX_BATCH})')
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT * 1000,
+                        help=f'max_wait in ms for --serve (default: {MAX_WAIT * 1000:.0f})')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='torch intra-op threads (default: CPU count)')
+    parser.add_argument('--socket', action='store_true',
+                        help='Also benchmark the Unix socket path')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args)
+        return
+    if args.serve:
+        from ultralytics import YOLO
+        batcher = MicroBatcher(yolo_batch_fn(YOLO(args.serve), imgsz=args.imgsz, verbose=False),
+                               args.max_batch, args.max_wait / 1000, name=args.serve)
+        server = serve_unix(batcher, args.socket_path, yolo_boxes_array)
+        try:
+            while True:
+                time.sleep(10)
+                print(batcher.stats())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.close()
+            os.remove(args.socket_path)
+        return
+    print("请使用 --benchmark 或 --serve <model.pt>")
+
+
+if __name__ == '__main__':
+    main()
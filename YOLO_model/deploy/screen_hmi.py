@@ -0,0 +1,293 @@
+"""
+串口屏 (HMI) 驱动: 后台线程增量刷新, 检测线程只更新内存中的目标内容, 从不等待 9600 波特率的串口
+
+- 串口屏指令: <组件>.txt="<文本>" + SCREEN_END (0xFF 0xFF 0xFF)
+- 记录每个组件上一次发送的内容, 只发送有变化的组件; 同一组件在发送前多次更新只发送最新值
+- 每 FRAME_BUDGET 秒最多发送该时间内串口能传输的字节数, 多个指令合并为一次 write, 剩余的下一帧继续
+- 串口断开时定期重连, 重连后整屏重新发送
+- 表格: 第 1~TABLE_ROWS 行显示最近的检测记录, 每行 4 列 (序号 / 种类 / 数量 / 状态), 组件名 x<行>y<列>
+
+ScreenSimulator 用伪终端 (pty) 模拟串口屏 (按波特率限速读取, 解析指令), 用于测试和对比:
+    python screen_hmi.py --simulate --events 200
+"""
+import argparse
+import os
+import re
+import threading
+import time
+import tty
+
+import serial
+
+SCREEN_BAUD = 9600
+SCREEN_END = bytes.fromhex('ff ff ff')  # 串口屏结束符
+SCREEN_ENCODING = 'utf-8'
+FRAME_BUDGET = 0.1         # 每帧的发送时间预算 (秒)
+RECONNECT_INTERVAL = 5.0   # 串口重连间隔 (秒)
+TABLE_ROWS = 8             # 表格显示的记录数
+TABLE_COLUMNS = ('count', 'type', 'quantity', 'status')
+
+
+def screen_command(component, text, encoding=SCREEN_ENCODING):
+    text = str(text).replace('\\', '\\\\').replace('"', '\\"')
+    return f'{component}.txt="{text}"'.encode(encoding, errors='replace') + SCREEN_END
+
+
+def table_cells(items, rows=TABLE_ROWS):
+    """最近 rows 条记录对应的 {组件: 文本}, 没有记录的行清空"""
+    recent = list(items)[-rows:]
+    cells = {}
+    for row in range(1, rows + 1):
+        item = recent[row - 1] if row <= len(recent) else None
+        for col, key in enumerate(TABLE_COLUMNS, 1):
+            cells[f'x{row}y{col}'] = '' if item is None else str(item[key])
+    return cells
+
+
+class ScreenHMI:
+    """
+    异步增量刷新的串口屏
+    Args:
+        port: 串口设备 (如 /dev/ttyAMA3) 或伪终端路径
+        frame_budget: 每帧的发送时间预算 (秒), 每帧最多发送 baud / 10 * frame_budget 字节
+    """
+    def __init__(self, port, baud=SCREEN_BAUD, frame_budget=FRAME_BUDGET, encoding=SCREEN_ENCODING, rows=TABLE_ROWS):
+        self.port_name = port
+        self.baud = baud
+        self.frame_budget = frame_budget
+        self.frame_bytes = max(1, int(baud / 10 * frame_budget))  # 8N1: 每字节 10 位
+        self.encoding = encoding
+        self.rows = rows
+        self.port = None
+        self.desired = {}   # 组件 -> 目标文本
+        self.sent = {}      # 组件 -> 串口屏上当前显示的文本
+        self.condition = threading.Condition()
+        self.is_running = True
+        self.bytes_sent = 0
+        self.commands_sent = 0
+        self.last_open_attempt = 0.0
+        self.open_port()
+        # 启动时清空表格
+        self.update_table([])
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def open_port(self):
+        self.last_open_attempt = time.monotonic()
+        try:
+            self.port = serial.Serial(self.port_name, self.baud, timeout=0.1, write_timeout=1.0)
+            self.sent.clear()  # 串口屏可能已重启, 整屏重新发送
+            print(f"串口屏已初始化: {self.port_name}")
+        except Exception as e:
+            print(f"串口屏初始化失败: {str(e)}")
+            self.port = None
+
+    def set(self, component, text):
+        """更新组件的目标文本 (不阻塞)"""
+        text = str(text)
+        with self.condition:
+            if self.desired.get(component) == text:
+                return
+            self.desired[component] = text
+            self.condition.notify()
+
+    def update_table(self, items):
+        """用最近的检测记录 (含 count / type / quantity / status) 更新表格"""
+        cells = table_cells(items, self.rows)
+        with self.condition:
+            changed = False
+            for component, text in cells.items():
+                if self.desired.get(component) != text:
+                    self.desired[component] = text
+                    changed = True
+            if changed:
+                self.condition.notify()
+
+    def pending(self):
+        """有变化、尚未发送的组件"""
+        return [component for component, text in self.desired.items() if self.sent.get(component) != text]
+
+    def next_frame(self):
+        """取出一帧要发送的指令: 在字节预算内按顺序取有变化的组件, 至少取一条"""
+        with self.condition:
+            while self.is_running and not self.pending():
+                self.condition.wait(0.5)
+            payload, sent = [], {}
+            size = 0
+            for component in self.pending():
+                command = screen_command(component, self.desired[component], self.encoding)
+                if payload and size + len(command) > self.frame_bytes:
+                    break
+                payload.append(command)
+                sent[component] = self.desired[component]
+                size += len(command)
+            return b''.join(payload), sent
+
+    def run(self):
+        while self.is_running:
+            if self.port is None:
+                if time.monotonic() - self.last_open_attempt >= RECONNECT_INTERVAL:
+                    self.open_port()
+                if self.port is None:
+                    time.sleep(0.1)
+                    continue
+            start = time.monotonic()
+            data, sent = self.next_frame()
+            if not data:
+                continue
+            try:
+                self.port.write(data)
+                self.port.flush()
+            except Exception as e:
+                print(f"串口屏输出失败: {str(e)}")
+                try:
+                    self.port.close()
+                except Exception:
+                    pass
+                self.port = None
+                continue
+            with self.condition:
+                self.sent.update(sent)
+            self.bytes_sent += len(data)
+            self.commands_sent += len(sent)
+            # 按波特率计算这帧的传输时间, 未用完的时间等待, 保证串口屏来得及处理
+            remaining = max(self.frame_budget, len(data) * 10 / self.baud) - (time.monotonic() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def wait_idle(self, timeout=10.0):
+        """等待所有变化发送完成 (测试用)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.condition:
+                if not self.pending():
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def close(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+        self.thread.join(2.0)
+        if self.port and self.port.is_open:
+            self.port.close()
+
+
+class ScreenSimulator:
+    """
+    伪终端模拟的串口屏: 按波特率限速读取, 解析 <组件>.txt="<文本>" 指令并记录每个组件的当前内容
+    """
+    COMMAND = re.compile(rb'^(\w+)\.txt="(.*)"$', re.S)
+
+    def __init__(self, baud=SCREEN_BAUD, encoding=SCREEN_ENCODING):
+        self.baud = baud
+        self.encoding = encoding
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.components = {}
+        self.commands = 0
+        self.bytes_received = 0
+        self.errors = 0
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        buffer = b''
+        while self.is_running:
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                break
+            if not data:
+                break
+            time.sleep(len(data) * 10 / self.baud)  # 模拟串口传输时间
+            self.bytes_received += len(data)
+            buffer += data
+            while SCREEN_END in buffer:
+                command, buffer = buffer.split(SCREEN_END, 1)
+                match = self.COMMAND.match(command)
+                if not match:
+                    self.errors += 1
+                    continue
+                text = match.group(2).decode(self.encoding, errors='replace')
+                self.components[match.group(1).decode()] = text.replace('\\"', '"').replace('\\\\', '\\')
+                self.commands += 1
+
+    def close(self):
+        self.is_running = False
+        for fd in (self.slave, self.master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def simulate(events=200, interval=0.05, baud=SCREEN_BAUD, frame_budget=FRAME_BUDGET):
+    """
+    模拟检测循环每 interval 秒计数一件物品, 对比增量刷新和旧版整表重写 (每次清空 40 个单元格再写 32 个)
+    """
+    categories = ['厨余垃圾(厨余垃圾)', '可回收垃圾(可回收利用垃圾)', '有害垃圾(有害垃圾)', '其他垃圾(其他垃圾)']
+    simulator = ScreenSimulator(baud)
+    screen = ScreenHMI(simulator.path, baud, frame_budget)
+    items = []
+    full_rewrite_bytes = 0
+    set_times = []
+    start = time.perf_counter()
+    for count in range(1, events + 1):
+        items.append({'count': count, 'type': categories[count % 4], 'quantity': 1, 'status': "正确"})
+        t = time.perf_counter()
+        screen.update_table(items)
+        set_times.append(time.perf_counter() - t)
+        # 旧版 update_screen_table: 清空 10x4 个单元格后逐个写入最近 8 条记录
+        full_rewrite_bytes += sum(len(screen_command(f'x{i}y{j}', '')) for i in range(10) for j in range(4))
+        full_rewrite_bytes += sum(len(screen_command(c, t)) for c, t in table_cells(items).items() if t)
+        time.sleep(interval)
+    loop_seconds = time.perf_counter() - start
+    screen.wait_idle()
+    time.sleep(0.3)
+    expected = table_cells(items)
+    mismatched = [c for c, t in expected.items() if simulator.components.get(c, '') != t]
+
+    print(f"\n{events} 次计数, 每 {interval * 1000:.0f} ms 一次, 串口 {baud} 波特率, 帧预算 {frame_budget * 1000:.0f} ms")
+    print(f"检测线程 update_table 耗时: 平均 {sum(set_times) / len(set_times) * 1e6:.1f} us, "
+          f"最大 {max(set_times) * 1e6:.1f} us (检测循环总用时 {loop_seconds:.2f} 秒)")
+    print(f"增量刷新: 发送 {screen.bytes_sent} 字节 / {screen.commands_sent} 条指令, "
+          f"串口占用 {screen.bytes_sent * 10 / baud:.1f} 秒")
+    print(f"整表重写: {full_rewrite_bytes} 字节, 串口占用 {full_rewrite_bytes * 10 / baud:.1f} 秒 "
+          f"(同步写入时检测线程被阻塞同样长的时间)")
+    print(f"模拟串口屏: 收到 {simulator.commands} 条指令, 解析错误 {simulator.errors}, "
+          f"最终内容与期望不一致的组件: {len(mismatched)}")
+    screen.close()
+    simulator.close()
+    return not mismatched and not simulator.errors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serial HMI screen driver; run against a pty-based screen simulator')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Drive a simulated screen on a pseudo-terminal and compare with full-table rewrites')
+    parser.add_argument('--events', type=int, default=200,
+                        help='Number of counted items to simulate (default: 200)')
+    parser.add_argument('--interval', type=float, default=0.05,
+                        help='Seconds between counted items (default: 0.05)')
+    parser.add_argument('--baud', type=int, default=SCREEN_BAUD,
+                        help=f'Serial baud rate (default: {SCREEN_BAUD})')
+    parser.add_argument('--frame-budget', type=float, default=FRAME_BUDGET,
+                        help=f'Seconds of serial time per frame (default: {FRAME_BUDGET})')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not args.simulate:
+        print("请使用 --simulate 运行模拟测试; 部署时由 yolo4class_raspi_mod.py 中的 ENABLE_SCREEN 启用")
+        return
+    ok = simulate(args.events, args.interval, args.baud, args.frame_budget)
+    print("通过" if ok else "失败")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,525 @@
+"""
+共享内存画面传输: 采集 (解码) 在独立进程中进行, 画面写入 multiprocessing.shared_memory 环形缓冲区,
+检测进程直接读取共享内存中的画面 (不复制), 不再与采集解码争用同一个 GIL
+
+- 环形缓冲区: 头部 + 每个槽的序号 / 时间戳 + slots 个画面; 写入时先把槽序号置为 -1, 写完再写入序号
+- 读取方取最新的序号, 使用完画面后用 overwritten() 检查该槽是否已被覆盖 (推理时间超过 slots 帧时会发生),
+  被覆盖的画面结果应丢弃
+- SharedMemoryCapture 的接口与 cv2.VideoCapture 相同 (isOpened / read / release), 可直接替换
+- 生命周期: 主进程创建并最终删除共享内存; 采集进程 (python shm_frames.py --capture, 不导入模型相关的库)
+  由主进程的 release() (stop_process: SIGTERM, 超时后 SIGKILL) 结束, 主进程意外退出时采集进程检测到
+  父进程变化后自行退出; systemd 停止服务时 (KillMode=mixed) 只有主进程收到 SIGTERM, 采集进程经上述
+  release() 结束, 超过 TimeoutStopSec 仍未退出的进程才会被 SIGKILL;
+  主进程被强制结束时由 multiprocessing 的 resource_tracker 删除共享内存
+
+基准测试 (1280x720, 单进程多线程 vs 采集进程 + 共享内存, 可选多个推理进程):
+    python shm_frames.py --benchmark
+    python shm_frames.py --benchmark --source test.mp4 --workers 2 --seconds 20
+"""
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+SHM_SLOTS = 16          # 环形缓冲区的画面数
+HEADER_FIELDS = 8       # 头部: 写入序号, 高, 宽, 通道数, 槽数, 状态, 采集帧率上限, 保留
+STATUS_STARTING, STATUS_RUNNING, STATUS_STOPPED = 0, 1, 2
+START_TIMEOUT = 10.0    # 等待采集进程打开摄像头的最长时间 (秒)
+POLL_INTERVAL = 0.001   # 等待新画面时的轮询间隔 (秒)
+
+
+def ring_size(height, width, channels, slots):
+    return 64 + 16 * slots + height * width * channels * slots
+
+
+class FrameRing:
+    """
+    共享内存环形缓冲区
+    Args:
+        name: 共享内存名称 (/dev/shm/<name>)
+        create: 创建 (主进程) 或打开已有的共享内存 (采集 / 推理进程)
+        untrack: 打开方不是 multiprocessing 启动的子进程时设为 True, 否则该进程退出时 resource_tracker 会删除共享内存
+    """
+    def __init__(self, name, height=None, width=None, channels=3, slots=SHM_SLOTS, create=False, untrack=False):
+        self.create = create
+        if create:
+            try:
+                # 上次异常退出遗留的同名共享内存
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = shared_memory.SharedMemory(name, create=True, size=ring_size(height, width, channels, slots))
+            self.header = np.ndarray((HEADER_FIELDS,), np.int64, self.shm.buf)
+            self.header[:] = [0, height, width, channels, slots, STATUS_STARTING, 0, 0]
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            if untrack:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            self.header = np.ndarray((HEADER_FIELDS,), np.int64, self.shm.buf)
+            height, width, channels, slots = (int(v) for v in self.header[1:5])
+        self.name = name
+        self.height, self.width, self.channels, self.slots = height, width, channels, slots
+        self.slot_seqs = np.ndarray((slots,), np.int64, self.shm.buf, 64)
+        self.slot_times = np.ndarray((slots,), np.float64, self.shm.buf, 64 + 8 * slots)
+        self.frames = np.ndarray((slots, height, width, channels), np.uint8, self.shm.buf, 64 + 16 * slots)
+        if create:
+            self.slot_seqs[:] = 0
+
+    @property
+    def seq(self):
+        """最新画面的序号 (0 表示还没有画面)"""
+        return int(self.header[0])
+
+    @property
+    def status(self):
+        return int(self.header[5])
+
+    @status.setter
+    def status(self, value):
+        self.header[5] = value
+
+    @property
+    def fps_limit(self):
+        """主进程设置的采集帧率上限 (0 表示不限制), 采集进程每帧读取"""
+        return int(self.header[6])
+
+    @fps_limit.setter
+    def fps_limit(self, value):
+        self.header[6] = int(value)
+
+    # 写入方 (采集进程)
+    def begin_write(self):
+        """返回 (序号, 可直接写入的画面缓冲区)"""
+        seq = self.seq + 1
+        slot = seq % self.slots
+        self.slot_seqs[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq, timestamp):
+        slot = seq % self.slots
+        self.slot_times[slot] = timestamp
+        self.slot_seqs[slot] = seq
+        self.header[0] = seq
+
+    # 读取方
+    def latest(self):
+        """
+        Returns:
+            (序号, 采集时间, 画面视图), 还没有画面时返回 None
+        """
+        while True:
+            seq = self.seq
+            if seq == 0:
+                return None
+            slot = seq % self.slots
+            timestamp = float(self.slot_times[slot])
+            if int(self.slot_seqs[slot]) == seq:
+                return seq, timestamp, self.frames[slot]
+
+    def wait(self, last_seq, timeout=1.0):
+        """等待比 last_seq 新的画面; 超时或采集进程已停止时返回 None"""
+        deadline = time.monotonic() + timeout
+        while self.seq <= last_seq:
+            if self.status == STATUS_STOPPED or time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+        return self.latest()
+
+    def overwritten(self, seq):
+        """序号为 seq 的画面是否已被新画面覆盖 (或正在被覆盖)"""
+        return int(self.slot_seqs[seq % self.slots]) != seq
+
+    def close(self):
+        # 释放对共享内存的引用后才能关闭; 其他地方仍持有画面视图时 close() 会抛出 BufferError,
+        # 此时保留映射 (进程退出时释放), 但创建方仍然删除共享内存
+        self.header = self.slot_seqs = self.slot_times = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            print(f"警告: 共享内存 {self.name} 仍有画面视图在使用, 映射将在进程退出时释放")
+        finally:
+            if self.create:
+                try:
+                    self.shm.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def open_source(source):
+    """打开视频源: 设备索引 / 路径 / URL, None 时自动查找摄像头"""
+    if source is not None:
+        cap = cv2.VideoCapture(source)
+        return cap if cap.isOpened() else None
+    for index in range(10):
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return None
+
+
+def capture_process(ring_name, source, parent_pid, fps=0, loop=False, synthetic=False):
+    """
+    采集进程: 读取画面直接解码到共享内存中; 主进程退出、收到 SIGTERM 或视频源结束时退出
+    Args:
+        fps: 限制写入帧率 (用于视频文件), 0 表示不限制
+        loop: 视频文件结束后从头播放 (基准测试)
+        synthetic: 解码合成的 JPEG 代替摄像头 (基准测试)
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程处理, 主进程再通知采集进程退出
+    ring = FrameRing(ring_name, untrack=True)
+    cap = JpegSource(ring.width, ring.height) if synthetic else open_source(source)
+    if cap is None:
+        print(f"错误: 采集进程无法打开视频源: {source}")
+        ring.status = STATUS_STOPPED
+        ring.close()
+        return
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, ring.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, ring.height)
+    ring.status = STATUS_RUNNING
+    interval = 1.0 / fps if fps else 0.0
+    next_time = next_limited = time.monotonic()
+    try:
+        while not stop.is_set() and os.getppid() == parent_pid:
+            limit = ring.fps_limit
+            if limit:
+                # 帧率上限: grab() 取出但不解码多余的画面, 既节省解码又不让摄像头缓冲区中的画面变旧
+                if not cap.grab():
+                    if loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                if time.monotonic() < next_limited:
+                    continue
+                next_limited = time.monotonic() + 1.0 / limit
+                seq, buffer = ring.begin_write()
+                ret, frame = cap.retrieve(buffer)
+            else:
+                seq, buffer = ring.begin_write()
+                ret, frame = cap.read(buffer)
+            if not ret and loop:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            if not ret:
+                break
+            if frame is not buffer and frame.ctypes.data != buffer.ctypes.data:
+                # 画面尺寸与缓冲区不同时缩放 (坐标换算使用 CAMERA_WIDTH / CAMERA_HEIGHT)
+                cv2.resize(frame, (ring.width, ring.height), dst=buffer)
+            ring.commit(seq, time.time())
+            if interval:
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.monotonic()))
+    finally:
+        ring.status = STATUS_STOPPED
+        cap.release()
+        buffer = frame = None  # 释放画面视图后才能关闭共享内存
+        ring.close()
+
+
+def start_capture_process(ring_name, source=None, fps=0, loop=False, synthetic=False):
+    """
+    启动采集进程 (python shm_frames.py --capture); 使用独立的解释器而不是 multiprocessing,
+    避免子进程重新导入主脚本及其 torch / ultralytics
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--capture', ring_name, '--parent', str(os.getpid()),
+               '--fps', str(fps)]
+    if source is not None:
+        command += ['--source', str(source)]
+    if loop:
+        command.append('--loop')
+    if synthetic:
+        command.append('--synthetic')
+    return subprocess.Popen(command)
+
+
+def stop_process(process, timeout=3.0):
+    """SIGTERM 后等待退出, 超时则强制结束"""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class SharedMemoryCapture:
+    """
+    在独立进程中采集的摄像头, 接口与 cv2.VideoCapture 相同; read() 返回共享内存中画面的视图 (不复制)
+    Args:
+        name: 摄像头名称, 共享内存名称为 yolo_frames_<name> (上次异常退出遗留的同名共享内存会被替换)
+    """
+    def __init__(self, source, width, height, name='camera', slots=SHM_SLOTS, fps=0):
+        self.ring = FrameRing(f'yolo_frames_{name}', height, width, 3, slots, create=True)
+        self.process = start_capture_process(self.ring.name, source, fps)
+        self.last_seq = 0     # 上一次 read() 返回的画面的序号
+        self.last_time = 0.0  # 上一次 read() 返回的画面的采集时间 (采集进程写入)
+        deadline = time.monotonic() + START_TIMEOUT
+        while self.ring.status == STATUS_STARTING and self.process.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def isOpened(self):
+        return self.ring is not None and self.ring.status == STATUS_RUNNING
+
+    def set_fps_limit(self, fps):
+        """限制采集进程的解码帧率 (0 表示不限制), 下一帧生效"""
+        if self.ring is not None:
+            self.ring.fps_limit = fps
+
+    def read(self):
+        """
+        等待下一幅画面; 采集进程停止时返回 (False, None)
+        画面的序号和采集时间保存在 last_seq / last_time 中, 应在下一次 read() 之前取出
+        """
+        while self.ring.status != STATUS_STOPPED:
+            latest = self.ring.wait(self.last_seq)
+            if latest is None:
+                if self.process.poll() is not None:
+                    break
+                continue
+            self.last_seq, self.last_time, frame = latest
+            return True, frame
+        return False, None
+
+    def overwritten(self, seq):
+        """序号为 seq 的画面是否已被采集进程覆盖; 推理完成后检查, 被覆盖时结果作废"""
+        return self.ring is None or self.ring.overwritten(seq)
+
+    def release(self):
+        if self.ring is None:
+            return
+        stop_process(self.process)  # 采集进程收到 SIGTERM 后释放摄像头
+        self.ring.close()
+        self.ring = None
+
+
+# 基准测试
+def make_test_jpeg(width, height):
+    """模拟 USB 摄像头的 MJPEG 画面: 渐变背景 + 随机矩形"""
+    rng = np.random.default_rng(0)
+    frame = np.zeros((height, width, 3), np.uint8)
+    frame[:] = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    for _ in range(40):
+        x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 100))
+        cv2.rectangle(frame, (x, y), (x + int(rng.integers(20, 200)), y + int(rng.integers(20, 200))),
+                      tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    frame = cv2.add(frame, rng.integers(0, 20, frame.shape, dtype=np.uint8))
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1]
+
+
+class JpegSource:
+    """每次 read() 解码一幅 JPEG, 代替摄像头 (解码开销与 MJPEG 摄像头相同)"""
+    def __init__(self, width, height):
+        self.jpeg = make_test_jpeg(width, height)
+
+    def isOpened(self):
+        return True
+
+    def set(self, *args):
+        return True
+
+    def read(self, image=None):
+        frame = cv2.imdecode(self.jpeg, cv2.IMREAD_COLOR)
+        if image is not None:
+            image[:] = frame
+            return True, image
+        return True, frame
+
+    def grab(self):
+        return True
+
+    def retrieve(self, image=None):
+        return self.read(image)
+
+    def release(self):
+        pass
+
+
+def make_workload(imgsz):
+    """模拟检测: 缩放 + 小型卷积网络推理 + 在画面上绘制结果"""
+    import torch
+    torch.set_num_threads(1)
+    model = torch.nn.Sequential(
+        torch.nn.Conv2d(3, 16, 3, 2, 1), torch.nn.ReLU(),
+        torch.nn.Conv2d(16, 32, 3, 2, 1), torch.nn.ReLU(),
+        torch.nn.Conv2d(32, 64, 3, 2, 1), torch.nn.ReLU(),
+        torch.nn.Conv2d(64, 64, 3, 2, 1), torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(), torch.nn.Linear(64, 4)).eval()
+
+    def run(frame):
+        image = cv2.resize(frame, (imgsz, imgsz))
+        with torch.no_grad():
+            output = model(torch.from_numpy(image).permute(2, 0, 1)[None].float() / 255)
+        cv2.rectangle(frame, (100, 100), (400, 300), (0, 255, 0), 2)
+        cv2.putText(frame, f'{float(output[0, 0]):.2f}', (100, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
+        return output
+    return run
+
+
+def benchmark_source(source, width, height):
+    return JpegSource(width, height) if source is None else cv2.VideoCapture(source)
+
+
+def run_threaded(args):
+    """单进程: 采集线程只保留最新一帧, 主线程推理"""
+    cap = benchmark_source(args.source, args.width, args.height)
+    work = make_workload(args.imgsz)
+    lock = threading.Lock()
+    state = {'frame': None, 'time': 0.0, 'seq': 0, 'captured': 0}
+    stop = threading.Event()
+
+    def capture():
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            with lock:
+                state.update(frame=frame, time=time.time(), seq=state['seq'] + 1)
+                state['captured'] += 1
+
+    thread = threading.Thread(target=capture, daemon=True)
+    thread.start()
+    latencies, last_seq = [], 0
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        with lock:
+            frame, captured_at, seq = state['frame'], state['time'], state['seq']
+        if seq == last_seq:
+            time.sleep(POLL_INTERVAL)
+            continue
+        last_seq = seq
+        work(frame)
+        latencies.append(time.time() - captured_at)
+    stop.set()
+    thread.join()
+    cap.release()
+    return state['captured'], latencies, 0
+
+
+def inference_worker(ring_name, worker, workers, seconds, imgsz, results):
+    """推理进程: 只处理序号 % workers == worker 的画面"""
+    ring = FrameRing(ring_name)
+    work = make_workload(imgsz)
+    latencies, torn, last_seq = [], 0, 0
+    start_seq = ring.seq
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        latest = ring.wait(last_seq, timeout=0.1)
+        if latest is None:
+            continue
+        seq, captured_at, frame = latest
+        last_seq = seq
+        if workers > 1 and seq % workers != worker:
+            continue
+        work(frame)
+        if ring.overwritten(seq):
+            torn += 1
+            continue
+        latencies.append(time.time() - captured_at)
+    captured = ring.seq - start_seq
+    latest = frame = None  # 释放画面视图后才能关闭共享内存
+    ring.close()
+    results.put((latencies, torn, captured))
+
+
+def run_shared_memory(args):
+    """采集进程写入共享内存, 一个或多个推理进程读取"""
+    context = mp.get_context('spawn')
+    ring = FrameRing('yolo_frames_benchmark', args.height, args.width, 3, args.slots, create=True)
+    capture = start_capture_process(ring.name, args.source, loop=True, synthetic=args.source is None)
+    while ring.status == STATUS_STARTING and capture.poll() is None:
+        time.sleep(0.01)
+    results = context.Queue()
+    workers = [context.Process(target=inference_worker,
+                               args=(ring.name, i, args.workers, args.seconds, args.imgsz, results), daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    latencies, torn, captured = [], 0, 0
+    for _ in workers:
+        worker_latencies, worker_torn, worker_captured = results.get()
+        latencies.extend(worker_latencies)
+        torn += worker_torn
+        captured = max(captured, worker_captured)
+    for worker in workers:
+        worker.join()
+    stop_process(capture)
+    ring.close()
+    return captured, latencies, torn
+
+
+def benchmark(args):
+    print(f"画面 {args.width}x{args.height}, 推理输入 {args.imgsz}, 每种模式 {args.seconds} 秒, "
+          f"CPU 核数 {os.cpu_count()}, 视频源 {args.source or '合成 JPEG 解码'}")
+    modes = [('单进程 (采集线程 + 推理线程)', run_threaded),
+             (f'共享内存 (采集进程 + {args.workers} 个推理进程)', run_shared_memory)]
+    print(f"\n{'模式':<32} | {'采集 帧/秒':>10} | {'推理 帧/秒':>10} | {'延迟 p50':>9} | {'延迟 p95':>9} | {'被覆盖':>6}")
+    print("-" * 92)
+    for name, run in modes:
+        captured, latencies, torn = run(args)
+        latencies = np.array(latencies) * 1000
+        p50, p95 = (np.percentile(latencies, 50), np.percentile(latencies, 95)) if latencies.size else (0, 0)
+        print(f"{name:<32} | {captured / args.seconds:>10.1f} | {latencies.size / args.seconds:>10.1f} | "
+              f"{p50:>7.1f}ms | {p95:>7.1f}ms | {torn:>6}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Shared-memory frame ring between capture and inference processes')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare threaded single-process capture with a capture process + shared memory')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Video file or camera for the benchmark (default: decode a synthetic JPEG)')
+    parser.add_argument('--width', type=int, default=1280,
+                        help='Frame width (default: 1280)')
+    parser.add_argument('--height', type=int, default=720,
+                        help='Frame height (default: 720)')
+    parser.add_argument('--imgsz', type=int, default=320,
+                        help='Inference input size of the simulated detector (default: 320)')
+    parser.add_argument('--seconds', type=float, default=10,
+                        help='Duration of each mode (default: 10)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Inference processes in shared-memory mode (default: 1)')
+    parser.add_argument('--slots', type=int, default=SHM_SLOTS,
+                        help=f'Frames in the ring buffer (default: {SHM_SLOTS})')
+    # 采集进程 (由 SharedMemoryCapture 启动)
+    parser.add_argument('--capture', type=str, default=None, metavar='RING',
+                        help='Run as the capture process writing into the named shared-memory ring')
+    parser.add_argument('--parent', type=int, default=None,
+                        help='Exit when this process is gone (default: parent process)')
+    parser.add_argument('--fps', type=float, default=0,
+                        help='Limit the capture rate, 0 for unlimited (default: 0)')
+    parser.add_argument('--loop', action='store_true',
+                        help='Restart video files at the end')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Decode a synthetic JPEG instead of opening a camera')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.source is not None and args.source.isdigit():
+        args.source = int(args.source)
+    if args.capture:
+        capture_process(args.capture, args.source, args.parent or os.getppid(), args.fps, args.loop, args.synthetic)
+        return
+    if not args.benchmark:
+        print("请使用 --benchmark 运行基准测试; 部署时由 yolo4class_raspi_mod.py 中的 CAPTURE_PROCESS 启用")
+        return
+    benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
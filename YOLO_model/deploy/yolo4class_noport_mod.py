@@ -6,9 +6,15 @@ import time
 import subprocess
 import sys
 
+from active_learning import UNCERTAIN_CONF_LOW, UncertainFrameQueue
+
 # Global control variables
 DEBUG_WINDOW = False
 CONF_THRESHOLD = 0.9  # Confidence threshold
+# Active learning: keep near-threshold / class-confused frames in uncertain_frames/ for relabeling
+ACTIVE_LEARNING = False
+UNCERTAIN_QUEUE_DIR = 'uncertain_frames'
+UNCERTAIN_MAX_FRAMES = 2000  # Maximum frames kept on disk
 CAMERA_WIDTH = 1280   # Camera width
 CAMERA_HEIGHT = 720   # Camera height
 
@@ -76,12 +82,19 @@ class YOLODetector:
             2: (240, 39, 32),     # Hazardous - Red
             3: (0, 158, 115)      # Other - Green
         }
+        # Active learning: uncertain frame queue
+        self.uncertain_queue = UncertainFrameQueue(UNCERTAIN_QUEUE_DIR, UNCERTAIN_MAX_FRAMES) if ACTIVE_LEARNING else None
 
     def detect(self, frame):
-        results = self.model(frame, conf=CONF_THRESHOLD)
+        results = self.model(frame, conf=UNCERTAIN_CONF_LOW if self.uncertain_queue else CONF_THRESHOLD)
         if len(results) > 0:
             result = results[0]
             boxes = result.boxes
+            if self.uncertain_queue is not None and len(boxes) > 0:
+                # Low-confidence boxes only feed the uncertain frame queue; sorting still uses boxes >= CONF_THRESHOLD
+                self.uncertain_queue.observe(frame, boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(),
+                                             boxes.cls.cpu().numpy(), CONF_THRESHOLD)
+                boxes = boxes[boxes.conf >= CONF_THRESHOLD]
             
             if len(boxes) > 0:
                 confidences = [box.conf[0].item() for box in boxes]
@@ -453,6 +466,8 @@ def main():
     except KeyboardInterrupt:
         print("\nKeyboard interrupt detected, exiting")
     finally:
+        if getattr(detector, 'uncertain_queue', None):
+            detector.uncertain_queue.close()
         cap.release()
         if DEBUG_WINDOW:
             cv2.destroyAllWindows()
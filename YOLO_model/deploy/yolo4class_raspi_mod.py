@@ -7,11 +7,27 @@ import threading
 import time
 import subprocess
 import sys
+import os
+import json
+import signal
+from collections import deque
+
+from active_learning import UNCERTAIN_CONF_LOW, UncertainFrameQueue
+from adaptive_control import AdaptiveController
+from detection_stats import STATS_HOST, DetectionStats
+from event_store import EventStore
+from micro_batcher import MicroBatcher, yolo_batch_fn
+from screen_hmi import ScreenHMI
+from shm_frames import SHM_SLOTS, SharedMemoryCapture
 
 # 全局控制变量
 DEBUG_WINDOW = False
 ENABLE_SERIAL = True
 CONF_THRESHOLD = 0.9  # 置信度阈值
+# 主动学习: 保存置信度接近阈值或类别混淆的画面到 uncertain_frames/, 用 active_learning.py 挑选后标注
+ACTIVE_LEARNING = False
+UNCERTAIN_QUEUE_DIR = 'uncertain_frames'
+UNCERTAIN_MAX_FRAMES = 2000  # 最多保留的画面数
 # 串口配置
 # 可用串口对应关系(raspberrypi)：
 # 串口名称  | TX引脚  | RX引脚
@@ -22,9 +38,33 @@ CONF_THRESHOLD = 0.9  # 置信度阈值
 # ttyAMA5  | GPIO12 | GPIO13
 STM32_PORT = '/dev/ttyAMA2'  # 选择使用的串口
 STM32_BAUD = 115200
+# 串口屏: 后台线程只发送有变化的组件, 不阻塞检测
+ENABLE_SCREEN = False
+SCREEN_PORT = '/dev/ttyAMA3'  # 串口屏使用的串口 (不能与 STM32_PORT 相同)
+SCREEN_BAUD = 9600
 CAMERA_WIDTH = 1280   # 摄像头宽度
 CAMERA_HEIGHT = 720   # 摄像头高度
 MAX_SERIAL_VALUE = 255  # 串口发送的最大值
+# 检测事件持久化 (SQLite), 用 event_store.py 查询每小时各类别数量
+ENABLE_EVENT_STORE = True
+EVENT_DB_PATH = 'detection_events.db'
+RECENT_ITEMS = 100  # 内存中保留的最近检测记录数
+# 分拣统计接口 (http://127.0.0.1:8090/stats), 用 detection_stats.py 查看
+ENABLE_STATS_SERVER = True
+STATS_PORT = 8090
+# 多摄像头: 所有摄像头共用一个模型, 各摄像头的最新画面组成一个批次推理
+# 每个摄像头: name 名称, source 摄像头编号 / 视频地址 (None 自动查找), roi [x1, y1, x2, y2] 检测区域 (None 为整幅画面),
+# stm32_port / stm32_baud 该摄像头对应的 STM32 串口; 存在 CAMERA_CONFIG_FILE 时从该 JSON 文件读取同样格式的列表
+CAMERA_CONFIG_FILE = 'cameras.json'
+CAMERAS = [
+    {'name': 'chute1', 'source': None, 'roi': None, 'stm32_port': STM32_PORT, 'stm32_baud': STM32_BAUD},
+]
+BATCH_WAIT = 0.01  # 第一个摄像头的画面提交推理后, 等待其他摄像头画面加入同一批次的最长时间 (秒)
+# 每个摄像头的采集 (解码) 在独立进程中进行, 画面通过共享内存传递给检测进程, 不与推理争用 GIL
+CAPTURE_PROCESS = False
+# 自适应控制: 根据端到端延迟 (采集到串口发送)、CPU 温度和推理队列调整推理尺寸 / 跳帧 / 采集帧率
+ADAPTIVE_CONTROL = False
+TARGET_LATENCY = 0.25  # 目标端到端延迟 (秒)
 
 
 def setup_gpu():
@@ -34,16 +74,64 @@ def setup_gpu():
     device_name = torch.cuda.get_device_name(0)
     return True, f"已启用GPU: {device_name}"
 
-class SerialManager:
+class SharedServices:
+    """所有摄像头共用: 事件存储、分拣统计、串口屏和最近的检测记录"""
     def __init__(self):
+        self.lock = threading.Lock()
+        self.garbage_count = 0  # 所有摄像头的垃圾总数
+        self.detected_items = deque(maxlen=RECENT_ITEMS)  # 最近检测到的垃圾记录 (完整记录在事件存储中)
+        self.event_store = EventStore(EVENT_DB_PATH) if ENABLE_EVENT_STORE else None
+        self.screen = ScreenHMI(SCREEN_PORT, SCREEN_BAUD) if ENABLE_SCREEN else None
+        # 分拣统计 (1分钟 / 1小时 / 24小时滚动窗口), 从事件存储回放最近 24 小时的记录
+        self.stats = DetectionStats(WasteClassifier().class_names)
+        if self.event_store:
+            longest = max(window.seconds for window in self.stats.windows.values())
+            replayed = self.stats.replay(self.event_store.query(
+                'SELECT ts, class_id, confidence FROM events WHERE ts >= ? ORDER BY id', (time.time() - longest,)))
+            print(f"已从事件存储回放 {replayed} 条记录")
+        if ENABLE_STATS_SERVER:
+            try:
+                self.stats.serve(STATS_HOST, STATS_PORT)
+            except OSError as e:
+                print(f"统计接口启动失败: {str(e)}")
+
+    def record_item(self, camera, garbage_type, class_id=None, confidence=None, center=None):
+        """记录一个已计数的垃圾"""
+        with self.lock:
+            self.garbage_count += 1
+            self.detected_items.append({
+                'count': self.garbage_count,
+                'type': garbage_type,
+                'quantity': 1,
+                'status': "正确"
+            })
+            if self.screen:
+                self.screen.update_table(self.detected_items)
+        if self.event_store:
+            self.event_store.record(garbage_type, class_id, confidence, center, camera=camera)
+        self.stats.record_item(class_id, confidence)
+
+    def close(self):
+        if self.event_store:
+            self.event_store.close()
+        self.stats.close()
+        if self.screen:
+            self.screen.close()
+
+class SerialManager:
+    def __init__(self, port=STM32_PORT, baud=STM32_BAUD, camera='', services=None):
+        self.port_name = port
+        self.baud = baud
+        self.camera = camera  # 摄像头名称
+        self.services = services  # 共用的事件存储 / 统计 / 串口屏
         self.stm32_port = None
         self.is_running = True
         self.last_stm32_send_time = 0
         self.MIN_SEND_INTERVAL = 0.1  # 最小发送间隔（秒）
         
         # 垃圾计数和记录相关
-        self.garbage_count = 0  # 垃圾计数器
-        self.detected_items = []  # 存储检测到的垃圾记录
+        self.garbage_count = 0  # 该摄像头的垃圾计数器
+        self.detected_items = deque(maxlen=RECENT_ITEMS)  # 该摄像头最近检测到的垃圾记录
         
         # 防重复计数和稳定性检测相关
         self.last_count_time = 0  # 上次计数的时间
@@ -65,12 +153,12 @@ class SerialManager:
         if ENABLE_SERIAL:
             try:
                 self.stm32_port = serial.Serial(
-                    STM32_PORT, 
-                    STM32_BAUD, 
+                    self.port_name, 
+                    self.baud, 
                     timeout=0.1,
                     write_timeout=0.1
                 )
-                print(f"STM32串口已初始化: {STM32_PORT}")
+                print(f"STM32串口已初始化: {self.port_name} (摄像头 {self.camera})")
             except Exception as e:
                 print(f"STM32串口初始化失败: {str(e)}")
                 self.stm32_port = None
@@ -175,7 +263,7 @@ class SerialManager:
         
         return True
 
-    def update_garbage_count(self, garbage_type):
+    def update_garbage_count(self, garbage_type, class_id=None, confidence=None, center=None):
         """更新垃圾计数"""
         if not self.can_count_new_garbage(garbage_type):
             return
@@ -187,6 +275,8 @@ class SerialManager:
             'quantity': 1,
             'status': "正确"
         })
+        if self.services:
+            self.services.record_item(self.camera, garbage_type, class_id, confidence, center)
         
         # 更新计数相关的状态
         self.last_count_time = time.time()
@@ -217,7 +307,9 @@ class SerialManager:
             self.stm32_port.write(data)
             self.stm32_port.flush()
             self.last_stm32_send_time = current_time
-            print("\n----- 串口发送数据详情 -----")
+            if self.services:
+                self.services.stats.record_send(current_time)
+            print(f"\n----- 串口发送数据详情 ({self.camera}: {self.port_name}) -----")
             print(f"发送的原始数据: {' '.join([f'0x{b:02X}' for b in data])}")
             print(f"数据包总长度: {len(data)} 字节")
             print("\n--- 分类信息 ---")
@@ -303,52 +395,211 @@ class YOLODetector:
             2: (240, 39, 32),     # 有害垃圾 - 红色
             3: (0, 158, 115)      # 其他垃圾 - 绿色
         }
-        self.serial_manager = SerialManager()
+        # 主动学习: 不确定画面队列
+        self.uncertain_queue = UncertainFrameQueue(UNCERTAIN_QUEUE_DIR, UNCERTAIN_MAX_FRAMES) if ACTIVE_LEARNING else None
+        self.batcher = None
+
+    def start_batcher(self, max_batch, controller=None):
+        """
+        启动微批推理: 各摄像头线程分别提交画面, 同一时间段内的画面合并为一次前向推理
+        Args:
+            max_batch: 最大批次大小 (摄像头数量, 每个摄像头同一时间只有一个画面在推理)
+            controller: AdaptiveController, 每个批次使用其当前档位的推理尺寸
+        """
+        conf = UNCERTAIN_CONF_LOW if self.uncertain_queue else CONF_THRESHOLD
+        settings = (lambda: {'imgsz': controller.settings['imgsz']}) if controller else None
+        self.batcher = MicroBatcher(yolo_batch_fn(self.model, settings, conf=conf, verbose=False), max_batch, BATCH_WAIT)
+
+    def infer(self, frame):
+        """提交一幅画面并等待其结果 (可在多个线程中同时调用)"""
+        return self.batcher(frame).output
+
+    def handle(self, camera, frame, result):
+        """
+        处理一个摄像头画面的检测结果: 取置信度最高的框, 发送到该摄像头的串口并计数
+        Args:
+            camera: CameraPipeline, 推理输入为其 ROI 区域, 坐标需要加上 ROI 偏移
+            frame: 该摄像头的完整画面
+        """
+        x_offset, y_offset = camera.roi[:2] if camera.roi else (0, 0)
+        if DEBUG_WINDOW and CAPTURE_PROCESS:
+            # 画面在共享内存中 (采集进程会复用该槽), 复制后再绘制
+            frame = frame.copy()
+        boxes = result.boxes
+        if self.uncertain_queue is not None and len(boxes) > 0:
+            # 低置信度的框只用于收集不确定画面, 分拣仍只使用置信度 >= CONF_THRESHOLD 的框
+            self.uncertain_queue.observe(result.orig_img, boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(),
+                                         boxes.cls.cpu().numpy(), CONF_THRESHOLD)
+            boxes = boxes[boxes.conf >= CONF_THRESHOLD]
 
-    def detect(self, frame):
-        results = self.model(frame, conf=CONF_THRESHOLD)
-        if len(results) > 0:
-            result = results[0]
-            boxes = result.boxes
+        if DEBUG_WINDOW and camera.roi:
+            cv2.rectangle(frame, tuple(camera.roi[:2]), tuple(camera.roi[2:]), (200, 200, 200), 1)
+        
+        if len(boxes) > 0:
+            confidences = [box.conf[0].item() for box in boxes]
+            max_conf_idx = np.argmax(confidences)
+            box = boxes[max_conf_idx]
             
-            if len(boxes) > 0:
-                confidences = [box.conf[0].item() for box in boxes]
-                max_conf_idx = np.argmax(confidences)
-                box = boxes[max_conf_idx]
-                
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
-                
-                confidence = box.conf[0].item()
-                class_id = int(box.cls[0].item())
-                
-                waste_classifier = WasteClassifier()
-                category_id, description = waste_classifier.get_category_info(class_id)
-                display_text = f"{category_id}({description})"
-                
-                color = self.colors.get(class_id, (255, 255, 255))
-                
-                if DEBUG_WINDOW:
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
-                    
-                    label = f"{display_text} {confidence:.2f}"
-                    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-                    cv2.rectangle(frame, (x1, y1-th-10), (x1+tw+10, y1), color, -1)
-                    cv2.putText(frame, label, (x1+5, y1-5),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            x1, x2 = x1 + x_offset, x2 + x_offset
+            y1, y2 = y1 + y_offset, y2 + y_offset
+            center_x = int((x1 + x2) / 2)
+            center_y = int((y1 + y2) / 2)
+            
+            confidence = box.conf[0].item()
+            class_id = int(box.cls[0].item())
+            
+            waste_classifier = WasteClassifier()
+            category_id, description = waste_classifier.get_category_info(class_id)
+            display_text = f"{category_id}({description})"
+            
+            color = self.colors.get(class_id, (255, 255, 255))
+            
+            if DEBUG_WINDOW:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
                 
-                print(f"检测到物体:")
-                print(f"置信度: {confidence:.2%}")
-                print(f"边界框位置: ({x1}, {y1}), ({x2}, {y2})")
-                print(f"中心点位置: ({center_x}, {center_y})")
-                print("-" * 30)
-                self.serial_manager.send_to_stm32(class_id, center_x, center_y)
-                self.serial_manager.update_garbage_count(display_text)
+                label = f"{display_text} {confidence:.2f}"
+                (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+                cv2.rectangle(frame, (x1, y1-th-10), (x1+tw+10, y1), color, -1)
+                cv2.putText(frame, label, (x1+5, y1-5),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            
+            print(f"检测到物体 (摄像头 {camera.name}):")
+            print(f"置信度: {confidence:.2%}")
+            print(f"边界框位置: ({x1}, {y1}), ({x2}, {y2})")
+            print(f"中心点位置: ({center_x}, {center_y})")
+            print("-" * 30)
+            camera.serial_manager.send_to_stm32(class_id, center_x, center_y)
+            camera.serial_manager.update_garbage_count(display_text, class_id, confidence, (center_x, center_y))
         
         return frame
 
+class CameraPipeline:
+    """
+    一个摄像头: 后台采集线程只保留最新一帧 (推理跟不上时丢弃旧帧), 处理线程取最新一帧提交推理并处理结果;
+    每个摄像头有自己的检测区域 (ROI) 和 SerialManager (串口及稳定性 / 冷却跟踪)
+    """
+    def __init__(self, config, cap, services):
+        self.name = config['name']
+        self.roi = tuple(config['roi']) if config.get('roi') else None
+        self.cap = cap
+        self.condition = threading.Condition()  # 有新画面时通知处理线程
+        self.serial_manager = SerialManager(config.get('stm32_port', STM32_PORT), config.get('stm32_baud', STM32_BAUD),
+                                            self.name, services)
+        self.frame = None
+        self.frame_time = 0.0  # 最新画面的采集时间
+        self.frame_seq = 0     # 最新画面在共享内存中的序号 (CAPTURE_PROCESS)
+        self.frame_id = 0
+        self.taken_id = 0
+        self.skip = 0           # 每处理一帧后跳过的新画面数 (自适应控制)
+        self.fps_limit = 0      # 采集帧率上限, 0 表示不限制 (自适应控制)
+        self.display = None  # 处理完成、等待主线程显示的画面 (DEBUG_WINDOW)
+        self.is_running = True
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.capture_thread.start()
+        self.process_thread = None
+
+    def start_processing(self, detector, controller=None):
+        self.process_thread = threading.Thread(target=self.process_loop, args=(detector, controller), daemon=True)
+        self.process_thread.start()
+
+    def apply_settings(self, settings):
+        """自适应控制档位变化时调用"""
+        self.skip = settings['skip']
+        self.fps_limit = settings['fps']
+        if CAPTURE_PROCESS:
+            self.cap.set_fps_limit(self.fps_limit)  # 在采集进程中限制, 节省解码
+
+    def read_frame(self):
+        """
+        读取一帧; 有采集帧率上限时用 grab() 丢弃多余的画面 (不解码), 摄像头缓冲区中不会积压旧画面
+        Returns:
+            (ret, 画面, 采集时间, 共享内存序号 (CAPTURE_PROCESS, 否则为 0))
+        """
+        if CAPTURE_PROCESS:
+            # 采集时间使用采集进程写入共享内存时记录的时间, 不含等待读取的时间
+            ret, frame = self.cap.read()
+            return ret, frame, self.cap.last_time, self.cap.last_seq
+        if not self.fps_limit:
+            return (*self.cap.read(), time.time(), 0)
+        while True:
+            if not self.cap.grab():
+                return False, None, None, 0
+            now = time.monotonic()
+            if now >= self.next_capture:
+                self.next_capture = now + 1.0 / self.fps_limit
+                return (*self.cap.retrieve(), time.time(), 0)
+
+    def capture_loop(self):
+        self.next_capture = 0.0
+        while self.is_running:
+            ret, frame, captured_at, seq = self.read_frame()
+            if not ret:
+                print(f"错误: 无法读取摄像头 {self.name} 的画面")
+                break
+            with self.condition:
+                self.frame = frame
+                self.frame_time = captured_at
+                self.frame_seq = seq
+                self.frame_id += 1
+                self.condition.notify_all()
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+    def take(self):
+        """
+        等待并取出最新画面 (跳帧时等到上次处理后又有 skip + 1 幅新画面)
+        Returns:
+            (画面, 采集时间, 共享内存序号), 摄像头停止后返回 (None, None, None)
+        """
+        with self.condition:
+            while self.frame_id <= self.taken_id + self.skip:
+                if not self.is_running:
+                    return None, None, None
+                self.condition.wait(1.0)
+            self.taken_id = self.frame_id
+            return self.frame, self.frame_time, self.frame_seq
+
+    def process_loop(self, detector, controller=None):
+        while True:
+            frame, captured_at, seq = self.take()
+            if frame is None:
+                break
+            try:
+                result = detector.infer(self.crop(frame))
+                if CAPTURE_PROCESS and self.cap.overwritten(seq):
+                    # 推理期间采集进程已写满一圈共享内存, 输入画面可能不完整, 丢弃结果
+                    continue
+                frame = detector.handle(self, frame, result)
+            except Exception as e:
+                print(f"摄像头 {self.name} 处理失败: {str(e)}")
+                continue
+            if controller:
+                # 端到端延迟: 采集到结果发送到串口
+                controller.observe(time.time() - captured_at)
+            if DEBUG_WINDOW:
+                self.display = frame
+
+    def crop(self, frame):
+        if not self.roi:
+            return frame
+        x1, y1, x2, y2 = self.roi
+        return frame[y1:y2, x1:x2]
+
+    def close(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        self.capture_thread.join(2.0)
+        if self.process_thread:
+            self.process_thread.join(5.0)
+        # 释放对共享内存中画面的引用后才能关闭共享内存
+        self.frame = self.display = None
+        self.cap.release()
+        self.serial_manager.cleanup()
+
 def create_detector(model_path):
     """
     创建YOLODetector实例
@@ -386,7 +637,38 @@ def find_camera():
     print("错误: 未找到任何可用的摄像头")
     return None
 
+def load_camera_config():
+    """读取摄像头配置: CAMERA_CONFIG_FILE 存在时使用该文件, 否则使用 CAMERAS"""
+    if os.path.exists(CAMERA_CONFIG_FILE):
+        with open(CAMERA_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            cameras = json.load(f)
+        print(f"已读取摄像头配置: {CAMERA_CONFIG_FILE} ({len(cameras)} 个摄像头)")
+        return cameras
+    return CAMERAS
+
+def open_camera(config):
+    """打开配置中的摄像头, source 为 None 时自动查找"""
+    source = config.get('source')
+    if CAPTURE_PROCESS:
+        cap = SharedMemoryCapture(source, CAMERA_WIDTH, CAMERA_HEIGHT, config['name'], SHM_SLOTS)
+        if not cap.isOpened():
+            print(f"错误: 采集进程无法打开摄像头 {config['name']}")
+            cap.release()
+            return None
+        print(f"摄像头 {config['name']} 在采集进程中运行 (共享内存 {cap.ring.name})")
+        return cap
+    if source is None:
+        return find_camera()
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"错误: 无法打开摄像头 {config['name']}: {source}")
+        return None
+    print(f"成功打开摄像头 {config['name']}: {source}")
+    return cap
+
 def main():
+    # systemd 停止服务时发送 SIGTERM, 与 Ctrl+C 一样清理 (关闭串口、停止采集进程、删除共享内存)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     use_gpu, device_info = setup_gpu()
     print("\n设备信息:")
     print(device_info)
@@ -400,44 +682,72 @@ def main():
         print(f"创建检测器失败: {str(e)}")
         return
     
-    cap = find_camera()
-    if not cap:
+    # 所有摄像头共用一个模型和事件存储 / 统计 / 串口屏, 每个摄像头有自己的串口
+    services = SharedServices()
+    cameras = []
+    for config in load_camera_config():
+        cap = open_camera(config)
+        if cap:
+            cameras.append(CameraPipeline(config, cap, services))
+    if not cameras:
+        services.close()
         return
+    # 各摄像头的画面通过微批推理合并为一次前向推理
+    controller = None
+    if ADAPTIVE_CONTROL:
+        controller = AdaptiveController(TARGET_LATENCY, queue_depth=lambda: detector.batcher.pending())
+        services.stats.add_source('adaptive', controller.snapshot)
+        for camera in cameras:
+            camera.apply_settings(controller.settings)
+            controller.add_listener(camera.apply_settings)
+    detector.start_batcher(len(cameras), controller)
+    for camera in cameras:
+        camera.start_processing(detector, controller)
     
     if DEBUG_WINDOW:
-        window_name = 'YOLOv8检测'
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 800, 600)
+        for camera in cameras:
+            window_name = f'YOLOv8检测 - {camera.name}'
+            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(window_name, 800, 600)
     
     print("\n系统启动:")
-    print("- 摄像头已就绪")
+    print(f"- 摄像头已就绪: {', '.join(camera.name for camera in cameras)}")
     print(f"- 调试窗口: {'开启' if DEBUG_WINDOW else '关闭'}")
     print(f"- 串口输出: {'开启' if ENABLE_SERIAL else '关闭'}")
+    print(f"- 自适应控制: {f'开启 (目标延迟 {TARGET_LATENCY * 1000:.0f} ms)' if ADAPTIVE_CONTROL else '关闭'}")
     print("- 按 'q' 键退出程序")
     print("-" * 30)
     
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("错误: 无法读取摄像头画面")
-                break
-            
-            frame = detector.detect(frame)
-            
+        while any(camera.is_running for camera in cameras):
             if DEBUG_WINDOW:
-                cv2.imshow(window_name, frame)
+                # 窗口只能在主线程中显示
+                for camera in cameras:
+                    frame, camera.display = camera.display, None
+                    if frame is not None:
+                        cv2.imshow(f'YOLOv8检测 - {camera.name}', frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     print("\n程序正常退出")
                     break
+            else:
+                time.sleep(0.2)
+            if controller and time.monotonic() - controller.last_update >= 5.0:
+                # 没有画面完成处理时 (如推理卡住) 仍按温度 / 队列判断
+                controller.update()
+        else:
+            print("错误: 所有摄像头都无法读取画面")
             
     except KeyboardInterrupt:
         print("\n检测到键盘中断,程序退出")
     finally:
         # 清理资源
-        if hasattr(detector, 'serial_manager'):
-            detector.serial_manager.cleanup()
-        cap.release()
+        for camera in cameras:
+            camera.close()
+        detector.batcher.close()
+        print(f"推理批次统计: {detector.batcher.stats()}")
+        services.close()
+        if detector.uncertain_queue:
+            detector.uncertain_queue.close()
         if DEBUG_WINDOW:
             cv2.destroyAllWindows()
 
@@ -0,0 +1,261 @@
+"""
+爬取图片的去重和质量过滤 (完全离线, 可以对已有目录单独运行)
+
+- 多进程并行计算每张图片的 dHash 和 pHash (各 64 位), 同时检查损坏、尺寸过小和近乎纯色的图片
+- pHash 建立 BK 树, 近重复查找只需访问少量节点; pHash 与 dHash 的汉明距离都不超过阈值才判定为重复
+- 每组重复图片保留分辨率最高 (其次文件最大) 的一张
+- 问题图片默认移动到 <root>/_quarantine/<原因>/ 下 (可恢复), 也可以直接删除或只生成报告
+- 报告保存为 <root>/dedup_report.json
+
+每个子目录 (如 yolo_dataset/胡萝卜) 单独去重, --global 时跨目录去重。
+
+使用方法:
+    python image_dedup.py --root yolo_dataset
+    python image_dedup.py --root yolo_dataset --dry-run
+    python image_dedup.py --root yolo_dataset --delete --min-size 200
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.gif')
+QUARANTINE_DIR = '_quarantine'
+REPORT_FILE = 'dedup_report.json'
+MIN_SIZE = 100          # 最短边小于该值视为过小
+MIN_STD = 3.0           # 灰度标准差小于该值视为纯色 / 空白图片
+PHASH_DISTANCE = 8      # pHash 汉明距离阈值 (BK 树检索半径)
+DHASH_DISTANCE = 10     # dHash 汉明距离阈值 (二次确认)
+POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def dhash(gray):
+    """差值哈希: 缩放到 9x8, 比较相邻像素"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int(np.packbits(bits.flatten()).view('>u8')[0])
+
+
+def phash(gray):
+    """感知哈希: 32x32 DCT 的左上 8x8 低频分量与中位数比较 (train/dataset_split.py 也使用本函数)"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def analyze_image(path, min_size=MIN_SIZE, min_std=MIN_STD):
+    """
+    在子进程中运行
+    Returns:
+        dict: path / width / height / bytes / dhash / phash, 有问题时 problem 为 'corrupt' / 'tiny' / 'flat'
+    """
+    result = {'path': path, 'width': 0, 'height': 0, 'bytes': 0, 'dhash': None, 'phash': None, 'problem': None}
+    try:
+        result['bytes'] = os.path.getsize(path)
+        data = np.fromfile(path, dtype=np.uint8)  # 支持中文路径
+        gray = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE) if data.size else None
+    except Exception:
+        gray = None
+    if gray is None:
+        result['problem'] = 'corrupt'
+        return result
+    result['height'], result['width'] = gray.shape[:2]
+    if min(gray.shape[:2]) < min_size:
+        result['problem'] = 'tiny'
+        return result
+    if float(gray.std()) < min_std:
+        result['problem'] = 'flat'
+        return result
+    result['dhash'] = dhash(gray)
+    result['phash'] = phash(gray)
+    return result
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def hamming_distance(values, value):
+    """uint64 数组中每个哈希与 value 的汉明距离"""
+    diff = (values ^ value).astype('>u8').view(np.uint8)
+    return POPCOUNT8[diff].reshape(-1, 8).sum(axis=1)
+
+
+class BKTree:
+    """汉明距离上的 BK 树, 半径检索利用三角不等式剪枝"""
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, value):
+        node = [key, value, {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, radius):
+        """返回 [(距离, value)], 按距离从小到大"""
+        if self.root is None:
+            return []
+        found, stack = [], [self.root]
+        while stack:
+            node_key, value, children = stack.pop()
+            distance = hamming(key, node_key)
+            if distance <= radius:
+                found.append((distance, value))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda item: item[0])
+
+
+def list_images(root, exclude=(QUARANTINE_DIR,)):
+    """按目录分组返回图片路径: {相对目录: [路径]}"""
+    groups = defaultdict(list)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in exclude)
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                groups[os.path.relpath(dirpath, root)].append(os.path.join(dirpath, name))
+    return groups
+
+
+def analyze_all(paths, num_workers=None, min_size=MIN_SIZE, min_std=MIN_STD):
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers == 1 or len(paths) < 32:
+        return [analyze_image(path, min_size, min_std) for path in paths]
+    chunksize = max(1, min(64, len(paths) // (num_workers * 4)))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(analyze_image, paths, [min_size] * len(paths), [min_std] * len(paths),
+                                 chunksize=chunksize))
+
+
+def find_duplicates(results, phash_distance=PHASH_DISTANCE, dhash_distance=DHASH_DISTANCE):
+    """
+    贪心去重: 按 (分辨率, 文件大小) 从高到低依次检索, 与已保留图片近重复的标记为重复
+    Returns:
+        dict: {重复图片路径: (保留的图片路径, pHash 距离)}
+    """
+    tree = BKTree()
+    duplicates = {}
+    ranked = sorted((r for r in results if r['problem'] is None),
+                    key=lambda r: (-r['width'] * r['height'], -r['bytes'], r['path']))
+    for result in ranked:
+        match = None
+        for distance, kept in tree.search(result['phash'], phash_distance):
+            if hamming(result['dhash'], kept['dhash']) <= dhash_distance:
+                match = (kept['path'], distance)
+                break
+        if match:
+            duplicates[result['path']] = match
+        else:
+            tree.add(result['phash'], result)
+    return duplicates
+
+
+def dedup_folder(root, num_workers=None, action='quarantine', per_directory=True, min_size=MIN_SIZE,
+                 min_std=MIN_STD, phash_distance=PHASH_DISTANCE, dhash_distance=DHASH_DISTANCE):
+    """
+    对 root 下的图片去重和质量过滤
+    Args:
+        action: 'quarantine' 移动到 <root>/_quarantine/<原因>/, 'delete' 删除, 'report' 只生成报告
+        per_directory: 每个子目录单独去重 (False 时跨目录去重)
+    Returns:
+        dict: 报告
+    """
+    start = time.perf_counter()
+    groups = list_images(root)
+    if not per_directory:
+        groups = {'.': [path for paths in groups.values() for path in paths]}
+    all_paths = [path for paths in groups.values() for path in paths]
+    print(f"正在分析 {len(all_paths)} 张图片...")
+    analyzed = {r['path']: r for r in analyze_all(all_paths, num_workers, min_size, min_std)}
+
+    entries = []
+    for paths in groups.values():
+        results = [analyzed[path] for path in paths]
+        for r in results:
+            if r['problem']:
+                entries.append({'path': r['path'], 'reason': r['problem'], 'width': r['width'], 'height': r['height']})
+        for path, (kept, distance) in find_duplicates(results, phash_distance, dhash_distance).items():
+            entries.append({'path': path, 'reason': 'duplicate', 'duplicate_of': os.path.relpath(kept, root),
+                            'distance': distance})
+
+    for entry in entries:
+        path = entry['path']
+        entry['path'] = os.path.relpath(path, root)
+        if action == 'delete':
+            os.remove(path)
+        elif action == 'quarantine':
+            target = os.path.join(root, QUARANTINE_DIR, entry['reason'], entry['path'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+
+    reasons = Counter(entry['reason'] for entry in entries)
+    report = {
+        'root': root,
+        'action': action,
+        'total': len(all_paths),
+        'kept': len(all_paths) - len(entries),
+        'removed': dict(reasons),
+        'seconds': round(time.perf_counter() - start, 2),
+        'entries': sorted(entries, key=lambda entry: entry['path']),
+    }
+    with open(os.path.join(root, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    verb = {'quarantine': '已隔离', 'delete': '已删除', 'report': '待处理'}[action]
+    print(f"共 {len(all_paths)} 张, 保留 {report['kept']} 张; {verb}: 重复 {reasons['duplicate']}, "
+          f"损坏 {reasons['corrupt']}, 过小 {reasons['tiny']}, 纯色 {reasons['flat']} "
+          f"({report['seconds']} 秒, 报告: {os.path.join(root, REPORT_FILE)})")
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Remove duplicate, near-duplicate, tiny and corrupt crawled images')
+    parser.add_argument('--root', type=str, default='yolo_dataset',
+                        help='Folder with crawled images, one sub-folder per category (default: yolo_dataset)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--min-size', type=int, default=MIN_SIZE,
+                        help=f'Minimum length of the shorter image side (default: {MIN_SIZE})')
+    parser.add_argument('--phash-distance', type=int, default=PHASH_DISTANCE,
+                        help=f'Max pHash Hamming distance for near-duplicates (default: {PHASH_DISTANCE})')
+    parser.add_argument('--dhash-distance', type=int, default=DHASH_DISTANCE,
+                        help=f'Max dHash Hamming distance for near-duplicates (default: {DHASH_DISTANCE})')
+    parser.add_argument('--global', dest='global_dedup', action='store_true',
+                        help='Deduplicate across sub-folders instead of within each one')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--delete', action='store_true',
+                       help=f'Delete problem images instead of moving them to {QUARANTINE_DIR}/')
+    group.add_argument('--dry-run', action='store_true',
+                       help='Only write the report, do not move or delete anything')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.root):
+        print(f"错误: 目录 '{args.root}' 不存在")
+        return
+    action = 'delete' if args.delete else 'report' if args.dry_run else 'quarantine'
+    dedup_folder(args.root, args.workers, action, per_directory=not args.global_dedup, min_size=args.min_size,
+                 phash_distance=args.phash_distance, dhash_distance=args.dhash_distance)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,102 +1,317 @@
-import os
+"""
+Convert labelme polygon JSON files to EasyData bounding box JSON (or YOLO txt labels)
+
+Usage:
+    python json-converter.py                                   # interactive, asks for folders
+    python json-converter.py --input labels --output trans_labels
+    python json-converter.py --input labels --output train/labels --yolo
+    python json-converter.py --benchmark 50000
+
+Files are converted in parallel over a process pool. A file is skipped when its output
+already exists and is newer than the input, so re-running only converts new or edited
+labels. With --prune, outputs (files with the output extension only) whose input JSON has
+been removed are deleted; other files in the output folder are never touched.
+With --yolo, YOLO .txt labels (4 top-level classes) are written directly from the polygons,
+using imageWidth / imageHeight stored in the labelme JSON.
+"""
+import argparse
 import json
+import os
+import random
 import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
+from bbox_kernels import CATEGORY_MAPPING, boxes_to_yolo, format_yolo_lines, polygon_bounds
+
+CHUNK_SIZE = 256
+
+
 def convert_polygon_to_bbox(input_json):
     """
     Convert from polygon format to bounding box format
     """
-    output = {"labels": []}
-    
-    # Process each shape in the input
-    for shape in input_json["shapes"]:
-        # Get all x coordinates and y coordinates from points
-        points = shape["points"]
-        x_coords = [p[0] for p in points]
-        y_coords = [p[1] for p in points]
-        
-        # Calculate bounding box coordinates
-        x1 = min(x_coords)
-        y1 = min(y_coords)
-        x2 = max(x_coords)
-        y2 = max(y_coords)
-        
-        # Create label entry in required format
-        label_entry = {
-            "y1": y1,
-            "x2": x2,
-            "x1": x1,
-            "y2": y2,
-            "name": shape["label"]
-        }
-        
-        output["labels"].append(label_entry)
-    
-    return output
+    shapes = input_json["shapes"]
+    names = [shape["label"] for shape in shapes]
+    _, values = polygon_bounds([shape["points"] for shape in shapes])
+    return {"labels": [{"y1": y1, "x2": x2, "x1": x1, "y2": y2, "name": name}
+                       for (x1, y1, x2, y2), name in zip(values, names)]}
+
 
-def process_folder(input_folder, output_folder):
+def convert_polygon_to_yolo(input_json):
     """
-    Process all JSON files in the input folder and save converted files to output folder
+    Convert from polygon format to YOLO label lines, matching convert_labels in the training script
     """
-    # Create output folder if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    else:
-        # Clear output folder if it exists
-        shutil.rmtree(output_folder)
-        os.makedirs(output_folder)
-    
-    # Get all JSON files in input folder
-    json_files = list(Path(input_folder).glob("*.json"))
-    
-    # Process each JSON file
-    for json_file in json_files:
+    shapes = [shape for shape in input_json["shapes"] if shape["label"] in CATEGORY_MAPPING]
+    boxes, _ = polygon_bounds([shape["points"] for shape in shapes], keep_values=False)
+    yolo = boxes_to_yolo(boxes, input_json["imageWidth"], input_json["imageHeight"])
+    class_ids = [CATEGORY_MAPPING[shape["label"]] for shape in shapes]
+    return format_yolo_lines(class_ids, yolo)
+
+
+def is_up_to_date(json_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(json_path)
+
+
+def write_output(output_path, content):
+    # Write to a temporary file first so an interrupted run never leaves a truncated, "newer" output
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, output_path)
+
+
+def convert_file(json_path, output_path, yolo=False):
+    """
+    Convert a single file
+    Returns:
+        (status, message): status is 'converted', 'skipped' or 'error'
+    """
+    try:
+        if is_up_to_date(json_path, output_path):
+            return 'skipped', None
+        with open(json_path, 'r', encoding='utf-8') as f:
+            input_json = json.load(f)
+        if yolo:
+            content = convert_polygon_to_yolo(input_json)
+        else:
+            content = json.dumps(convert_polygon_to_bbox(input_json), ensure_ascii=False, separators=(',', ':'))
+        write_output(output_path, content)
+        return 'converted', None
+    except Exception as e:
+        return 'error', f"Error processing {os.path.basename(json_path)}: {str(e)}"
+
+
+def convert_chunk(tasks, yolo):
+    """
+    Convert a chunk of files in a worker process; all shapes of the chunk go through the
+    array kernels in one call. Falls back to per-file conversion if the batch fails
+    (e.g. a non-numeric coordinate), so one bad file only fails itself.
+    """
+    results = [None] * len(tasks)
+    loaded = []  # (task index, label names, polygons, image width, image height)
+    for i, (json_path, output_path) in enumerate(tasks):
         try:
-            # Read input JSON
-            with open(json_file, 'r', encoding='utf-8') as f:
+            if is_up_to_date(json_path, output_path):
+                results[i] = ('skipped', None)
+                continue
+            with open(json_path, 'r', encoding='utf-8') as f:
                 input_json = json.load(f)
-            
-            # Convert format
-            output_json = convert_polygon_to_bbox(input_json)
-            
-            # Create output file path
-            output_file = os.path.join(output_folder, json_file.name)
-            
-            # Save converted JSON
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_json, f, indent=2)
-            
-            print(f"Successfully converted {json_file.name}")
-            
+            shapes = input_json["shapes"]
+            if yolo:
+                shapes = [shape for shape in shapes if shape["label"] in CATEGORY_MAPPING]
+                size = (input_json["imageWidth"], input_json["imageHeight"])
+            else:
+                size = (None, None)
+            loaded.append((i, [shape["label"] for shape in shapes], [shape["points"] for shape in shapes], *size))
+        except Exception as e:
+            results[i] = ('error', f"Error processing {os.path.basename(json_path)}: {str(e)}")
+
+    counts = [len(names) for _, names, _, _, _ in loaded]
+    bounds = np.cumsum([0] + counts).tolist()
+    polygons = [points for _, _, file_polygons, _, _ in loaded for points in file_polygons]
+    try:
+        if yolo:
+            boxes, _ = polygon_bounds(polygons, keep_values=False)
+            widths = np.repeat([width for _, _, _, width, _ in loaded], counts)
+            heights = np.repeat([height for _, _, _, _, height in loaded], counts)
+            yolo_boxes = boxes_to_yolo(boxes, widths, heights)
+        else:
+            _, values = polygon_bounds(polygons)
+    except Exception:
+        for i, _, _, _, _ in loaded:
+            results[i] = convert_file(*tasks[i], yolo)
+        return results
+
+    for n, (i, names, _, _, _) in enumerate(loaded):
+        start, end = bounds[n], bounds[n + 1]
+        if yolo:
+            content = format_yolo_lines([CATEGORY_MAPPING[name] for name in names], yolo_boxes[start:end])
+        else:
+            output_json = {"labels": [{"y1": y1, "x2": x2, "x1": x1, "y2": y2, "name": name}
+                                      for (x1, y1, x2, y2), name in zip(values[start:end], names)]}
+            content = json.dumps(output_json, ensure_ascii=False, separators=(',', ':'))
+        try:
+            write_output(tasks[i][1], content)
+            results[i] = ('converted', None)
         except Exception as e:
-            print(f"Error processing {json_file.name}: {str(e)}")
-    
-    print(f"\nProcessing complete. Converted {len(json_files)} files.")
+            results[i] = ('error', f"Error processing {os.path.basename(tasks[i][0])}: {str(e)}")
+    return results
+
+
+def process_folder(input_folder, output_folder, yolo=False, num_workers=None, prune=False):
+    """
+    Process all JSON files in the input folder and save converted files to output folder
+    prune: also delete output files (.txt / .json) that have no matching input JSON
+    Returns:
+        dict: number of converted / skipped / failed / removed files
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    suffix = '.txt' if yolo else '.json'
+
+    # Get all JSON files in input folder
+    json_names = sorted(entry.name for entry in os.scandir(input_folder)
+                        if entry.is_file() and entry.name.endswith('.json'))
+    tasks = [(os.path.join(input_folder, name), os.path.join(output_folder, Path(name).stem + suffix))
+             for name in json_names]
+
+    # Remove outputs whose input JSON no longer exists (opt-in: the output folder may be
+    # shared with hand-made labels or other files using the same extension)
+    removed = 0
+    if prune:
+        expected = {os.path.basename(output_path) for _, output_path in tasks}
+        for entry in os.scandir(output_folder):
+            if entry.is_file() and entry.name.endswith(suffix) and entry.name not in expected:
+                os.remove(entry.path)
+                removed += 1
+
+    chunks = [tasks[i:i + CHUNK_SIZE] for i in range(0, len(tasks), CHUNK_SIZE)]
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = [result for chunk in executor.map(convert_chunk, chunks, [yolo] * len(chunks))
+                       for result in chunk]
+    else:
+        results = [result for chunk in chunks for result in convert_chunk(chunk, yolo)]
+
+    stats = {'converted': 0, 'skipped': 0, 'error': 0, 'removed': removed}
+    for status, message in results:
+        stats[status] += 1
+        if message:
+            print(message)
+
+    print(f"\nProcessing complete. Converted {stats['converted']}, skipped {stats['skipped']} up-to-date, "
+          f"failed {stats['error']}, removed {stats['removed']} stale files.")
+    return stats
+
+
+def convert_polygon_to_bbox_python(input_json):
+    """Previous per-shape implementation, kept only as the benchmark baseline"""
+    output = {"labels": []}
+    for shape in input_json["shapes"]:
+        x_coords = [p[0] for p in shape["points"]]
+        y_coords = [p[1] for p in shape["points"]]
+        output["labels"].append({"y1": min(y_coords), "x2": max(x_coords), "x1": min(x_coords),
+                                 "y2": max(y_coords), "name": shape["label"]})
+    return output
+
+
+def process_folder_serial(input_folder, output_folder):
+    """Previous implementation (single process, indent=2), kept only as the benchmark baseline"""
+    if os.path.exists(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+    for json_file in Path(input_folder).glob("*.json"):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            input_json = json.load(f)
+        output_json = convert_polygon_to_bbox_python(input_json)
+        with open(os.path.join(output_folder, json_file.name), 'w', encoding='utf-8') as f:
+            json.dump(output_json, f, indent=2)
+
+
+def make_synthetic_labels(folder, count, seed=0):
+    """Write `count` labelme-style polygon JSON files"""
+    rng = random.Random(seed)
+    names = list(CATEGORY_MAPPING)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        shapes = []
+        for _ in range(rng.randint(1, 4)):
+            cx, cy = rng.uniform(50, 590), rng.uniform(50, 430)
+            points = [[cx + rng.uniform(-40, 40), cy + rng.uniform(-40, 40)] for _ in range(rng.randint(4, 12))]
+            shapes.append({"label": rng.choice(names), "points": points, "group_id": None,
+                           "shape_type": "polygon", "flags": {}})
+        labelme = {"version": "5.2.1", "flags": {}, "shapes": shapes, "imagePath": f"img_{i:06d}.jpg",
+                   "imageData": None, "imageHeight": 480, "imageWidth": 640}
+        with open(os.path.join(folder, f"img_{i:06d}.json"), 'w', encoding='utf-8') as f:
+            json.dump(labelme, f, indent=2)
+
+
+def benchmark(count, num_workers=None):
+    work_dir = tempfile.mkdtemp(prefix='json_converter_bench_')
+    try:
+        input_folder = os.path.join(work_dir, 'labels')
+        print(f"Generating {count} synthetic labelme files in {work_dir} ...")
+        make_synthetic_labels(input_folder, count)
+
+        timings = []
+
+        def timed(name, fn, *args, **kwargs):
+            start = time.perf_counter()
+            fn(*args, **kwargs)
+            timings.append((name, time.perf_counter() - start))
+
+        timed('serial, indent=2 (previous)', process_folder_serial, input_folder, os.path.join(work_dir, 'serial'))
+        timed('parallel, compact json', process_folder, input_folder, os.path.join(work_dir, 'json'),
+              num_workers=num_workers)
+        timed('parallel, yolo txt', process_folder, input_folder, os.path.join(work_dir, 'yolo'),
+              yolo=True, num_workers=num_workers)
+        timed('re-run, all up-to-date', process_folder, input_folder, os.path.join(work_dir, 'json'),
+              num_workers=num_workers)
+
+        baseline = timings[0][1]
+        print(f"\n{count} files, {num_workers or os.cpu_count()} workers")
+        print(f"{'mode':<30} | {'seconds':>8} | {'files/s':>9} | {'speedup':>7}")
+        print("-" * 64)
+        for name, seconds in timings:
+            print(f"{name:<30} | {seconds:>8.2f} | {count / seconds:>9.0f} | {baseline / seconds:>6.1f}x")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert labelme polygon JSON to EasyData bbox JSON or YOLO txt')
+    parser.add_argument('--input', type=str, default=None,
+                        help='Input folder with labelme JSON files (prompted if omitted)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output folder (default: trans_labels)')
+    parser.add_argument('--yolo', action='store_true',
+                        help='Write YOLO .txt labels (4 top-level classes) instead of EasyData JSON')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--prune', action='store_true',
+                        help='Delete output files with the output extension whose input JSON no longer exists')
+    parser.add_argument('--benchmark', type=int, default=None, metavar='N',
+                        help='Benchmark against the previous serial converter on N synthetic files and exit')
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark, args.workers)
+        return
+
     # Default folders
     default_input = "labels"
     default_output = "trans_labels"
-    
-    # Get input folder from user
-    input_folder = input(f"Enter input folder path (press Enter for default '{default_input}'): ").strip()
-    if not input_folder:
-        input_folder = default_input
-    
-    # Get output folder from user
-    output_folder = input(f"Enter output folder path (press Enter for default '{default_output}'): ").strip()
+
+    input_folder = args.input
+    output_folder = args.output
+    if input_folder is None:
+        # Get input folder from user
+        input_folder = input(f"Enter input folder path (press Enter for default '{default_input}'): ").strip()
+        if not input_folder:
+            input_folder = default_input
+
+        # Get output folder from user
+        if output_folder is None:
+            output_folder = input(f"Enter output folder path (press Enter for default '{default_output}'): ").strip()
     if not output_folder:
         output_folder = default_output
-    
+
     # Validate input folder exists
     if not os.path.exists(input_folder):
         print(f"Error: Input folder '{input_folder}' does not exist!")
         return
-    
+
     # Process files
     print(f"\nProcessing files from '{input_folder}' to '{output_folder}'...")
-    process_folder(input_folder, output_folder)
+    process_folder(input_folder, output_folder, yolo=args.yolo, num_workers=args.workers, prune=args.prune)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,12 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from icrawler import ImageDownloader
 from icrawler.builtin import BingImageCrawler
 
+from crawl_manifest import MANIFEST_FILE, CrawlManifest, HttpFetcher, fetch_and_store
+from image_dedup import dedup_folder
+
 # 定义要下载的类别及对应的搜索关键词（支持多语言）
 categories = {
     "胡萝卜": ["carrot"],
@@ -8,47 +14,104 @@ categories = {
     "鹅卵石": ["cobblestone","pebbles"],
     "砖块（碎的）": ["碎砖"],
     "土豆": ["potato","土豆"]
-    
+
 }
 
 # 设置每个关键词下载的图片数量
 num_images_per_keyword = 3000  # 每个关键词下载的图片数量，可以根据需要调整
+min_image_size = (200, 200)  # 可根据需要调整图片最小尺寸
+keyword_concurrency = 3  # 同时爬取的关键词数量
+requests_per_second = 8  # 每个图片主机每秒最多请求数
 
 # 创建保存图片的主目录
 output_dir = "yolo_dataset"
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
 
-# 遍历每个类别并下载图片
-for category, keywords in categories.items():
-    print(f"正在下载类别 '{category}' 的图片...")
-    # 创建类别对应的文件夹
+
+class ManifestImageDownloader(ImageDownloader):
+    """
+    通过爬取清单下载图片: 已完成的 URL 直接跳过, 文件编号由清单分配, 结果写回清单
+    manifest / fetcher / keyword / category / category_dir 在创建爬虫后设置
+    """
+    manifest = None
+    fetcher = None
+    keyword = None
+    category = None
+    category_dir = None
+
+    def download(self, task, default_ext, timeout=5, max_retry=3, overwrite=False, **kwargs):
+        task['success'] = False
+        task['filename'] = None
+        if self.reach_max_num():
+            self.signal.set(reach_max_num=True)
+            return
+        status, path = fetch_and_store(task['file_url'], self.keyword, self.category, self.manifest, self.fetcher,
+                                       self.category_dir, kwargs.get('min_size'), timeout, default_ext)
+        if status == 'done':
+            with self.lock:
+                self.fetched_num += 1
+            self.logger.info('image #%s\t%s', self.fetched_num, task['file_url'])
+            task['success'] = True
+            task['filename'] = os.path.basename(path)
+
+
+def crawl_keyword(category, keyword, manifest, fetcher):
     category_path = os.path.join(output_dir, category)
-    if not os.path.exists(category_path):
-        os.makedirs(category_path)
-    
-    for keyword in keywords:
-        print(f"  正在使用关键词 '{keyword}' 下载图片...")
-        # 初始化 BingImageCrawler
-        crawler = BingImageCrawler(
-            feeder_threads=4,
-            parser_threads=4,
-            downloader_threads=16,
-            storage={'root_dir': category_path}
+    remaining = num_images_per_keyword - manifest.count(keyword)
+    if remaining <= 0:
+        print(f"  关键词 '{keyword}' 已下载 {num_images_per_keyword} 张, 跳过。")
+        return
+    print(f"  正在使用关键词 '{keyword}' 下载图片 (还需 {remaining} 张)...")
+    # 初始化 BingImageCrawler
+    crawler = BingImageCrawler(
+        downloader_cls=ManifestImageDownloader,
+        feeder_threads=1,
+        parser_threads=2,
+        downloader_threads=8,
+        storage={'root_dir': category_path}
+    )
+    crawler.downloader.manifest = manifest
+    crawler.downloader.fetcher = fetcher
+    crawler.downloader.keyword = keyword
+    crawler.downloader.category = category
+    crawler.downloader.category_dir = category_path
+
+    # 开始抓取图片; 搜索结果从头开始解析, 已在清单中完成的 URL 不会重新下载
+    try:
+        crawler.crawl(
+            keyword=keyword,
+            max_num=remaining,
+            min_size=min_image_size
         )
-        
-        # 开始抓取图片
-        try:
-            crawler.crawl(
-                keyword=keyword,
-                max_num=num_images_per_keyword,
-                min_size=(200, 200),  # 可根据需要调整图片最小尺寸
-                file_idx_offset=0
-            )
-            print(f"  关键词 '{keyword}' 的图片下载完成。")
-        except Exception as e:
-            print(f"  使用关键词 '{keyword}' 下载图片时出错: {e}")
-    
-    print(f"类别 '{category}' 的所有图片下载完成。\n")
-
-print("所有类别的图片下载完成！")
+        print(f"  关键词 '{keyword}' 的图片下载完成, 共 {manifest.count(keyword)} 张。")
+    except Exception as e:
+        print(f"  使用关键词 '{keyword}' 下载图片时出错: {e}")
+
+
+def main():
+    os.makedirs(output_dir, exist_ok=True)
+    for category in categories:
+        os.makedirs(os.path.join(output_dir, category), exist_ok=True)
+
+    # 爬取清单记录已下载的 URL, 中断后重新运行会从上次停止的位置继续
+    manifest = CrawlManifest(os.path.join(output_dir, MANIFEST_FILE))
+    fetcher = HttpFetcher(requests_per_second)
+
+    # 多个关键词并行爬取, 同时进行的关键词数量有上限
+    tasks = [(category, keyword) for category, keywords in categories.items() for keyword in keywords]
+    with ThreadPoolExecutor(max_workers=keyword_concurrency) as executor:
+        futures = [executor.submit(crawl_keyword, category, keyword, manifest, fetcher) for category, keyword in tasks]
+        for future in futures:
+            future.result()
+
+    print("所有类别的图片下载完成！")
+    for (keyword, status), count in sorted(manifest.summary().items()):
+        print(f"  {keyword}: {status} {count}")
+    manifest.close()
+
+    # 去除重复、近重复、损坏和过小的图片, 移动到 yolo_dataset/_quarantine/ 下, 报告见 yolo_dataset/dedup_report.json
+    print("\n正在去重和过滤图片...")
+    dedup_folder(output_dir, min_size=min_image_size[0])
+
+
+if __name__ == '__main__':
+    main()
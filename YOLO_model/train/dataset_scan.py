@@ -0,0 +1,274 @@
+"""
+EasyData 数据集快速完整性扫描
+
+- 图片尺寸只从文件头读取 (JPEG SOF 段 / PNG IHDR 块), 不解码像素; JPEG 按 EXIF 方向交换宽高;
+  同时检查文件尾 (JPEG EOI / PNG IEND), 可以发现下载或拷贝中断导致的截断文件
+- 每个标签 JSON 只解析一次
+- 多进程并行扫描
+- 结果按 (mtime, 大小) 缓存在 <data_dir>/.scan_cache.json, 再次运行时只扫描新增或修改过的文件
+
+使用方法:
+    python dataset_scan.py --data ./label
+    python dataset_scan.py --data ./label --workers 8 --no-cache
+"""
+import argparse
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CACHE_FILE = '.scan_cache.json'
+CACHE_VERSION = 3
+MIN_IMAGE_SIZE = 10
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_TAIL = b'IEND\xaeB`\x82'
+# SOF0~SOF15, 不包括 DHT(C4) / JPG(C8) / DAC(CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def exif_orientation(data):
+    """APP1 段数据中 EXIF IFD0 的 Orientation 标签 (0x0112), 不是 EXIF 或没有该标签时返回 1"""
+    if data[:6] != b'Exif\x00\x00':
+        return 1
+    tiff = data[6:]
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    if len(tiff) < 8:
+        return 1
+    offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 10 > len(tiff):
+            break
+        tag, _, _, value = struct.unpack(endian + 'HHIH', tiff[entry:entry + 10])
+        if tag == 0x0112:
+            return value
+    return 1
+
+
+def probe_jpeg(f):
+    """
+    顺序跳过 JPEG 段直到 SOF, 返回显示方向的 (宽, 高)
+    EXIF Orientation 为 5~8 (旋转 90/270 度) 时交换宽高, 与 cv2.imread 读出的图片 (以及标注时看到的图片) 一致
+    """
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':  # 标记前可以有任意个填充的 0xFF
+            byte = f.read(1)
+        if not byte:
+            raise ValueError("未找到 SOF 段")
+        marker = byte[0]
+        if marker == 0xD9 or marker == 0xDA:
+            raise ValueError("SOF 段之前遇到图像数据")
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # 无长度字段的标记
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("段长度不完整")
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            header = f.read(5)
+            if len(header) < 5:
+                raise ValueError("SOF 段不完整")
+            height, width = struct.unpack('>HH', header[1:5])
+            if 5 <= orientation <= 8:
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation == 1:  # APP1: EXIF (也可能是 XMP)
+            orientation = exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def find_jpeg_eoi(f, start, chunk_size=64 * 1024):
+    """
+    从文件尾向前按块查找 EOI, 最远到 start (SOF 段的位置)
+    部分相机会在 EOI 之后追加大量填充或私有数据, 正常文件通常在第一块内找到;
+    SOF 之后的图像数据中 0xFF 都经过填充, 不会误判, 也不会匹配到 SOF 之前 EXIF 缩略图的 EOI
+    """
+    end = f.seek(0, os.SEEK_END)
+    while end > start:
+        begin = max(start, end - chunk_size)
+        f.seek(begin)
+        if b'\xff\xd9' in f.read(end - begin + 1):  # 多读 1 字节, 跨块边界的标记也能找到
+            return True
+        end = begin
+    return False
+
+
+def probe_image(img_path):
+    """
+    只读取文件头和文件尾, 返回 (宽, 高)
+    文件格式无法识别、头部损坏或文件被截断时抛出 ValueError
+    """
+    with open(img_path, 'rb') as f:
+        head = f.read(24)
+        if head[:3] == b'\xff\xd8\xff':
+            width, height = probe_jpeg(f)
+            if not find_jpeg_eoi(f, f.tell()):
+                raise ValueError("JPEG 文件被截断 (缺少 EOI)")
+        elif head[:8] == PNG_SIGNATURE and head[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', head[16:24])
+            f.seek(-len(PNG_TAIL), os.SEEK_END)
+            if f.read() != PNG_TAIL:
+                raise ValueError("PNG 文件被截断 (缺少 IEND)")
+        else:
+            raise ValueError("无法识别的图片格式")
+    if width == 0 or height == 0:
+        raise ValueError("图片头中的尺寸为 0")
+    return width, height
+
+
+def check_label(json_path):
+    """解析一次标签文件, 返回标注框数量"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        label_data = json.load(f)
+    if not isinstance(label_data, dict) or 'labels' not in label_data:
+        raise ValueError("标签文件结构无效 (缺少 'labels' 键)")
+    return len(label_data['labels'])
+
+
+def scan_pair(data_dir, img_file):
+    """
+    检查一对图片和标签, 在子进程中运行
+    Returns:
+        dict: width / height / num_labels, 无效时 error 为警告信息
+    """
+    img_path = os.path.join(data_dir, img_file)
+    json_file = os.path.splitext(img_file)[0] + '.json'
+    json_path = os.path.join(data_dir, json_file)
+    result = {'width': None, 'height': None, 'num_labels': 0, 'error': None}
+
+    try:
+        width, height = probe_image(img_path)
+    except Exception as e:
+        result['error'] = f"损坏或无效的图片文件: {img_file} ({e})"
+        return result
+    result['width'], result['height'] = width, height
+    if height < MIN_IMAGE_SIZE or width < MIN_IMAGE_SIZE:
+        result['error'] = f"图片尺寸过小: {img_file}"
+        return result
+
+    if not os.path.exists(json_path):
+        result['error'] = f"找不到对应的标签文件: {json_path}"
+        return result
+    try:
+        result['num_labels'] = check_label(json_path)
+    except json.JSONDecodeError:
+        result['error'] = f"JSON 解码错误 - 无效的 JSON 文件: {json_path}"
+    except UnicodeDecodeError:
+        result['error'] = f"Unicode 解码错误 - 无效的 JSON 文件: {json_path}"
+    except Exception as e:
+        result['error'] = f"处理标签文件 {json_path} 时发生错误: {e}"
+    return result
+
+
+def file_signature(path):
+    """(mtime_ns, 大小), 文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        print(f"警告: 扫描缓存损坏, 将重新扫描: {cache_path}")
+        return {}
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(cache_path, files):
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'files': files}, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def scan_dataset(data_dir, num_workers=None, use_cache=True):
+    """
+    扫描数据目录中的所有图片及其标签
+    Returns:
+        dict: {图片文件名: scan_pair 的结果}, 按文件名排序
+    """
+    image_files = sorted(f for f in os.listdir(data_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    cache_path = os.path.join(data_dir, CACHE_FILE) if use_cache else None
+    cached = load_cache(cache_path)
+
+    results, signatures, pending = {}, {}, []
+    for img_file in image_files:
+        json_file = os.path.splitext(img_file)[0] + '.json'
+        signature = [file_signature(os.path.join(data_dir, img_file)),
+                     file_signature(os.path.join(data_dir, json_file))]
+        signatures[img_file] = signature
+        entry = cached.get(img_file)
+        if entry is not None and entry['signature'] == signature:
+            results[img_file] = entry['result']
+        else:
+            pending.append(img_file)
+
+    print(f"找到 {len(image_files)} 张图片, 缓存命中 {len(results)}, 需要扫描 {len(pending)}")
+    if pending:
+        num_workers = num_workers or os.cpu_count() or 1
+        if num_workers > 1 and len(pending) > 64:
+            chunksize = max(1, min(256, len(pending) // (num_workers * 4)))
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                scanned = executor.map(scan_pair, [data_dir] * len(pending), pending, chunksize=chunksize)
+                for img_file, result in zip(pending, scanned):
+                    results[img_file] = result
+        else:
+            for img_file in pending:
+                results[img_file] = scan_pair(data_dir, img_file)
+
+    if cache_path and (pending or cached.keys() != set(image_files)):
+        save_cache(cache_path, {img_file: {'signature': signatures[img_file], 'result': results[img_file]}
+                                for img_file in image_files})
+    return {img_file: results[img_file] for img_file in image_files}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Scan an EasyData directory for broken images and labels')
+    parser.add_argument('--data', type=str, default='./label',
+                        help='Directory containing images and EasyData JSON labels (default: ./label)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore and do not update the scan cache')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    results = scan_dataset(args.data, args.workers, use_cache=not args.no_cache)
+    elapsed = time.perf_counter() - start
+    invalid = [result['error'] for result in results.values() if result['error']]
+    for error in invalid:
+        print(f"警告: {error}")
+    print(f"有效 {len(results) - len(invalid)} / {len(results)}, 用时 {elapsed:.2f} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""
+分层、按近重复分组的确定性数据集划分
+
+- 每张图片按标签中的细分类实例数 (类别多重集) 分层, battery / drug 等稀有类别在 val / test 中也会出现
+- 感知哈希 (pHash) 汉明距离不超过 max_distance 的图片 (如 get_frame.sh 从同一视频中截取的相邻帧)
+  归为一组, 同一组只会进入同一个划分, 避免验证 / 测试集泄漏
+- 迭代分层: 按组内最稀有的类别从稀有到常见依次分配, 每组放入该类别相对缺口最大的划分;
+  排序和并列时的选择都只取决于文件名和标签内容, 结果完全确定
+- 已有划分的图片 (fixed) 保持不变, 只为新图片分配划分; 新图片与已有图片近重复时跟随已有图片所在的划分
+
+使用方法:
+    python dataset_split.py --data ./label
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# pHash 和汉明距离与 image_dedup.py 共用 YOLO_model/ 下的一份
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from image_dedup import hamming_distance, phash
+
+SPLITS = ('train', 'val', 'test')
+SPLIT_RATIOS = (0.8, 0.1, 0.1)
+MAX_HASH_DISTANCE = 6
+REPORT_FILE = 'split_report.json'
+# 64 位哈希分为 8 个字节分段, 汉明距离不超过 7 的两个哈希至少有一个分段完全相同
+HASH_BANDS = 8
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def image_phash(img_path):
+    """DCT 感知哈希 (image_dedup.phash), 返回 64 位整数; 图片无法读取时返回 None"""
+    img = cv2.imread(img_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None:
+        return None
+    return phash(img)
+
+
+def label_classes(json_path):
+    """标签中各细分类的实例数"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        label_data = json.load(f)
+    return dict(Counter(label['name'] for label in label_data.get('labels', []) if 'name' in label))
+
+
+def describe_pair(data_dir, img_file):
+    """计算一对图片 / 标签的内容哈希、感知哈希和类别, 在子进程中运行"""
+    img_path = os.path.join(data_dir, img_file)
+    json_path = os.path.join(data_dir, os.path.splitext(img_file)[0] + '.json')
+    return {
+        'image_sha1': file_sha1(img_path),
+        'label_sha1': file_sha1(json_path),
+        'phash': image_phash(img_path),
+        'classes': label_classes(json_path),
+    }
+
+
+def describe_pairs(data_dir, img_files, num_workers=None):
+    """并行计算 describe_pair, 返回 {图片文件名: 结果}"""
+    if not img_files:
+        return {}
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers == 1 or len(img_files) <= 16:
+        return {img_file: describe_pair(data_dir, img_file) for img_file in img_files}
+    chunksize = max(1, min(64, len(img_files) // (num_workers * 4)))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(describe_pair, [data_dir] * len(img_files), img_files, chunksize=chunksize)
+        return dict(zip(img_files, results))
+
+
+def group_near_duplicates(phashes, max_distance=MAX_HASH_DISTANCE):
+    """
+    按感知哈希把近重复图片合并为组 (并查集, 传递闭包)
+    Args:
+        phashes: {图片文件名: 64 位哈希或 None}
+    Returns:
+        dict: {图片文件名: 组代表 (组内排序最小的文件名)}
+    """
+    names = sorted(phashes)
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    hashed = [i for i, name in enumerate(names) if phashes[name] is not None]
+    values = np.array([phashes[names[i]] for i in hashed], dtype=np.uint64)
+    if max_distance < HASH_BANDS:
+        # 只比较至少有一个字节分段相同的哈希
+        band_bytes = values.astype('>u8').view(np.uint8).reshape(-1, HASH_BANDS)
+        candidates = []
+        for band in range(HASH_BANDS):
+            buckets = defaultdict(list)
+            for pos, key in enumerate(band_bytes[:, band].tolist()):
+                buckets[key].append(pos)
+            candidates.extend(np.array(positions) for positions in buckets.values() if len(positions) > 1)
+    else:
+        candidates = [np.arange(len(hashed))]
+
+    for positions in candidates:
+        bucket_values = values[positions]
+        for k in range(len(positions) - 1):
+            distance = hamming_distance(bucket_values[k + 1:], bucket_values[k])
+            for other in positions[k + 1:][distance <= max_distance].tolist():
+                union(hashed[positions[k]], hashed[other])
+
+    return {name: names[find(i)] for i, name in enumerate(names)}
+
+
+def stable_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def assign_splits(classes, groups, fixed=None, ratios=SPLIT_RATIOS):
+    """
+    分层分组划分
+    Args:
+        classes: {图片文件名: {细分类: 实例数}}
+        groups: group_near_duplicates 的结果
+        fixed: {图片文件名: 划分}, 已有划分的图片, 保持不变
+    Returns:
+        dict: {图片文件名: 划分}
+    """
+    fixed = fixed or {}
+    members = defaultdict(list)
+    for img_file in classes:
+        members[groups.get(img_file, img_file)].append(img_file)
+
+    class_totals = Counter()
+    for counts in classes.values():
+        class_totals.update(counts)
+    total_images = len(classes)
+    target_images = [total_images * ratio for ratio in ratios]
+    target_classes = {name: [total * ratio for ratio in ratios] for name, total in class_totals.items()}
+    have_images = [0] * len(SPLITS)
+    have_classes = defaultdict(lambda: [0] * len(SPLITS))
+
+    def add(img_files, split_index):
+        have_images[split_index] += len(img_files)
+        for img_file in img_files:
+            for name, count in classes[img_file].items():
+                have_classes[name][split_index] += count
+
+    assignment = {}
+    pending = []
+    for key, img_files in members.items():
+        fixed_splits = Counter(fixed[img_file] for img_file in img_files if img_file in fixed)
+        if not fixed_splits:
+            pending.append(key)
+            continue
+        # 已有图片保持原划分; 新图片跟随组内已有图片最多的划分
+        majority = min(fixed_splits, key=lambda split: (-fixed_splits[split], SPLITS.index(split)))
+        for img_file in img_files:
+            split = fixed.get(img_file, majority)
+            assignment[img_file] = split
+            add([img_file], SPLITS.index(split))
+
+    def group_counts(key):
+        counts = Counter()
+        for img_file in members[key]:
+            counts.update(classes[img_file])
+        return counts
+
+    def rarity(key):
+        counts = group_counts(key)
+        rarest = min((class_totals[name] for name in counts), default=float('inf'))
+        return (rarest, -len(members[key]), stable_key(key))
+
+    for key in sorted(pending, key=rarity):
+        counts = group_counts(key)
+        rarest = min(counts, key=lambda name: (class_totals[name], name)) if counts else None
+
+        def score(split_index):
+            image_deficit = (target_images[split_index] - have_images[split_index]) / max(target_images[split_index], 1e-9)
+            if rarest is None:
+                return (image_deficit, -split_index)
+            target = target_classes[rarest][split_index]
+            class_deficit = (target - have_classes[rarest][split_index]) / max(target, 1e-9)
+            return (class_deficit, image_deficit, -split_index)
+
+        split_index = max((i for i, ratio in enumerate(ratios) if ratio > 0), key=score)
+        for img_file in members[key]:
+            assignment[img_file] = SPLITS[split_index]
+        add(members[key], split_index)
+    return assignment
+
+
+def split_report(assignment, classes, groups=None, category_mapping=None, report_path=None):
+    """打印每个划分中各类别的图片数和实例数, 可选保存为 JSON"""
+    images = {split: Counter() for split in SPLITS}
+    instances = {split: Counter() for split in SPLITS}
+    for img_file, split in assignment.items():
+        for name, count in classes[img_file].items():
+            images[split][name] += 1
+            instances[split][name] += count
+    names = sorted(set().union(*(instances[split] for split in SPLITS)),
+                   key=lambda name: (category_mapping.get(name, 99) if category_mapping else 0, name))
+
+    print(f"\n{'类别':<16}" + ''.join(f"{split:>16}" for split in SPLITS))
+    print("-" * (16 + 16 * len(SPLITS)))
+    for name in names:
+        row = ''.join(f"{f'{images[split][name]} ({instances[split][name]})':>16}" for split in SPLITS)
+        missing = [split for split in SPLITS if images[split][name] == 0]
+        print(f"{name:<16}{row}" + (f"  缺少: {','.join(missing)}" if missing else ''))
+    if category_mapping:
+        for category_id in sorted(set(category_mapping.values())):
+            row = ''.join(f"{sum(instances[split][n] for n in names if category_mapping.get(n) == category_id):>16}"
+                          for split in SPLITS)
+            print(f"{f'大类 {category_id}':<16}{row}")
+    totals = Counter(assignment.values())
+    print(f"{'图片总数':<16}" + ''.join(f"{totals[split]:>16}" for split in SPLITS))
+    print("(每格为 图片数 (实例数))")
+
+    leaked = 0
+    if groups:
+        group_splits = defaultdict(set)
+        for img_file, split in assignment.items():
+            group_splits[groups.get(img_file, img_file)].add(split)
+        leaked = sum(1 for splits in group_splits.values() if len(splits) > 1)
+        if leaked:
+            print(f"警告: {leaked} 组近重复图片分布在多个划分中 (来自已有划分), 删除 dataset_manifest.json 可重新划分")
+
+    report = {
+        'images': {split: dict(images[split]) for split in SPLITS},
+        'instances': {split: dict(instances[split]) for split in SPLITS},
+        'totals': {split: totals[split] for split in SPLITS},
+        'leaked_groups': leaked,
+    }
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Preview a stratified, near-duplicate aware split of an EasyData directory')
+    parser.add_argument('--data', type=str, default='./label',
+                        help='Directory containing images and EasyData JSON labels (default: ./label)')
+    parser.add_argument('--max-distance', type=int, default=MAX_HASH_DISTANCE,
+                        help=f'Max pHash Hamming distance for near-duplicates (default: {MAX_HASH_DISTANCE})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--report', type=str, default=REPORT_FILE,
+                        help=f'Where to write the JSON report (default: {REPORT_FILE})')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    img_files = sorted(f for f in os.listdir(args.data)
+                       if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+                       and os.path.exists(os.path.join(args.data, os.path.splitext(f)[0] + '.json')))
+    described = describe_pairs(args.data, img_files, args.workers)
+    groups = group_near_duplicates({f: d['phash'] for f, d in described.items()}, args.max_distance)
+    classes = {f: d['classes'] for f, d in described.items()}
+    print(f"{len(img_files)} 张图片, {len(set(groups.values()))} 组近重复")
+    assignment = assign_splits(classes, groups)
+    split_report(assignment, classes, groups, report_path=args.report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+从视频 / 摄像头中按画面变化抽帧, 用于标注 (替代 get_frame.sh 的固定每秒一帧)
+
+- 流式解码: 只按 --sample-fps 检查部分帧, 其余帧只 grab 不做颜色转换和拷贝
+- 与上一张保留帧比较, 差异超过阈值才保存:
+    hist: HSV 颜色直方图的 Bhattacharyya 距离 (0 表示相同, 1 表示完全不同), 速度快
+    ssim: 缩略灰度图的 1 - SSIM, 对结构变化 (物体移动、出现) 更敏感
+- --max-per-minute 限制每分钟视频最多保存的帧数
+- 输出为单层目录中的 <视频名>_<帧号>.jpg (摄像头为 camera<编号>_<开始时间>_<帧号>.jpg),
+  文件名由帧在视频中的位置决定, 重复运行或调整阈值后再次运行不会覆盖之前保存的其他帧; 标注后与同名 .json 放在一起即为
+  train4class_yolovX_easydata.py 中 check_and_clean_dataset 读取的目录结构
+
+使用方法:
+    python extract_frames.py video.mp4 --output ./label
+    python extract_frames.py videos/ --metric ssim --threshold 0.25 --max-per-minute 20
+    python extract_frames.py 0 --output ./label --duration 120      # 摄像头 0, 录制 120 秒
+    python extract_frames.py --benchmark                             # 1080p 合成视频吞吐量测试
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm')
+THUMB_SIZE = (160, 90)
+SAMPLE_FPS = 5.0
+MAX_PER_MINUTE = 30
+DEFAULT_THRESHOLDS = {'hist': 0.2, 'ssim': 0.3}
+JPEG_QUALITY = 95
+
+
+def thumbnail(frame):
+    return cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def hist_feature(thumb):
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def hist_difference(a, b):
+    return cv2.compareHist(a, b, cv2.HISTCMP_BHATTACHARYYA)
+
+
+def ssim_feature(thumb):
+    return cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+def ssim_difference(a, b):
+    """1 - SSIM (高斯窗口 11x11, sigma 1.5)"""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(img):
+        return cv2.GaussianBlur(img, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return 1.0 - float(ssim.mean())
+
+
+METRICS = {
+    'hist': (hist_feature, hist_difference),
+    'ssim': (ssim_feature, ssim_difference),
+}
+
+
+def open_source(source):
+    """视频文件路径或摄像头编号"""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {source}")
+    return cap
+
+
+def extract_frames(source, output_dir, metric='hist', threshold=None, sample_fps=SAMPLE_FPS,
+                   max_per_minute=MAX_PER_MINUTE, prefix=None, duration=None, ext='jpg'):
+    """
+    抽取一个视频 (或摄像头) 中画面有变化的帧
+    Args:
+        threshold: 与上一张保留帧的差异阈值, 默认按 metric 取 DEFAULT_THRESHOLDS
+        sample_fps: 每秒检查的帧数, 其余帧跳过
+        max_per_minute: 每分钟 (视频时间) 最多保存的帧数, 0 表示不限制
+        duration: 最多处理的秒数 (摄像头必须指定, 否则一直运行到 Ctrl+C)
+    Returns:
+        dict: 解码帧数 / 检查帧数 / 保存帧数 / 用时
+    """
+    feature_fn, difference_fn = METRICS[metric]
+    threshold = DEFAULT_THRESHOLDS[metric] if threshold is None else threshold
+    os.makedirs(output_dir, exist_ok=True)
+    if prefix is None:
+        prefix = f'camera{source}' if str(source).isdigit() else os.path.splitext(os.path.basename(source))[0]
+    if str(source).isdigit():
+        # 摄像头每次运行帧号都从 0 开始, 加上开始时间区分
+        prefix += time.strftime('_%Y%m%d_%H%M%S')
+
+    cap = open_source(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(fps / sample_fps))) if sample_fps else 1
+    min_interval = 60.0 / max_per_minute if max_per_minute else 0.0
+    write_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if ext == 'jpg' else []
+
+    frame_index, checked, saved = 0, 0, 0
+    last_feature, last_saved_time = None, None
+    start = time.perf_counter()
+    try:
+        while True:
+            video_time = frame_index / fps
+            if duration is not None and video_time >= duration:
+                break
+            if frame_index % step:
+                # 不检查的帧只解码不取出, 省去颜色转换和内存拷贝
+                if not cap.grab():
+                    break
+                frame_index += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frame_number = frame_index
+            frame_index += 1
+            checked += 1
+            if last_saved_time is not None and video_time - last_saved_time < min_interval:
+                continue
+
+            feature = feature_fn(thumbnail(frame))
+            if last_feature is not None and difference_fn(feature, last_feature) < threshold:
+                continue
+            saved += 1
+            cv2.imwrite(os.path.join(output_dir, f'{prefix}_{frame_number:06d}.{ext}'), frame, write_params)
+            last_feature, last_saved_time = feature, video_time
+    except KeyboardInterrupt:
+        print("已停止")
+    finally:
+        cap.release()
+
+    elapsed = time.perf_counter() - start
+    stats = {'decoded': frame_index, 'checked': checked, 'saved': saved, 'seconds': elapsed}
+    print(f"{source}: 解码 {frame_index} 帧 ({frame_index / max(elapsed, 1e-9):.1f} 帧/秒), "
+          f"检查 {checked} 帧, 保存 {saved} 帧 -> {output_dir}")
+    return stats
+
+
+def find_videos(path):
+    if os.path.isfile(path):
+        return [path]
+    videos = []
+    for dirpath, _, filenames in os.walk(path):
+        videos += [os.path.join(dirpath, name) for name in sorted(filenames) if name.lower().endswith(VIDEO_EXTENSIONS)]
+    return sorted(videos)
+
+
+def make_synthetic_video(path, seconds=20, fps=30, size=(1920, 1080), scene_seconds=4, seed=0):
+    """生成 1080p 合成视频: 每 scene_seconds 秒换一个场景, 场景内有一个缓慢移动的物体和噪声"""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    width, height = size
+    background = None
+    for i in range(seconds * fps):
+        if i % (scene_seconds * fps) == 0:
+            background = cv2.resize(rng.integers(0, 255, (9, 16, 3), dtype=np.uint8), size,
+                                    interpolation=cv2.INTER_CUBIC)
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        frame = background.copy()
+        x = int(width * 0.2 + (i % (scene_seconds * fps)) * 2)
+        cv2.circle(frame, (x, height // 2), 120, color, -1)
+        noise = rng.integers(0, 6, (height // 8, width // 8, 3), dtype=np.uint8)
+        frame = cv2.add(frame, cv2.resize(noise, size, interpolation=cv2.INTER_NEAREST))
+        writer.write(frame)
+    writer.release()
+
+
+def benchmark(seconds=20):
+    work_dir = tempfile.mkdtemp(prefix='extract_frames_bench_')
+    video = os.path.join(work_dir, 'synthetic_1080p.mp4')
+    print(f"正在生成 {seconds} 秒 1080p 合成视频...")
+    make_synthetic_video(video, seconds)
+
+    cap = open_source(video)
+    start = time.perf_counter()
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    full_read = frames / (time.perf_counter() - start)
+
+    rows = [('cap.read() 全部帧 (基准)', full_read, frames, '-')]
+    for metric in METRICS:
+        for sample_fps in (SAMPLE_FPS, 0):
+            stats = extract_frames(video, os.path.join(work_dir, f'{metric}_{sample_fps}'), metric=metric,
+                                   sample_fps=sample_fps, max_per_minute=0)
+            name = f"{metric}, {'每帧检查' if not sample_fps else f'{sample_fps:g} 帧/秒检查'}"
+            rows.append((name, stats['decoded'] / stats['seconds'], stats['checked'], stats['saved']))
+
+    print(f"\n1080p, {frames} 帧 ({seconds} 秒, {seconds // 4} 个场景)")
+    print(f"{'模式':<28} | {'帧/秒':>8} | {'检查帧':>6} | {'保存帧':>6}")
+    print("-" * 60)
+    for name, fps, checked, saved in rows:
+        print(f"{name:<28} | {fps:>8.1f} | {checked:>6} | {saved:>6}")
+    shutil.rmtree(work_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract visually distinct frames from videos for labeling')
+    parser.add_argument('inputs', nargs='*',
+                        help='Video files, directories of videos, or a camera index')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output directory (default: <video dir>/<video name>_frames)')
+    parser.add_argument('--metric', type=str, default='hist', choices=list(METRICS),
+                        help='Difference metric against the last kept frame (default: hist)')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help=f'Keep a frame when the difference exceeds this (default: {DEFAULT_THRESHOLDS})')
+    parser.add_argument('--sample-fps', type=float, default=SAMPLE_FPS,
+                        help=f'Frames per second to examine, 0 examines every frame (default: {SAMPLE_FPS})')
+    parser.add_argument('--max-per-minute', type=int, default=MAX_PER_MINUTE,
+                        help=f'Maximum kept frames per minute of video, 0 for no limit (default: {MAX_PER_MINUTE})')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Stop after this many seconds of video (required for cameras)')
+    parser.add_argument('--ext', type=str, default='jpg', choices=['jpg', 'png'],
+                        help='Output image format (default: jpg)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Measure throughput on a synthetic 1080p video and exit')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark()
+        return
+    if not args.inputs:
+        print("错误: 请指定视频文件、目录或摄像头编号")
+        return
+
+    for source in args.inputs:
+        sources = [source] if source.isdigit() else find_videos(source)
+        if not sources:
+            print(f"警告: '{source}' 中没有支持的视频文件")
+        for video in sources:
+            output_dir = args.output
+            if output_dir is None:
+                base = f'camera{video}' if video.isdigit() else os.path.splitext(video)[0]
+                output_dir = base + '_frames'
+            extract_frames(video, output_dir, args.metric, args.threshold, args.sample_fps,
+                           args.max_per_minute, duration=args.duration, ext=args.ext)
+
+
+if __name__ == '__main__':
+    main()
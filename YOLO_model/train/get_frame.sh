@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# 脚本所在目录 (extract_frames.py 与本脚本放在一起)
+SCRIPT_DIR=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+
 # 定义支持的视频文件扩展名
 VIDEO_EXTENSIONS=("mp4" "avi" "mkv" "mov" "flv" "wmv" "webm")
 
@@ -36,8 +39,8 @@ process_video() {
     local OUTPUT_DIR="$VIDEO_DIR/${VIDEO_NAME}_frames"
     mkdir -p "$OUTPUT_DIR"
 
-    # 使用 ffmpeg 每1秒抽取一帧，并指定输出格式和质量
-    ffmpeg -i "$VIDEO_PATH" -vf fps=1 "$OUTPUT_DIR/${VIDEO_NAME}_%d.png" >/dev/null 2>&1
+    # 按画面变化抽帧 (extract_frames.py), 相邻的近似帧不再重复保存
+    python3 "$SCRIPT_DIR/extract_frames.py" "$VIDEO_PATH" --output "$OUTPUT_DIR"
 
     echo "帧已保存到目录: $OUTPUT_DIR"
 }
@@ -126,7 +129,7 @@ show_usage() {
     echo "用法: $0 <command> /path/to/video_or_directory"
     echo ""
     echo "命令说明:"
-    echo "  getframe      提取视频帧"
+    echo "  getframe      按画面变化提取视频帧 (调用 extract_frames.py)"
     echo "  getmp4        将非 MP4 视频转换为 MP4 格式"
     echo "  mergevideo    合并目录中的视频文件（递归处理每个子目录）"
     echo ""
@@ -22,98 +22,36 @@ setup_font()
 from ultralytics import YOLO
 import yaml
 import json
-from sklearn.model_selection import train_test_split
 import shutil
 import cv2
 import numpy as np
 from pathlib import Path
 import gc
 import torch
+import sys
+# bbox_kernels.py (标注框转换和 CATEGORY_MAPPING) 与 json-converter.py 共用 YOLO_model/ 下的一份
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from bbox_kernels import CATEGORY_MAPPING, boxes_to_yolo, format_yolo_lines, valid_mask
+from dataset_scan import scan_dataset
+from dataset_split import SPLITS, assign_splits, describe_pairs, group_near_duplicates, split_report
 
 select_model='yolo11n.pt'#选择的模型,默认为yolo11n,可以更改
 datapath='./label'  # 根据实际情况修改
 
 def check_and_clean_dataset(data_dir):
-    """检查数据集完整性并清理无效数据"""
+    """检查数据集完整性并清理无效数据 (只读取图片文件头, 多进程扫描, 结果按文件修改时间缓存)"""
     print("正在检查数据集完整性...")
-    # 获取所有图片文件
-    image_extensions = ('.jpg', '.jpeg', '.png')
-    image_files = [f for f in os.listdir(data_dir) if f.lower().endswith(image_extensions)]
-    valid_pairs = []
-    print(f"找到 {len(image_files)} 张图片")
-    # 检查每个图片是否有效且有对应的标签文件
-    for img_file in image_files:
-        img_path = os.path.join(data_dir, img_file)
-        base_name = os.path.splitext(img_file)[0]
-        if '.' in base_name:
-            pass  # 如果需要，可以添加额外的处理逻辑
-        json_file = os.path.join(data_dir, base_name + '.json')
-        # 检查图片完整性
-        try:
-            img = cv2.imread(img_path)
-            if img is None:
-                print(f"警告: 损坏或无效的图片文件: {img_file}")
-                continue
-                
-            # 检查图片尺寸是否合理
-            height, width = img.shape[:2]
-            if height < 10 or width < 10:
-                print(f"警告: 图片尺寸过小: {img_file}")
-                continue
-                
-        except Exception as e:
-            print(f"警告: 读取图片 {img_file} 时出错: {e}")
+    scan_results = scan_dataset(data_dir)
+    # {图片文件名: (宽, 高)}, 尺寸在准备数据集时直接复用, 不再解码图片
+    valid_pairs = {}
+    for img_file, result in scan_results.items():
+        if result['error']:
+            print(f"警告: {result['error']}")
             continue
-            
-        # 检查标签文件是否存在且有效
-        if os.path.exists(json_file):
-            # 确保标签文件确实是一个 JSON 文件，而不是其他格式
-            if not json_file.lower().endswith('.json'):
-                print(f"警告: 标签文件扩展名不正确 (应为 .json): {json_file}")
-                continue
-            
-            # 验证 JSON 文件内容
-            if validate_json_file(json_file):
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        label_data = json.load(f)
-                        
-                    # 验证标签数据结构
-                    if 'labels' not in label_data:
-                        print(f"警告: 标签文件结构无效 (缺少 'labels' 键): {json_file}")
-                        continue
-                        
-                    valid_pairs.append(img_file)
-                except Exception as e:
-                    print(f"警告: 处理标签文件 {json_file} 时发生错误: {e}")
-                    continue
-            else:
-                # JSON 文件无效，跳过
-                continue
-        else:
-            print(f"警告: 找不到对应的标签文件: {json_file}")
+        valid_pairs[img_file] = (result['width'], result['height'])
     
     print(f"找到 {len(valid_pairs)} 对有效的图片和标签文件")
     return valid_pairs
-    
-def validate_json_file(json_path):
-    """
-    验证 JSON 文件是否有效。
-    返回 True 表示有效，False 表示无效。
-    """
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json.load(f)
-        return True
-    except json.JSONDecodeError:
-        print(f"警告: JSON 解码错误 - 无效的 JSON 文件: {json_path}")
-        return False
-    except UnicodeDecodeError:
-        print(f"警告: Unicode 解码错误 - 无效的 JSON 文件: {json_path}")
-        return False
-    except Exception as e:
-        print(f"警告: 无法读取 JSON 文件 {json_path} - 错误: {e}")
-        return False
 
 
 def create_data_yaml():
@@ -135,157 +73,221 @@ def create_data_yaml():
     
     with open('data.yaml', 'w', encoding='utf-8') as f:
         yaml.dump(data, f, sort_keys=False, allow_unicode=True)
+DATASET_MANIFEST = 'dataset_manifest.json'
+MANIFEST_VERSION = 2
+SPLIT_REPORT = 'split_report.json'
+FICLONE = 0x40049409  # Linux ioctl, btrfs / xfs 等文件系统上的写时复制克隆
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def link_or_copy(src, dst):
+    """依次尝试硬链接、reflink 克隆, 都不支持时(如跨文件系统)再复制"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(src, dst)
+
+
+def load_dataset_manifest(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        print(f"警告: 数据集清单损坏, 将重新生成: {path}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_dataset_manifest(path, items):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'items': items}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def remove_split_files(split, img_file):
+    base_name = os.path.splitext(img_file)[0]
+    for path in (os.path.join(split, 'images', img_file), os.path.join(split, 'labels', base_name + '.txt')):
+        if os.path.lexists(path):
+            os.remove(path)
+
+
 def prepare_dataset(data_dir, valid_pairs):
-    """准备数据集 - 修改验证集划分比例"""
+    """
+    增量准备数据集
+    清单 dataset_manifest.json 记录每对图片/标签的内容哈希、感知哈希、类别和所属划分, 每次运行只处理新增、
+    删除或修改过的文件, 已有图片保持原来的划分; 新图片按类别分层、近重复图片同组的方式分配 (见 dataset_split.py),
+    删除清单即可整体重新划分。图片以硬链接 (或 reflink) 方式放入划分目录。
+    Args:
+        valid_pairs: {图片文件名: (宽, 高)}, 即 check_and_clean_dataset 的返回值
+    """
     # 确保验证集至少有10张图片
     if len(valid_pairs) < 15:
         raise ValueError(f"Not enough valid data pairs ({len(valid_pairs)}). Need at least 15 images.")
-    
-    # 清理现有目录
-    for split in ['train', 'val', 'test']:
-        if os.path.exists(split):
-            shutil.rmtree(split)
+
+    manifest = load_dataset_manifest(DATASET_MANIFEST)
+    if manifest is None:
+        # 没有清单时无法判断划分目录中已有文件的来源, 重新生成
+        for split in SPLITS:
+            if os.path.exists(split):
+                shutil.rmtree(split)
+        old_items = {}
+    else:
+        old_items = manifest['items']
+    for split in SPLITS:
         for subdir in ['images', 'labels']:
             os.makedirs(os.path.join(split, subdir), exist_ok=True)
-    
-    # 数据集划分 (80% 训练, 10% 验证, 10% 测试)
-    train_files, temp = train_test_split(valid_pairs, test_size=0.2, random_state=42)
-    val_files, test_files = train_test_split(temp, test_size=0.5, random_state=42)
-    
-    splits = {
-        'train': train_files,
-        'val': val_files,
-        'test': test_files
-    }
-    
-    # 处理每个分割
-    for split_name, files in splits.items():
-        print(f"\nProcessing {split_name} split...")
-        for img_file in files:
-            # 修改这部分代码
-            base_name = os.path.splitext(img_file)[0]
-            src_img = os.path.join(data_dir, img_file)
-            # 确保我们使用正确的JSON文件名
-            src_json = os.path.join(data_dir, base_name + '.json')
-            dst_img = os.path.join(split_name, 'images', img_file)
-            dst_txt = os.path.join(split_name, 'labels', base_name + '.txt')
-            
-            # 复制图片和转换标签
-            shutil.copy2(src_img, dst_img)
-            convert_labels(src_json, dst_txt)
-            
-        print(f"{split_name}: {len(files)} images")
-    
-    return len(train_files), len(val_files), len(test_files)
 
-def convert_bbox_to_yolo(bbox, img_width, img_height):
-    """转换边界框从x1,y1,x2,y2到YOLO格式"""
-    x1, y1, x2, y2 = bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']
-    
-    # 计算中心点坐标和宽高
-    x_center = (x1 + x2) / (2 * img_width)
-    y_center = (y1 + y2) / (2 * img_height)
-    width = (x2 - x1) / img_width
-    height = (y2 - y1) / img_height
-    
-    # 确保值在0-1范围内
-    x_center = max(0, min(1, x_center))
-    y_center = max(0, min(1, y_center))
-    width = max(0, min(1, width))
-    height = max(0, min(1, height))
-    
-    return x_center, y_center, width, height
-def convert_labels(json_file, txt_file):
-    """转换为四大类"""
+    # 删除源目录中已不存在或已失效的图片
+    removed = [img_file for img_file in old_items if img_file not in valid_pairs]
+    for img_file in removed:
+        remove_split_files(old_items[img_file]['split'], img_file)
+
+    # 修改时间或大小变化时才重新计算内容哈希、感知哈希和类别
+    signatures = {}
+    for img_file in valid_pairs:
+        src_json = os.path.join(data_dir, os.path.splitext(img_file)[0] + '.json')
+        signatures[img_file] = [file_signature(os.path.join(data_dir, img_file)), file_signature(src_json)]
+    pending = [img_file for img_file in valid_pairs
+               if img_file not in old_items or old_items[img_file]['signature'] != signatures[img_file]]
+    described = describe_pairs(data_dir, pending)
+
+    items = {}
+    for img_file, img_size in valid_pairs.items():
+        if img_file in described:
+            items[img_file] = dict(described[img_file], signature=signatures[img_file], size=list(img_size))
+        else:
+            items[img_file] = dict(old_items[img_file])
+
+    groups = group_near_duplicates({img_file: item['phash'] for img_file, item in items.items()})
+    classes = {img_file: item['classes'] for img_file, item in items.items()}
+    fixed = {img_file: old_items[img_file]['split'] for img_file in items if img_file in old_items}
+    assignment = assign_splits(classes, groups, fixed)
+
+    added, changed, unchanged = 0, 0, 0
+    for img_file, item in items.items():
+        item['split'] = split = assignment[img_file]
+        base_name = os.path.splitext(img_file)[0]
+        dst_img = os.path.join(split, 'images', img_file)
+        dst_txt = os.path.join(split, 'labels', base_name + '.txt')
+        old = old_items.get(img_file)
+
+        content_changed = old is not None and (old['image_sha1'], old['label_sha1']) != \
+            (item['image_sha1'], item['label_sha1'])
+        if old is not None and not content_changed and os.path.exists(dst_img) and os.path.exists(dst_txt):
+            unchanged += 1
+            continue
+        link_or_copy(os.path.join(data_dir, img_file), dst_img)
+        convert_labels(os.path.join(data_dir, base_name + '.json'), dst_txt, valid_pairs[img_file])
+        if old is None:
+            added += 1
+        else:
+            changed += 1
+
+    save_dataset_manifest(DATASET_MANIFEST, items)
+    print(f"新增 {added}, 更新 {changed}, 删除 {len(removed)}, 未变化 {unchanged}")
+    report = split_report(assignment, classes, groups, CATEGORY_MAPPING, report_path=SPLIT_REPORT)
+    print(f"近重复分组: {len(set(groups.values()))} 组 / {len(items)} 张图片")
+    totals = report['totals']
+
+    return totals['train'], totals['val'], totals['test']
+
+def convert_labels(json_file, txt_file, img_size=None):
+    """
+    转换为四大类
+    Args:
+        img_size: (宽, 高), 已知时不再读取图片
+    """
     try:
         if not os.path.exists(json_file):
             print(f"Warning: JSON file not found: {json_file}")
             return False
             
-        # 获取图片路径
-        base_name = os.path.splitext(json_file)[0]
-        possible_extensions = ['.jpg', '.jpeg', '.png']
-        img_path = None
-        
-        for ext in possible_extensions:
-            temp_path = base_name + ext
-            if os.path.exists(temp_path):
-                img_path = temp_path
-                break
-                
-        if img_path is None:
-            print(f"Warning: No corresponding image file found for: {json_file}")
-            return False
-        
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"Warning: Cannot read image: {img_path}")
-            return False
-        
-        img_height, img_width = img.shape[:2]
+        if img_size is not None:
+            img_width, img_height = img_size
+        else:
+            # 获取图片路径
+            base_name = os.path.splitext(json_file)[0]
+            possible_extensions = ['.jpg', '.jpeg', '.png']
+            img_path = None
+            
+            for ext in possible_extensions:
+                temp_path = base_name + ext
+                if os.path.exists(temp_path):
+                    img_path = temp_path
+                    break
+                    
+            if img_path is None:
+                print(f"Warning: No corresponding image file found for: {json_file}")
+                return False
+            
+            img = cv2.imread(img_path)
+            if img is None:
+                print(f"Warning: Cannot read image: {img_path}")
+                return False
+            
+            img_height, img_width = img.shape[:2]
         
         with open(json_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # 细分类到大分类的映射
-        category_mapping = {
-            # 厨余垃圾 (0)
-            'potato': 0,
-            'daikon': 0,
-            'carrot': 0,
-            # 可回收垃圾 (1)
-            'bottle': 1,
-            'can': 1,
-            # 有害垃圾 (2)
-            'battery': 2,
-            'drug': 2,
-            'inner_packing': 2,
-            # 其他垃圾 (3)
-            'tile': 3,
-            'stone': 3,
-            'brick': 3
-        }
-        
         with open(txt_file, 'w', encoding='utf-8') as f:
             if 'labels' not in data:
                 print(f"Warning: No 'labels' key in {json_file}")
                 return False
                 
+            # 先逐个筛选有效标注, 再用 bbox_kernels 对整个文件的标注框一次性归一化和截断
+            category_ids, boxes = [], []
             for label in data['labels']:
-                try:
-                    if 'name' not in label:
-                        print(f"Warning: No 'name' field in label data in {json_file}")
-                        continue
-                        
-                    class_name = label['name']
-                    if class_name not in category_mapping:
-                        print(f"Warning: Unknown class {class_name} in {json_file}")
-                        continue
-                        
-                    # 直接使用大分类ID
-                    category_id = category_mapping[class_name]
-                    
-                    required_keys = ['x1', 'y1', 'x2', 'y2']
-                    if not all(key in label for key in required_keys):
-                        print(f"Warning: Missing bbox coordinates in {json_file}")
-                        continue
+                if 'name' not in label:
+                    print(f"Warning: No 'name' field in label data in {json_file}")
+                    continue
                     
-                    x_center, y_center, width, height = convert_bbox_to_yolo(
-                        label, img_width, img_height)
+                class_name = label['name']
+                if class_name not in CATEGORY_MAPPING:
+                    print(f"Warning: Unknown class {class_name} in {json_file}")
+                    continue
                     
-                    if all(0 <= val <= 1 for val in [x_center, y_center, width, height]):
-                        f.write(f"{category_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-                    else:
-                        print(f"Warning: Invalid bbox values in {json_file}")
-                        continue
-                        
-                except KeyError as e:
-                    print(f"Warning: Missing key in label data in {json_file}: {e}")
+                required_keys = ['x1', 'y1', 'x2', 'y2']
+                if not all(key in label for key in required_keys):
+                    print(f"Warning: Missing bbox coordinates in {json_file}")
                     continue
-                except Exception as e:
-                    print(f"Warning: Error processing label in {json_file}: {e}")
+                
+                box = [label[key] for key in required_keys]
+                if not all(isinstance(val, (int, float)) and not isinstance(val, bool) for val in box):
+                    print(f"Warning: Error processing label in {json_file}: non-numeric bbox coordinates")
                     continue
                     
+                # 直接使用大分类ID
+                category_ids.append(CATEGORY_MAPPING[class_name])
+                boxes.append(box)
+            
+            yolo = boxes_to_yolo(np.array(boxes, dtype=np.float64).reshape(-1, 4), img_width, img_height)
+            valid = valid_mask(yolo)
+            if not valid.all():
+                print(f"Warning: Invalid bbox values in {json_file}")
+            f.write(format_yolo_lines([c for c, ok in zip(category_ids, valid) if ok], yolo[valid]))
+                    
         return True
         
     except json.JSONDecodeError as e:
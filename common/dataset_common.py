@@ -0,0 +1,240 @@
+"""
+GarbageDataset 的共享数据集工具, TorchVision 和 TensorflowVision 两个目录共用 (通过 sys.path 导入本目录):
+- read_list_file: 读取 train.txt / validate.txt 文件列表
+- plan_shards: dataset_shards.py (tar / TFRecord) 的分片分配
+- build_cache: 预处理图像缓存
+
+预处理图像缓存: 将 train.txt / validate.txt 中的图片一次性解码、转 RGB、缩放为 IMG_SIZE,
+保存为 uint8 (N, IMG_SIZE, IMG_SIZE, 3) 的 .npy 内存映射数组, 同时保存标签数组和清单(manifest)。
+训练时数据集直接对内存映射数组切片 (零拷贝), 不再每个 epoch 解码 JPEG。
+
+清单中记录每个源文件的大小、修改时间和内容哈希:
+- 大小和修改时间都没变的文件不重新计算哈希
+- 只有内容哈希或列表发生变化时才重建缓存, 未变化的图片直接从旧缓存复制
+
+使用方法:
+    python ../common/dataset_common.py --root garbage --lists train.txt validate.txt   # 在 TorchVision 或 TensorflowVision 目录下运行
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+CACHE_VERSION = 1
+DEFAULT_IMG_SIZE = 224
+
+
+def read_list_file(root_dir, txt_file):
+    """读取文件列表, 格式与 GarbageDataset 一致: '<相对路径> <标签>'"""
+    data = []
+    with open(os.path.join(root_dir, txt_file), 'r') as f:
+        for line in f:
+            img_path, label = line.strip().split()
+            img_path = img_path.lstrip('./')
+            data.append((img_path, int(label)))
+    return data
+
+
+def plan_shards(sizes, num_shards):
+    """
+    dataset_shards.py 的分片分配
+    LPT 贪心: 按大小从大到小, 依次放入当前总字节数最小的分片
+    Returns:
+        list[list[int]]: 每个分片包含的样本下标 (按原列表顺序)
+    """
+    heap = [(0, shard) for shard in range(num_shards)]
+    assignment = [[] for _ in range(num_shards)]
+    for idx in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        total, shard = heapq.heappop(heap)
+        assignment[shard].append(idx)
+        heapq.heappush(heap, (total + sizes[idx], shard))
+    return [sorted(indices) for indices in assignment]
+
+
+def file_digest(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def cache_paths(cache_dir, txt_file):
+    prefix = os.path.join(cache_dir, os.path.splitext(os.path.basename(txt_file))[0])
+    return {
+        'images': prefix + '_images.npy',
+        'labels': prefix + '_labels.npy',
+        'manifest': prefix + '_manifest.json',
+    }
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def scan_sources(root_dir, data, old_manifest):
+    """统计源文件信息, 大小和修改时间未变时沿用旧清单中的内容哈希"""
+    old_entries = {}
+    if old_manifest:
+        old_entries = {entry['path']: entry for entry in old_manifest['entries']}
+
+    entries = []
+    for img_path, label in data:
+        full_path = os.path.join(root_dir, img_path)
+        entry = {'path': img_path, 'label': label, 'size': -1, 'mtime_ns': -1, 'sha1': None}
+        try:
+            stat = os.stat(full_path)
+            entry['size'] = stat.st_size
+            entry['mtime_ns'] = stat.st_mtime_ns
+            old = old_entries.get(img_path)
+            if old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+                entry['sha1'] = old['sha1']
+            else:
+                entry['sha1'] = file_digest(full_path)
+        except OSError:
+            pass  # 文件缺失, 以全零图片占位, 与 GarbageDataset 的处理方式一致
+        entries.append(entry)
+    return entries
+
+
+def is_up_to_date(old_manifest, entries, img_size, paths):
+    if not old_manifest or old_manifest.get('version') != CACHE_VERSION:
+        return False
+    if old_manifest.get('img_size') != img_size:
+        return False
+    if not all(os.path.exists(p) for p in (paths['images'], paths['labels'])):
+        return False
+    old_entries = old_manifest['entries']
+    if len(old_entries) != len(entries):
+        return False
+    return all(old['path'] == new['path'] and old['label'] == new['label'] and old['sha1'] == new['sha1']
+               for old, new in zip(old_entries, entries))
+
+
+def decode_image(full_path, img_size):
+    img = cv2.imread(full_path)
+    if img is None:
+        return None
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return cv2.resize(img, (img_size, img_size))
+
+
+def build_cache(root_dir, txt_file, img_size=DEFAULT_IMG_SIZE, cache_dir=None, num_workers=None):
+    """
+    构建(或校验)预处理缓存
+    Returns:
+        dict: images/labels/manifest 文件路径
+    """
+    cache_dir = cache_dir or os.path.join(root_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = cache_paths(cache_dir, txt_file)
+
+    data = read_list_file(root_dir, txt_file)
+    old_manifest = load_manifest(paths['manifest'])
+    entries = scan_sources(root_dir, data, old_manifest)
+
+    if is_up_to_date(old_manifest, entries, img_size, paths):
+        print(f"图像缓存已是最新: {paths['images']} ({len(entries)} 张)")
+        return paths
+
+    # 旧缓存中内容哈希相同的图片可以直接复制, 不必重新解码
+    reusable = {}
+    old_images = None
+    if old_manifest and old_manifest.get('img_size') == img_size and os.path.exists(paths['images']):
+        old_images = np.load(paths['images'], mmap_mode='r')
+        for idx, entry in enumerate(old_manifest['entries']):
+            if entry['sha1'] and entry.get('ok', True) and idx < len(old_images):
+                reusable.setdefault(entry['sha1'], idx)
+
+    num = len(entries)
+    tmp_images = paths['images'] + '.tmp.npy'
+    images = np.lib.format.open_memmap(tmp_images, mode='w+', dtype=np.uint8,
+                                       shape=(num, img_size, img_size, 3))
+
+    to_decode = []
+    reused = 0
+    for idx, entry in enumerate(entries):
+        if entry['sha1'] in reusable:
+            images[idx] = old_images[reusable[entry['sha1']]]
+            entry['ok'] = True
+            reused += 1
+        else:
+            to_decode.append(idx)
+
+    print(f"正在构建图像缓存 {paths['images']}: 共 {num} 张, 复用 {reused} 张, 解码 {len(to_decode)} 张")
+
+    def decode_row(idx):
+        entry = entries[idx]
+        img = decode_image(os.path.join(root_dir, entry['path']), img_size)
+        if img is None:
+            print(f"警告：无法读取图片 {entry['path']}")
+            images[idx] = 0
+            entry['ok'] = False
+        else:
+            images[idx] = img
+            entry['ok'] = True
+
+    # cv2 解码和缩放会释放 GIL, 线程池即可并行
+    with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        for done, _ in enumerate(executor.map(decode_row, to_decode), 1):
+            if done % 2000 == 0:
+                print(f"  已解码 {done}/{len(to_decode)}")
+
+    images.flush()
+    # 关闭内存映射后才能替换文件 (decode_row 闭包引用 images, 用赋值而不是 del)
+    images = None
+    old_images = None
+    os.replace(tmp_images, paths['images'])
+
+    labels = np.array([entry['label'] for entry in entries], dtype=np.int64)
+    np.save(paths['labels'], labels)
+
+    # 清单最后写入: 中途失败时下次会重新构建
+    manifest = {
+        'version': CACHE_VERSION,
+        'img_size': img_size,
+        'list_file': txt_file,
+        'entries': entries,
+    }
+    with open(paths['manifest'] + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(paths['manifest'] + '.tmp', paths['manifest'])
+
+    print(f"图像缓存构建完成: {paths['images']}")
+    return paths
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build the preprocessed memory-mapped image cache')
+    parser.add_argument('--root', type=str, default='garbage',
+                        help='Dataset root directory (default: garbage)')
+    parser.add_argument('--lists', type=str, nargs='+', default=['train.txt', 'validate.txt'],
+                        help='List files to cache (default: train.txt validate.txt)')
+    parser.add_argument('--img-size', type=int, default=DEFAULT_IMG_SIZE,
+                        help=f'Output image size (default: {DEFAULT_IMG_SIZE})')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Cache directory (default: <root>/cache)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Decode threads (default: CPU count)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for txt_file in args.lists:
+        build_cache(args.root, txt_file, args.img_size, args.cache_dir, args.workers)
+
+
+if __name__ == '__main__':
+    main()